@@ -4,7 +4,6 @@ Closer Agent - Phase 4: Handle payment process (especially Ecuador local transfe
 import logging
 
 from app.config.settings import settings
-from app.database.db import update_conversation_state
 from app.models.conversation import ConversationState
 
 logger = logging.getLogger(__name__)
@@ -24,7 +23,6 @@ class CloserAgent:
         Start closing process
         """
         state.closer_step = "presenting_payment"
-        await update_conversation_state(sender, state)
 
         # Calculate price
         final_price = settings.BASE_PRICE
@@ -38,7 +36,6 @@ class CloserAgent:
         # Activate immediately — user is on the payment screen, any image is a proof
         state.waiting_for_payment_proof = True
         state.closer_step = "waiting_proof"
-        await update_conversation_state(sender, state)
 
         # Payment instructions
         if state.user_country == "Ecuador":
@@ -81,7 +78,6 @@ class CloserAgent:
         if any(word in message_lower for word in ["ok", "listo", "ya", "ahora", "voy", "entendido"]):
             state.waiting_for_payment_proof = True
             state.closer_step = "waiting_proof"
-            await update_conversation_state(sender, state)
 
             return (
                 f"¡Perfecto, {state.user_name}! 👍\n\n"
@@ -4,7 +4,6 @@ Consultant Agent - Phase 2: The Hook - Diagnose need and deliver personalized gi
 import logging
 
 from app.config.settings import settings
-from app.database.db import update_conversation_state
 from app.models.conversation import ConversationState
 from app.services.openaiService import OpenAiService
 
@@ -25,7 +24,6 @@ class ConsultantAgent:
         Start consultant interaction after greeter
         """
         state.consultant_step = "asked_level"
-        await update_conversation_state(sender, state)
 
         flag = self._get_country_flag(state.user_country)
 
@@ -87,8 +85,6 @@ class ConsultantAgent:
             state.consultant_step = "completed"
             state.current_agent = "router"
 
-            await update_conversation_state(sender, state)
-
             # Personalized response based on level
             response = self._get_personalized_gift_message(
                 state.user_name, level, level_text)
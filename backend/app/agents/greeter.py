@@ -14,7 +14,6 @@ AI is ONLY used for extraction (parseNameAndCountry) — never for generating te
 import logging
 import re
 
-from app.database.db import update_conversation_state
 from app.models.conversation import ConversationState
 from app.services.openaiService import OpenAiService
 
@@ -75,7 +74,6 @@ class GreeterAgent:
 
             # Can't extract → hook with prize
             state.greeter_step = "asked_name"
-            await update_conversation_state(sender, state)
             return (
                 "¡Hola! 👋 Qué bueno que escribes.\n\n"
                 "Tengo un *regalo especial* listo para ti 🎁\n"
@@ -91,7 +89,6 @@ class GreeterAgent:
 
             if not name:
                 state.greeter_step = "retry_name"
-                await update_conversation_state(sender, state)
                 return (
                     "No logré captar tu nombre 😅\n\n"
                     "Escríbelo así: *Nombre, País*\n"
@@ -142,7 +139,6 @@ class GreeterAgent:
         state.user_country = country or "Unknown"
         state.greeter_step = "completed"
         state.current_agent = "consultant"
-        await update_conversation_state(sender, state)
 
         from app.agents.consultant import ConsultantAgent
         consultant = ConsultantAgent()
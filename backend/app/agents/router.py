@@ -2,9 +2,9 @@
 Router Agent - Phase 3: Classify purchase intent and route accordingly
 """
 import logging
+from typing import AsyncIterator
 
 from app.config.settings import settings
-from app.database.db import update_conversation_state
 from app.models.conversation import ConversationState
 from app.services.openaiService import OpenAiService
 
@@ -43,7 +43,7 @@ class RouterAgent:
                 return "objection"
         return None
 
-    async def process(self, sender: str, message: str, state: ConversationState) -> str:
+    async def process(self, sender: str, message: str, state: ConversationState) -> str | AsyncIterator[str]:
         """
         Analyze message and route appropriately.
         Uses fast local matching; only calls AI when ambiguous.
@@ -68,7 +68,6 @@ class RouterAgent:
         if intent == "purchase":
             # User wants to buy - route to Closer
             state.current_agent = "closer"
-            await update_conversation_state(sender, state)
 
             from app.agents.closer import CloserAgent
             closer = CloserAgent()
@@ -79,7 +78,7 @@ class RouterAgent:
             return await self._provide_more_info(sender, state)
 
         elif intent == "objection":
-            # Handle objections with deterministic templates (no AI generation)
+            # Handle objections with templates (AI streaming only when enabled)
             return await self._handle_objection(sender, state, message)
 
         else:  # unclear
@@ -111,9 +110,12 @@ class RouterAgent:
             "¿Listo/a para empezar? 🚀"
         )
 
-    async def _handle_objection(self, sender: str, state: ConversationState, message: str) -> str:
+    async def _handle_objection(
+        self, sender: str, state: ConversationState, message: str
+    ) -> str | AsyncIterator[str]:
         """
-        Handle common objections
+        Handle common objections.
+        Returns a text stream instead of a string when AI objection streaming is enabled.
         """
         if "caro" in message or "precio" in message:
             return (
@@ -133,6 +135,12 @@ class RouterAgent:
                 "¿Qué te detiene realmente? Cuéntame y vemos cómo resolverlo. 💪"
             )
 
+        elif settings.AI_OBJECTION_STREAMING:
+            # Let the AI answer open-ended objections; the reply is streamed
+            # so typing starts as soon as the first tokens arrive
+            openai_service = OpenAiService()
+            return openai_service.streamObjection(message, state.user_name)
+
         else:
             return (
                 f"Entiendo tus dudas, {state.user_name}. 🤔\n\n"
@@ -4,7 +4,6 @@ Upsell Agent - Phase 6: Handle post-purchase upsell offer
 import logging
 
 from app.config.settings import settings
-from app.database.db import update_conversation_state
 from app.models.conversation import ConversationState
 from app.services.openaiService import OpenAiService
 
@@ -69,7 +68,6 @@ class UpsellAgent:
         if intent == "accept":
             # User wants to buy the upsell
             state.current_agent = "completed"
-            await update_conversation_state(sender, state)
             return self._get_payment_details(state)
 
         elif intent == "info":
@@ -79,7 +77,6 @@ class UpsellAgent:
         elif intent == "reject":
             # User rejected the upsell
             state.current_agent = "completed"
-            await update_conversation_state(sender, state)
             return (
                 f"¡No hay problema, {state.user_name}! Entiendo perfectamente. 😊\n\n"
                 "Disfruta mucho tu E-Book y recuerda que estoy aquí si tienes alguna duda con ese material.\n\n"
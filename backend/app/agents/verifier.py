@@ -4,9 +4,9 @@ Verifier Agent - Phase 5: Handle payment verification and product delivery
 import logging
 
 from app.config.settings import settings
-from app.database.db import update_conversation_state
 from app.models.conversation import ConversationState
 from app.services.notificationService import NotificationService
+from app.services.sendScheduler import PRIORITY_CRITICAL
 
 logger = logging.getLogger(__name__)
 
@@ -41,7 +41,6 @@ class VerifierAgent:
         # Save image info
         state.payment_proof_received = True
         state.payment_proof_image = image_data
-        await update_conversation_state(sender, state)
 
         # Notify Angelo
         await self._notify_owner(sender, state)
@@ -76,7 +75,13 @@ class VerifierAgent:
             f'{{"phone_number": "{sender}", "user_name": "{state.user_name}"}}'
         )
 
-        await self.notification_service.sendToOwner(notification_message)
+        phone = sender.replace('@s.whatsapp.net', '')
+        await self.notification_service.notify(
+            "payment_pending",
+            notification_message,
+            f"{state.user_name} ({state.user_country}) - ${state.final_price} → `/confirmar {phone}`",
+            urgent=True
+        )
 
         # Log for debugging
         logger.info(f"Payment proof received from {state.user_name} ({sender})")
@@ -98,9 +103,8 @@ class VerifierAgent:
             state.product_delivered = True
             state.current_agent = "upsell"
 
-            await update_conversation_state(sender, state)
-
-            # Send product delivery message with human behavior
+            # Send product delivery message with human behavior; the state
+            # change is committed together with the queued message
             delivery_message = await self._get_delivery_message(user_name)
 
             from app.services.evolutionApi import EvolutionApiService
@@ -109,12 +113,16 @@ class VerifierAgent:
                 sender,
                 delivery_message,
                 use_typing=True,
-                use_presence=True
+                use_presence=True,
+                priority=PRIORITY_CRITICAL,
+                state=state
             )
 
             # Notify Angelo of successful delivery
-            await self.notification_service.sendToOwner(
-                f"✅ Producto entregado exitosamente a {user_name} ({sender})"
+            await self.notification_service.notify(
+                "product_delivered",
+                f"✅ Producto entregado exitosamente a {user_name} ({sender})",
+                f"{user_name} ({sender})"
             )
 
             logger.info(f"Product delivered to {user_name} ({sender})")
@@ -1,6 +1,39 @@
-from app.database.db import get_all_conversations, get_conversation_state
+import asyncio
+import json
+import secrets
+import uuid
+
+from app.config.settings import settings
+from app.database.db import (
+    count_campaign_candidates,
+    create_campaign,
+    get_all_conversations,
+    get_campaign,
+    get_campaign_recipients,
+    get_conversation_state,
+    get_funnel_metrics,
+    get_outbox_stats,
+    list_campaigns,
+    requeue_outbox_message,
+    set_campaign_status,
+)
+from app.services.actionScheduler import action_scheduler
+from app.services.campaignRunner import campaign_runner
 from app.services.evolutionApi import EvolutionApiService
-from fastapi import APIRouter, HTTPException
+from app.services.loopMonitor import loop_monitor
+from app.services.modelRouting import model_router
+from app.services.notificationDigest import notification_digest
+from app.services.outboxWorker import outbox_worker
+from app.services.presenceSignals import presence_signals
+from app.services.profiler import ProfilerBusy, memory_tracker, sampling_profiler
+from app.services.sendScheduler import send_scheduler
+from app.services.sessionPool import session_pool
+from app.services.traceExporter import trace_exporter
+from app.services.usageTracker import usage_tracker
+from app.services.wahaHealth import waha_health
+from app.utils import logs, metrics
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -17,6 +50,15 @@ class SendMessageRequest(BaseModel):
     message: str
 
 
+class CampaignRequest(BaseModel):
+    name: str
+    message: str  # may use {name}
+    current_agent: str | None = None  # e.g. "router"
+    idle_hours: float | None = None  # e.g. 48 = no activity for 48h
+    limit: int | None = None
+    dry_run: bool = False
+
+
 @router.get("/conversations")
 async def list_conversations():
     """
@@ -35,6 +77,16 @@ async def get_conversation(phone_number: str):
     return {"conversation": conversation.dict()}
 
 
+@router.get("/funnel")
+async def funnel_metrics(hours: int = 24):
+    """
+    Leads per stage, country, level and payment flag, conversion rates, and
+    for the last `hours` time in stage and funnel events per time bucket
+    (from incrementally maintained counters; no conversation scan)
+    """
+    return await get_funnel_metrics(hours)
+
+
 @router.post("/confirm-payment")
 async def confirm_payment(request: ConfirmPaymentRequest):
     """
@@ -72,3 +124,216 @@ async def send_manual_message(request: SendMessageRequest):
         return {"status": "success", "message": "Message sent"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/metrics/ai")
+async def ai_metrics():
+    """
+    Current AI spend and token usage (per day, task and model), budget state
+    and model routing / latency stats
+    """
+    return {**usage_tracker.snapshot(), "routing": model_router.snapshot()}
+
+
+@router.get("/metrics/sends")
+async def send_metrics():
+    """
+    Outbound send queue depth and wait times per priority lane, pending
+    scheduled (delayed) human-behavior actions, WAHA circuit state and
+    owner-notification digest counters
+    """
+    return {
+        **send_scheduler.snapshot(),
+        "scheduled": action_scheduler.snapshot(),
+        "waha": waha_health.snapshot(),
+        "sessions": session_pool.snapshot(),
+        "presence": presence_signals.snapshot(),
+        "owner_notifications": notification_digest.snapshot(),
+    }
+
+
+@router.get("/metrics/stages")
+async def stage_metrics():
+    """
+    Per-step latency (p50/p95/p99 estimated from the /metrics histograms)
+    by agent, planned human-like delays and messages per agent, and the
+    trace exporter and log queue counters
+    """
+    return {**metrics.snapshot(), "tracing": trace_exporter.snapshot(), "logging": logs.snapshot()}
+
+
+@router.get("/metrics/loop")
+async def loop_metrics():
+    """
+    Event-loop lag and, with LOOP_WATCHDOG_ENABLED, the code locations
+    caught blocking the loop (most frequent first)
+    """
+    return loop_monitor.snapshot()
+
+
+async def require_admin(x_admin_token: str | None = Header(None)):
+    """Admin routes answer only with the configured ADMIN_TOKEN."""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Admin endpoints disabled (set ADMIN_TOKEN)")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+@router.get("/admin/profile", dependencies=[Depends(require_admin)])
+async def profile_process(seconds: float = 10.0, all_threads: bool = False, lines: bool = False):
+    """
+    Sample the live process for N seconds and return collapsed stacks
+    (flamegraph.pl / speedscope), rooted at the agent and step running
+    """
+    if not 0 < seconds <= settings.PROFILER_MAX_SECONDS:
+        raise HTTPException(
+            status_code=400, detail=f"seconds must be in (0, {settings.PROFILER_MAX_SECONDS}]")
+    try:
+        collapsed = await sampling_profiler.profile(seconds, all_threads, lines)
+    except ProfilerBusy:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    return PlainTextResponse(
+        collapsed,
+        headers={"Content-Disposition": 'attachment; filename="profile.collapsed"'},
+    )
+
+
+@router.get("/admin/memory", dependencies=[Depends(require_admin)])
+async def memory_diff(top: int = 25, group_by: str = "lineno", rebase: bool = False):
+    """
+    Heap growth by allocation site since the tracemalloc baseline (rebase=true
+    makes this snapshot the new baseline) and pending asyncio tasks
+    """
+    if group_by not in ("lineno", "filename", "traceback"):
+        raise HTTPException(status_code=400, detail="group_by must be lineno, filename or traceback")
+    if not memory_tracker.tracing:
+        raise HTTPException(status_code=409, detail="tracemalloc is off; POST /api/admin/memory/start first")
+    # Snapshots walk every traced block: keep that off the event loop
+    diff = await asyncio.to_thread(memory_tracker.diff, top, group_by, rebase)
+    return {**diff, "tasks": memory_tracker.pendingTasks(), "profiler": sampling_profiler.snapshot()}
+
+
+@router.post("/admin/memory/{action}", dependencies=[Depends(require_admin)])
+async def memory_tracing(action: str):
+    """
+    Start tracemalloc (and take the baseline) or stop it
+    """
+    if action == "start":
+        return await asyncio.to_thread(memory_tracker.start, settings.PROFILER_TRACEMALLOC_FRAMES)
+    if action == "stop":
+        return memory_tracker.stop()
+    raise HTTPException(status_code=400, detail="Action must be start or stop")
+
+
+@router.get("/outbox", dependencies=[Depends(require_admin)])
+async def outbox_status():
+    """
+    Outbox message counts by status, worker stats and recent dead letters
+    """
+    return {**await get_outbox_stats(), "worker": outbox_worker.snapshot()}
+
+
+@router.post("/outbox/{message_id}/retry", dependencies=[Depends(require_admin)])
+async def retry_outbox_message(message_id: int):
+    """
+    Re-queue a dead-lettered outbox message
+    """
+    if not await requeue_outbox_message(message_id):
+        raise HTTPException(status_code=404, detail="Dead letter not found")
+    outbox_worker.wake()
+    return {"status": "requeued", "id": message_id}
+
+
+@router.post("/campaigns", dependencies=[Depends(require_admin)])
+async def start_campaign(request: CampaignRequest):
+    """
+    Create and start a throttled broadcast campaign
+    Example: {"name": "upsell", "message": "Hola {name}...", "current_agent": "router", "idle_hours": 48}
+    """
+    if request.dry_run:
+        count = await count_campaign_candidates(request.current_agent, request.idle_hours)
+        return {"recipients": min(count, request.limit) if request.limit else count}
+
+    campaign = await create_campaign(
+        uuid.uuid4().hex[:12],
+        request.name,
+        request.message,
+        current_agent=request.current_agent,
+        idle_hours=request.idle_hours,
+        limit=request.limit
+    )
+    campaign_runner.start(campaign["id"])
+    return {"campaign": campaign}
+
+
+@router.get("/campaigns", dependencies=[Depends(require_admin)])
+async def get_campaigns():
+    """
+    List campaigns with their progress
+    """
+    return {"campaigns": await list_campaigns()}
+
+
+@router.get("/campaigns/{campaign_id}", dependencies=[Depends(require_admin)])
+async def get_campaign_status(campaign_id: str):
+    """
+    Campaign progress counters
+    """
+    campaign = await get_campaign(campaign_id)
+    if campaign is None:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    return {"campaign": campaign, "active": campaign_runner.isRunning(campaign_id)}
+
+
+@router.get("/campaigns/{campaign_id}/recipients", dependencies=[Depends(require_admin)])
+async def get_campaign_recipient_status(campaign_id: str, status: str | None = None, limit: int = 100):
+    """
+    Per-recipient delivery status (filter with ?status=failed)
+    """
+    return {"recipients": await get_campaign_recipients(campaign_id, status, limit)}
+
+
+@router.post("/campaigns/{campaign_id}/{action}", dependencies=[Depends(require_admin)])
+async def control_campaign(campaign_id: str, action: str):
+    """
+    Pause, resume or cancel a campaign
+    """
+    campaign = await get_campaign(campaign_id)
+    if campaign is None:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    if campaign["status"] in ("completed", "cancelled"):
+        raise HTTPException(status_code=409, detail=f"Campaign already {campaign['status']}")
+
+    if action == "pause":
+        await campaign_runner.stop(campaign_id, "paused")
+    elif action == "cancel":
+        await campaign_runner.stop(campaign_id, "cancelled")
+    elif action == "resume":
+        await set_campaign_status(campaign_id, "running")
+        campaign_runner.start(campaign_id)
+    else:
+        raise HTTPException(status_code=400, detail="Action must be pause, resume or cancel")
+    return {"status": "ok", "action": action}
+
+
+@router.get("/campaigns/{campaign_id}/progress", dependencies=[Depends(require_admin)])
+async def stream_campaign_progress(campaign_id: str, interval: float = 1.0):
+    """
+    Server-sent events with campaign progress until it finishes or stops
+    """
+    if await get_campaign(campaign_id) is None:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+
+    async def events():
+        while True:
+            campaign = await get_campaign(campaign_id)
+            if campaign is None:
+                yield f"data: {json.dumps({'id': campaign_id, 'status': 'deleted'})}\n\n"
+                return
+            yield f"data: {json.dumps(campaign, default=str)}\n\n"
+            # A runner that crashed leaves status "running": stop on either
+            if campaign["status"] != "running" or not campaign_runner.isRunning(campaign_id):
+                return
+            await asyncio.sleep(max(interval, 0.2))
+
+    return StreamingResponse(events(), media_type="text/event-stream")
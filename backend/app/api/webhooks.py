@@ -1,14 +1,26 @@
 import logging
-from typing import cast
+from typing import AsyncIterator, cast
 
 from app.agents.closer import CloserAgent
 from app.agents.consultant import ConsultantAgent
 from app.agents.greeter import GreeterAgent
 from app.agents.router import RouterAgent
 from app.agents.verifier import VerifierAgent
+from app.config.settings import settings
 from app.database.db import get_conversation_state, update_conversation_state
 from app.models.conversation import ConversationState
-from app.services.evolutionApi import EvolutionApiService
+from app.services.evolutionApi import EvolutionApiService, HumanReplyPlan
+from app.services.sendScheduler import (
+    PRIORITY_CRITICAL,
+    PRIORITY_LOW,
+    PRIORITY_NORMAL,
+)
+from app.services.sessionPool import session_pool
+from app.services.trafficRecorder import traffic_recorder
+from app.services.usageTracker import current_conversation
+from app.services.wahaHealth import waha_health
+from app.utils.logs import redacted
+from app.utils.metrics import current_agent, messages_total, span
 from fastapi import APIRouter, HTTPException, Request
 
 router = APIRouter()
@@ -23,8 +35,10 @@ async def evolution_webhook(request: Request):
     Webhook endpoint to receive messages from Evolution API
     """
     try:
-        data = await request.json()
-        logger.info(f"Received webhook: {data}")
+        with span("webhook_parse"):
+            data = await request.json()
+        traffic_recorder.record("evolution", data)
+        logger.info("Received webhook: %s", redacted(data), extra={"category": "webhook.payload"})
 
         # Extract message data
         event_type = data.get("event")
@@ -62,25 +76,42 @@ async def evolution_webhook(request: Request):
             if not message_type:
                 return {"status": "ignored", "reason": "unknown message type"}
 
-            # Get or create conversation state
-            conversation_state = await get_conversation_state(sender)
-
-            # Route to appropriate agent based on state and message type
-            response = await process_message(
-                sender=sender,
-                message_type=message_type,
-                message_content=message_content,
-                conversation_state=conversation_state
-            )
-
-            # Send response with human-like behavior
-            if response:
-                await evolution_service.sendTextWithHumanBehavior(
-                    sender,
-                    response,
-                    use_typing=True,
-                    use_presence=True
-                )
+            # A redelivered webhook must not run the agents again
+            if message_id and await evolution_service.replyQueued(reply_key(message_id)):
+                return {"status": "ignored", "reason": "duplicate"}
+
+            # Reading/typing delay runs while the message is being processed
+            plan = await evolution_service.beginHumanReply(sender)
+            try:
+                # Get or create conversation state
+                with span("state_load"):
+                    conversation_state = await get_conversation_state(sender)
+                conversation_state.waha_session = session_pool.assign(
+                    sender, conversation_state.waha_session, data.get("instance"))
+                priority = reply_priority(conversation_state, message_type)
+
+                # Route to appropriate agent based on state and message type
+                current_agent.set(metrics_agent(conversation_state, message_type))
+                messages_total.inc(current_agent.get())
+                with span("agent_dispatch"):
+                    response = await process_message(
+                        sender=sender,
+                        message_type=message_type,
+                        message_content=message_content,
+                        conversation_state=conversation_state
+                    )
+
+                # Send response with human-like behavior
+                if response:
+                    await send_reply(
+                        sender, response, use_presence=True, priority=priority, plan=plan,
+                        state=conversation_state, message_id=message_id)
+                else:
+                    await evolution_service.abandonHumanReply(plan)
+                    await update_conversation_state(sender, conversation_state)
+            except Exception:
+                await evolution_service.abandonHumanReply(plan)
+                raise
 
             return {"status": "success"}
 
@@ -106,10 +137,17 @@ async def waha_webhook(request: Request):
     }
     """
     try:
-        data = await request.json()
+        with span("webhook_parse"):
+            data = await request.json()
+        traffic_recorder.record("waha", data)
         event_type = data.get("event")
         logger.warning(
-            f"[WAHA] event={event_type} payload_keys={list(data.get('payload', {}).keys())}")
+            "[WAHA] event=%s payload_keys=%s", event_type, redacted(list(data.get("payload", {}))),
+            extra={"category": "webhook.event"})
+
+        # Any session of the pool may deliver events; calls about this message go back through it
+        inbound_session = data.get("session") or settings.WAHA_SESSION
+        session_service = EvolutionApiService(session=inbound_session)
 
         if event_type == "message":
             payload = data.get("payload", {})
@@ -121,9 +159,12 @@ async def waha_webhook(request: Request):
             # using the WAHA endpoint GET /api/{session}/lids/{lid}.
             # Fallback: try to parse message ID (format: "false_593xxx@c.us_XXXX").
             if sender.endswith("@lid"):
-                resolved = await evolution_service.resolveLidToPhone(sender)
+                with span("lid_resolution"):
+                    resolved = await session_service.resolveLidToPhone(sender)
                 if resolved:
-                    logger.warning(f"[WAHA] @lid {sender} resolved to: {resolved}")
+                    logger.warning(
+                        "[WAHA] @lid %s resolved to: %s", sender, redacted(resolved),
+                        extra={"category": "webhook.lid"})
                     sender = resolved
                 else:
                     # Fallback: extract @c.us from message ID
@@ -134,10 +175,13 @@ async def waha_webhook(request: Request):
                             if "@c.us" in part:
                                 sender = part
                                 break
-                    logger.warning(f"[WAHA] @lid unresolved, using fallback: {sender}")
+                    logger.warning(
+                        "[WAHA] @lid unresolved, using fallback: %s", redacted(sender),
+                        extra={"category": "webhook.lid"})
 
             logger.warning(
-                f"[WAHA] message: from={sender} fromMe={from_me} body={repr(body)[:80]}")
+                "[WAHA] message: from=%s fromMe=%s body=%s", redacted(sender), from_me, redacted(body, 80),
+                extra={"category": "webhook.message"})
 
             # Skip messages sent by the bot itself
             if from_me:
@@ -146,8 +190,8 @@ async def waha_webhook(request: Request):
             if not sender:
                 return {"status": "ignored", "reason": "no sender"}
 
-            # Mark message as read (double blue tick)
-            await evolution_service.sendSeen(sender)
+            # Mark message as read (double blue tick), in the background
+            session_service.signalSeen(sender)
 
             # Get message content
             if payload.get("hasMedia"):
@@ -160,26 +204,54 @@ async def waha_webhook(request: Request):
                 message_type = "text"
                 message_content = body
 
-            conversation_state = await get_conversation_state(sender)
-
-            response = await process_message(
-                sender=sender,
-                message_type=message_type,
-                message_content=message_content,
-                conversation_state=conversation_state
-            )
+            # A redelivered webhook must not run the agents again
+            message_id = payload.get("id")
+            if message_id and await evolution_service.replyQueued(reply_key(message_id)):
+                return {"status": "ignored", "reason": "duplicate"}
+
+            # Reading/typing delay runs while the message is being processed
+            plan = await evolution_service.beginHumanReply(sender)
+            try:
+                with span("state_load"):
+                    conversation_state = await get_conversation_state(sender)
+                conversation_state.waha_session = session_pool.assign(
+                    sender, conversation_state.waha_session, data.get("session"))
+                priority = reply_priority(conversation_state, message_type)
+
+                current_agent.set(metrics_agent(conversation_state, message_type))
+                messages_total.inc(current_agent.get())
+                with span("agent_dispatch"):
+                    response = await process_message(
+                        sender=sender,
+                        message_type=message_type,
+                        message_content=message_content,
+                        conversation_state=conversation_state
+                    )
+
+                logger.warning(
+                    "[WAHA] agent response for %s: %s", redacted(sender),
+                    redacted(response if isinstance(response, str) else "<stream>", 120),
+                    extra={"category": "webhook.reply"})
+                if response:
+                    await send_reply(
+                        sender, response, use_presence=False, priority=priority, plan=plan,
+                        state=conversation_state, message_id=message_id)
+                    logger.warning(
+                        "[WAHA] message scheduled OK to %s", redacted(sender), extra={"category": "webhook.reply"})
+                else:
+                    await evolution_service.abandonHumanReply(plan)
+                    await update_conversation_state(sender, conversation_state)
+            except Exception:
+                await evolution_service.abandonHumanReply(plan)
+                raise
 
-            logger.warning(
-                f"[WAHA] agent response for {sender}: {repr(str(response))[:120]}")
-            if response:
-                await evolution_service.sendTextWithHumanBehavior(
-                    sender,
-                    response,
-                    use_typing=True,
-                    use_presence=False
-                )
-                logger.warning(f"[WAHA] message sent OK to {sender}")
+            return {"status": "success"}
 
+        if event_type == "session.status":
+            # Feeds the WAHA circuit breaker: anything but WORKING parks outbound traffic
+            status = data.get("payload", {}).get("status", "")
+            logger.warning(f"[WAHA] session {inbound_session} status: {status}")
+            waha_health.onSessionStatus(inbound_session, status)
             return {"status": "success"}
 
         return {"status": "ignored", "reason": "unsupported event"}
@@ -189,6 +261,70 @@ async def waha_webhook(request: Request):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def reply_priority(conversation_state: ConversationState, message_type: str) -> int:
+    """
+    Send lane for the reply to an inbound message: payment-proof replies go
+    first, greetings to brand-new leads go last.
+    """
+    if message_type == "image" and conversation_state.waiting_for_payment_proof:
+        return PRIORITY_CRITICAL
+    if conversation_state.current_agent in ("greeter", None):
+        return PRIORITY_LOW
+    return PRIORITY_NORMAL
+
+
+def reply_key(message_id: str) -> str:
+    """Idempotency key of the reply to an inbound message."""
+    return f"reply:{message_id}"
+
+
+def metrics_agent(conversation_state: ConversationState, message_type: str) -> str:
+    """Agent label for the metrics of a message (images go to the verifier)."""
+    if message_type == "image":
+        return "verifier"
+    return conversation_state.current_agent or "greeter"
+
+
+async def send_reply(
+    sender: str,
+    response: str | AsyncIterator[str],
+    use_presence: bool,
+    priority: int = PRIORITY_NORMAL,
+    plan: HumanReplyPlan | None = None,
+    state: ConversationState | None = None,
+    message_id: str | None = None
+):
+    """
+    Send an agent reply with human-like behavior.
+    Agents may return a plain string or a stream of text chunks. `plan` is
+    the timeline started on arrival, so processing time is not added twice.
+    The reply is queued in the outbox in the same commit as `state`, keyed
+    by the inbound message id so a redelivered webhook is not answered twice.
+    """
+    idempotency_key = reply_key(message_id) if message_id else None
+    if isinstance(response, str):
+        return await evolution_service.sendTextWithHumanBehavior(
+            sender,
+            response,
+            use_typing=True,
+            use_presence=use_presence,
+            priority=priority,
+            plan=plan,
+            state=state,
+            idempotency_key=idempotency_key
+        )
+    return await evolution_service.sendStreamWithHumanBehavior(
+        sender,
+        response,
+        use_typing=True,
+        use_presence=use_presence,
+        priority=priority,
+        plan=plan,
+        state=state,
+        idempotency_key=idempotency_key
+    )
+
+
 async def process_message(
     sender: str,
     message_type: str,
@@ -198,6 +334,7 @@ async def process_message(
     """
     Process message and route to the appropriate agent
     """
+    current_conversation.set(sender)
     current_agent = conversation_state.current_agent
 
     # Handle image messages (payment verification)
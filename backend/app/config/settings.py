@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 from pydantic_settings import BaseSettings
 
@@ -12,6 +12,53 @@ class Settings(BaseSettings):
     WAHA_API_URL: str = "http://localhost:3000"
     WAHA_API_KEY: str = "test-key"
     WAHA_SESSION: str = "default"
+    # Pool of sessions (one per WhatsApp number); empty = only WAHA_SESSION
+    WAHA_SESSIONS: List[str] = []
+
+    # Outbound send pacing (token buckets: messages per second / burst size)
+    SEND_CHAT_RATE: float = 0.5
+    SEND_CHAT_BURST: int = 3
+    SEND_SESSION_RATE: float = 5.0
+    SEND_SESSION_BURST: int = 10
+    SEND_GLOBAL_RATE: float = 10.0
+    SEND_GLOBAL_BURST: int = 20
+    SEND_MAX_IN_FLIGHT: int = 20
+
+    # WAHA circuit breaker and session health probes
+    WAHA_BREAKER_ERROR_RATE: float = 0.5
+    WAHA_BREAKER_MIN_CALLS: int = 5
+    WAHA_BREAKER_WINDOW_SECONDS: float = 60.0
+    WAHA_BREAKER_COOLDOWN_SECONDS: float = 15.0
+    WAHA_HEALTH_PROBE_SECONDS: float = 30.0
+    WAHA_HEALTH_PROBE_OPEN_SECONDS: float = 5.0
+
+    # Persist scheduled human-behavior actions due more than a few seconds ahead,
+    # so they survive restarts (replies themselves are in the outbox either way)
+    SCHEDULED_ACTIONS_PERSIST: bool = False
+
+    # Long replies are split at ━━━ separators into several messages
+    MESSAGE_SPLIT_ENABLED: bool = True
+    MESSAGE_SPLIT_MIN_CHARS: int = 600
+
+    # Reading/typing/pause delays before replies; off only for load benchmarks
+    HUMAN_DELAYS_ENABLED: bool = True
+
+    # Bulk campaigns (own pacing on top of the send scheduler, low-priority lane)
+    CAMPAIGN_RATE: float = 1.0
+    CAMPAIGN_BURST: int = 5
+    CAMPAIGN_CONCURRENCY: int = 5
+    CAMPAIGN_PAGE_SIZE: int = 50
+
+    # Durable outbox for outgoing messages (retries with exponential backoff)
+    OUTBOX_BATCH_SIZE: int = 50
+    OUTBOX_POLL_SECONDS: float = 5.0
+    OUTBOX_MAX_ATTEMPTS: int = 8
+    OUTBOX_BACKOFF_BASE_SECONDS: float = 2.0
+    OUTBOX_BACKOFF_MAX_SECONDS: float = 300.0
+
+    # Owner notifications batched into one digest per window (0 = send each one)
+    NOTIFY_DIGEST_WINDOW_SECONDS: float = 60.0
+    NOTIFY_DIGEST_MAX_EVENTS: int = 30
 
     # Evolution API (kept for backward compat)
     EVOLUTION_API_URL: str = "http://localhost:3000"
@@ -20,10 +67,82 @@ class Settings(BaseSettings):
 
     # Anthropic
     ANTHROPIC_API_KEY: str = ""
+    ANTHROPIC_BASE_URL: str = ""  # empty = official API; point at tools/anthropicStub.py for local runs
+    AI_PROMPT_CACHING: bool = True
+
+    # AI model routing (per-task model / max_tokens / timeout) and hedged requests
+    AI_MODEL: str = "claude-3-5-haiku-20241022"
+    AI_FAST_MODEL: str = "claude-3-haiku-20240307"  # hedge / demotion tier ("" = none)
+    AI_ROUTES: Dict[str, Dict[str, Any]] = {}  # per-task overrides, e.g. {"objection": {"timeout": 8}}
+    AI_HEDGING_ENABLED: bool = True
+    AI_HEDGE_MIN_DELAY_MS: int = 300
+    AI_LATENCY_WINDOW: int = 200
+    AI_LATENCY_MIN_SAMPLES: int = 20
+    AI_DEMOTE_P95_RATIO: float = 0.8  # demote when p95 exceeds this share of the timeout
+    AI_DEMOTE_ERROR_RATE: float = 0.3
+    AI_DEMOTION_PROBE_RATE: float = 0.05
+
+    # AI request batching (concurrent classifications of the same task share one call)
+    AI_BATCH_ENABLED: bool = True
+    AI_BATCH_WINDOW_MS: int = 20
+    AI_BATCH_MAX_SIZE: int = 20
+    # Generate open-ended objection replies with AI (streamed) instead of a template
+    AI_OBJECTION_STREAMING: bool = False
+
+    # AI cost accounting / budget governor (0 = off; opt in with a daily USD cap)
+    AI_DAILY_BUDGET_USD: float = 0.0
+    AI_BUDGET_DEGRADE_AT: float = 0.9  # fraction of the budget at which AI calls stop
+    AI_USAGE_FLUSH_SECONDS: int = 60
+    AI_USAGE_LOG_PATH: str = "./data/ai_usage.jsonl"
 
     # OpenAI (legacy, kept for backward compat)
     OPENAI_API_KEY: str = ""
 
+    # Event-loop lag sampling; the watchdog (debug) logs stacks of code blocking the loop
+    LOOP_LAG_SAMPLE_SECONDS: float = 0.5
+    LOOP_WATCHDOG_ENABLED: bool = False
+    LOOP_BLOCKING_THRESHOLD_MS: int = 100
+    LOOP_WATCHDOG_STACK_DEPTH: int = 15
+
+    # Logging (app/utils/logs.py): JSON lines written by a background thread;
+    # LOG_SAMPLE_RATES keeps that fraction of a category's records (errors always kept)
+    LOG_LEVEL: str = "WARNING"
+    LOG_FORMAT: str = "json"  # json | text
+    LOG_SAMPLE_RATES: Dict[str, float] = {"webhook.event": 0.1}
+    LOG_REDACT_PAYLOADS: bool = True
+    LOG_PAYLOAD_MAX_CHARS: int = 500
+    LOG_QUEUE_SIZE: int = 10000
+
+    # Trace/span ids per conversation turn (app/utils/tracing.py), exported as
+    # JSONL files (tools/traceReport.py) or to an OTLP/HTTP collector
+    TRACING_ENABLED: bool = False
+    TRACING_SAMPLE_RATE: float = 1.0  # fraction of webhook requests traced
+    TRACING_EXPORT: str = "file"  # file | otlp
+    TRACING_DIR: str = "./data/traces"
+    TRACING_OTLP_ENDPOINT: str = "http://localhost:4318/v1/traces"
+    TRACING_FLUSH_SECONDS: int = 5
+    TRACING_MAX_BUFFER: int = 50000
+
+    # Funnel rollups (/api/funnel): size of the time buckets; should divide a day
+    FUNNEL_BUCKET_MINUTES: int = 60
+
+    # Admin-only endpoints (/api/admin/*, X-Admin-Token header); empty = disabled
+    ADMIN_TOKEN: str = ""
+
+    # On-demand sampling profiler / tracemalloc diffs (app/services/profiler.py)
+    PROFILER_INTERVAL_MS: int = 10
+    PROFILER_MAX_SECONDS: int = 120
+    PROFILER_SIGNAL_SECONDS: int = 30  # SIGUSR2 -> profile written to PROFILER_OUTPUT_DIR
+    PROFILER_OUTPUT_DIR: str = "./data/profiles"
+    PROFILER_TRACEMALLOC_FRAMES: int = 10
+
+    # Inbound webhook capture for tools/replayTraffic.py (pseudonymised, gzip JSONL)
+    TRAFFIC_RECORDING_ENABLED: bool = False
+    TRAFFIC_RECORDING_DIR: str = "./data/traffic"
+    TRAFFIC_RECORDING_SECRET: str = ""  # HMAC key for pseudonyms; empty = new one per process
+    TRAFFIC_RECORDING_FLUSH_SECONDS: int = 5
+    TRAFFIC_RECORDING_MAX_BUFFER: int = 50000
+
     # Database (stored in /app/data so it persists across Docker rebuilds)
     DATABASE_URL: str = "sqlite:///./data/whatsapp_agents.db"
 
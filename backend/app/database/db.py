@@ -3,19 +3,30 @@ Database operations for conversation state management
 Uses SQLite for simplicity (can be upgraded to PostgreSQL later)
 """
 import logging
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
 
 from app.config.settings import settings
 from app.models.conversation import ConversationState
+from app.utils import tracing
+from app.utils.logs import redacted
+from app.utils.metrics import observeStage
 from sqlalchemy import (
     JSON,
     Boolean,
     Column,
     DateTime,
     Float,
+    Index,
     Integer,
     String,
+    UniqueConstraint,
+    case,
     create_engine,
+    event,
+    func,
+    inspect,
+    text,
 )
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
@@ -25,6 +36,25 @@ logger = logging.getLogger(__name__)
 # Database setup
 engine = create_engine(settings.DATABASE_URL, connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+# Every commit (flush included) is timed into the db_commit stage metric
+@event.listens_for(SessionLocal, "before_commit")
+def _commit_started(session):
+    session.info["commit_started"] = time.perf_counter()
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _commit_finished(session):
+    started = session.info.pop("commit_started", None)
+    if started is not None:
+        observeStage("db_commit", time.perf_counter() - started)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _commit_abandoned(session):
+    session.info.pop("commit_started", None)
+
 Base = declarative_base()
 
 # SQLAlchemy Model
@@ -35,6 +65,10 @@ class ConversationStateDB(Base):
     Database model for conversation state
     """
     __tablename__ = "conversation_states"
+    __table_args__ = (
+        # Campaign recipient selection: "everyone in <agent> idle since <time>"
+        Index("ix_conversation_states_agent_updated", "current_agent", "updated_at"),
+    )
 
     phone_number = Column(String, primary_key=True, index=True)
     user_name = Column(String, nullable=True)
@@ -55,11 +89,151 @@ class ConversationStateDB(Base):
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
     last_message_at = Column(DateTime, nullable=True)
     message_count = Column(Integer, default=0)
+    waha_session = Column(String, nullable=True)
+    stage_entered_at = Column(DateTime, nullable=True)  # when current_agent last changed
+
+
+class ScheduledActionDB(Base):
+    """
+    Pending human-behavior action (typing start/stop, delayed send),
+    persisted so scheduled replies survive a restart
+    """
+    __tablename__ = "scheduled_actions"
+
+    id = Column(String, primary_key=True)
+    due_at = Column(Float, index=True)
+    kind = Column(String)
+    chat_id = Column(String)
+    text = Column(String, nullable=True)
+    priority = Column(Integer, default=2)
+    group_id = Column(String, nullable=True, index=True)
+
+
+class OutboxMessageDB(Base):
+    """
+    Outgoing WhatsApp message, written in the same commit as the state change
+    that produced it and drained by the outbox worker
+    """
+    __tablename__ = "outbox_messages"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    idempotency_key = Column(String, unique=True, index=True)
+    chat_id = Column(String, index=True)
+    text = Column(String)
+    priority = Column(Integer, default=2)
+    deliver_at = Column(Float, index=True)  # epoch seconds
+    status = Column(String, default="pending", index=True)  # pending | sent | dead
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(Float, default=0.0)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    sent_at = Column(DateTime, nullable=True)
+    trace_parent = Column(String, nullable=True)  # W3C traceparent of the turn that queued it
+
+
+class CampaignDB(Base):
+    """
+    Bulk broadcast / re-engagement campaign
+    """
+    __tablename__ = "campaigns"
+
+    id = Column(String, primary_key=True)
+    name = Column(String)
+    message = Column(String)
+    filters = Column(JSON, nullable=True)
+    status = Column(String, default="running", index=True)  # running | paused | completed | cancelled
+    total = Column(Integer, default=0)
+    sent = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.now)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class CampaignRecipientDB(Base):
+    """
+    One recipient of a campaign and its delivery status (the resume checkpoint)
+    """
+    __tablename__ = "campaign_recipients"
+    __table_args__ = (
+        UniqueConstraint("campaign_id", "phone_number"),
+        Index("ix_campaign_recipients_campaign_status", "campaign_id", "status", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    campaign_id = Column(String)
+    phone_number = Column(String)
+    user_name = Column(String, nullable=True)
+    status = Column(String, default="pending")  # pending | sent | failed
+    error = Column(String, nullable=True)
+    sent_at = Column(DateTime, nullable=True)
+
+
+class FunnelCountDB(Base):
+    """
+    Current funnel counters, kept in step with conversation_states:
+    leads per stage / country / level / payment flag (dimension, value) and
+    cumulative stage entries (dimension "entered")
+    """
+    __tablename__ = "funnel_counts"
+
+    dimension = Column(String, primary_key=True)
+    value = Column(String, primary_key=True)
+    count = Column(Integer, default=0)
+
+
+class FunnelRollupDB(Base):
+    """
+    Funnel events per time bucket: new leads and payment flags turning on
+    (key = country), stage entries (key = stage)
+    """
+    __tablename__ = "funnel_rollups"
+
+    bucket_start = Column(DateTime, primary_key=True)
+    event = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)
+    count = Column(Integer, default=0)
+
+
+class StageDurationDB(Base):
+    """
+    Time-in-stage histogram per time bucket (bucket = when the stage was left)
+    """
+    __tablename__ = "stage_durations"
+
+    bucket_start = Column(DateTime, primary_key=True)
+    stage = Column(String, primary_key=True)
+    le = Column(String, primary_key=True)  # upper bound in seconds, or "+Inf"
+    count = Column(Integer, default=0)
+    seconds_sum = Column(Float, default=0.0)
 
 
 # Create tables
 Base.metadata.create_all(bind=engine)
 
+
+def _add_missing_columns():
+    """
+    create_all doesn't alter existing tables: add columns and indexes
+    introduced after a table was first created (columns nullable, no default)
+    """
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                    logger.warning(f"Added column {table.name}.{column.name}")
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+_add_missing_columns()
+
 # Database operations
 
 
@@ -81,9 +255,11 @@ async def get_conversation_state(phone_number: str) -> ConversationState:
                 updated_at=datetime.now()
             )
             db.add(db_state)
+            _track_funnel(db, db_state, None, _funnel_view(db_state))
             db.commit()
             db.refresh(db_state)
-            logger.info(f"Created new conversation state for {phone_number}")
+            logger.info("Created new conversation state for %s", redacted(phone_number),
+                        extra={"category": "db.state"})
 
         # Convert to Pydantic model
         return ConversationState(
@@ -105,7 +281,8 @@ async def get_conversation_state(phone_number: str) -> ConversationState:
             created_at=db_state.created_at,
             updated_at=db_state.updated_at,
             last_message_at=db_state.last_message_at,
-            message_count=db_state.message_count
+            message_count=db_state.message_count,
+            waha_session=db_state.waha_session
         )
     finally:
         db.close()
@@ -125,31 +302,258 @@ async def update_conversation_state(phone_number: str, state: ConversationState)
             db_state = ConversationStateDB(phone_number=phone_number)
             db.add(db_state)
 
-        # Update fields
-        db_state.user_name = state.user_name
-        db_state.user_country = state.user_country
-        db_state.user_level = state.user_level
-        db_state.current_agent = state.current_agent
-        db_state.greeter_step = state.greeter_step
-        db_state.consultant_step = state.consultant_step
-        db_state.closer_step = state.closer_step
-        db_state.upsell_step = state.upsell_step
-        db_state.final_price = state.final_price
-        db_state.waiting_for_payment_proof = state.waiting_for_payment_proof
-        db_state.payment_proof_received = state.payment_proof_received
-        db_state.payment_proof_image = state.payment_proof_image
-        db_state.payment_confirmed = state.payment_confirmed
-        db_state.product_delivered = state.product_delivered
-        db_state.updated_at = datetime.now()
-        db_state.last_message_at = datetime.now()
+        _apply_state(db, db_state, state)
         db_state.message_count += 1
 
         db.commit()
-        logger.info(f"Updated conversation state for {phone_number}")
+        logger.info("Updated conversation state for %s", redacted(phone_number), extra={"category": "db.state"})
     finally:
         db.close()
 
 
+def _apply_state(db, db_state: ConversationStateDB, state: ConversationState):
+    """
+    Copy conversation state fields onto the database row (and move the
+    funnel counters along in the same transaction)
+    """
+    before = None if inspect(db_state).pending else _funnel_view(db_state)
+    after = _funnel_view(state)
+    if before != after:
+        _track_funnel(db, db_state, before, after)
+    db_state.user_name = state.user_name
+    db_state.user_country = state.user_country
+    db_state.user_level = state.user_level
+    db_state.current_agent = state.current_agent
+    db_state.greeter_step = state.greeter_step
+    db_state.consultant_step = state.consultant_step
+    db_state.closer_step = state.closer_step
+    db_state.upsell_step = state.upsell_step
+    db_state.final_price = state.final_price
+    db_state.waiting_for_payment_proof = state.waiting_for_payment_proof
+    db_state.payment_proof_received = state.payment_proof_received
+    db_state.payment_proof_image = state.payment_proof_image
+    db_state.payment_confirmed = state.payment_confirmed
+    db_state.product_delivered = state.product_delivered
+    db_state.waha_session = state.waha_session
+    db_state.updated_at = datetime.now()
+    db_state.last_message_at = datetime.now()
+
+
+# Funnel counters: maintained on every state write, so /api/funnel never
+# scans conversation_states
+
+FUNNEL_STAGES = ("greeter", "consultant", "router", "closer", "upsell", "completed")
+FUNNEL_FLAGS = ("waiting_for_payment_proof", "payment_proof_received", "payment_confirmed", "product_delivered")
+# Time-in-stage histogram upper bounds (seconds): 10 seconds .. 1 week
+STAGE_SECONDS_BUCKETS = (10, 30, 60, 300, 900, 3600, 4 * 3600, 24 * 3600, 3 * 86400, 7 * 86400)
+
+
+def _funnel_view(source) -> dict:
+    """
+    The fields the funnel counts by, from a database row or a ConversationState
+    """
+    view = {
+        "stage": source.current_agent or "greeter",
+        "country": source.user_country or "unknown",
+        "level": source.user_level or "unknown",
+    }
+    for flag in FUNNEL_FLAGS:
+        view[flag] = bool(getattr(source, flag))
+    return view
+
+
+def _bucket_start(at: datetime) -> datetime:
+    minutes = settings.FUNNEL_BUCKET_MINUTES
+    at = at.replace(second=0, microsecond=0)
+    return at - timedelta(minutes=(at.hour * 60 + at.minute) % minutes)
+
+
+def _bump(db, model, keys: dict, **increments):
+    """
+    Add to the counter columns of one row (created on first use) with a
+    single UPDATE, so concurrent writers never lose increments
+    """
+    updated = db.query(model).filter_by(**keys).update(
+        {getattr(model, column): getattr(model, column) + amount for column, amount in increments.items()},
+        synchronize_session=False,
+    )
+    if not updated:
+        db.add(model(**keys, **increments))
+        db.flush()
+
+
+def _track_funnel(db, db_state: ConversationStateDB, before: dict | None, after: dict):
+    """
+    Move counters from the row's old funnel position to the new one
+    (`before` is None for a new conversation) and record the events
+    """
+    now = datetime.now()
+    bucket = _bucket_start(now)
+    if before is None:
+        _bump(db, FunnelCountDB, {"dimension": "leads", "value": "all"}, count=1)
+        _bump(db, FunnelRollupDB, {"bucket_start": bucket, "event": "new_lead", "key": after["country"]}, count=1)
+
+    for dimension in ("stage", "country", "level"):
+        if before is not None and before[dimension] == after[dimension]:
+            continue
+        if before is not None:
+            _bump(db, FunnelCountDB, {"dimension": dimension, "value": before[dimension]}, count=-1)
+        _bump(db, FunnelCountDB, {"dimension": dimension, "value": after[dimension]}, count=1)
+
+    if before is None or before["stage"] != after["stage"]:
+        if before is not None:
+            entered_at = db_state.stage_entered_at or db_state.created_at or now
+            seconds = max((now - entered_at).total_seconds(), 0.0)
+            le = next((str(bound) for bound in STAGE_SECONDS_BUCKETS if seconds <= bound), "+Inf")
+            _bump(db, StageDurationDB, {"bucket_start": bucket, "stage": before["stage"], "le": le},
+                  count=1, seconds_sum=seconds)
+        _bump(db, FunnelRollupDB, {"bucket_start": bucket, "event": "entered", "key": after["stage"]}, count=1)
+        db_state.stage_entered_at = now
+
+    for flag in FUNNEL_FLAGS:
+        was_set = before is not None and before[flag]
+        if was_set == after[flag]:
+            continue
+        _bump(db, FunnelCountDB, {"dimension": "flag", "value": flag}, count=1 if after[flag] else -1)
+        if after[flag]:
+            _bump(db, FunnelRollupDB, {"bucket_start": bucket, "event": flag, "key": after["country"]}, count=1)
+
+
+def _untrack_funnel(db, view: dict):
+    """
+    Take a deleted conversation out of the current counters (history stays)
+    """
+    _bump(db, FunnelCountDB, {"dimension": "leads", "value": "all"}, count=-1)
+    for dimension in ("stage", "country", "level"):
+        _bump(db, FunnelCountDB, {"dimension": dimension, "value": view[dimension]}, count=-1)
+    for flag in FUNNEL_FLAGS:
+        if view[flag]:
+            _bump(db, FunnelCountDB, {"dimension": "flag", "value": flag}, count=-1)
+
+
+def backfill_funnel_counts():
+    """
+    Seed the current counters from existing conversations (one scan, only
+    when the counters are empty; called once at startup, via to_thread);
+    stage entries and time in stage start being recorded from then on
+    """
+    db = SessionLocal()
+    try:
+        if db.query(FunnelCountDB).first() is not None:
+            return
+        total = db.query(func.count(ConversationStateDB.phone_number)).scalar()
+        if not total:
+            return
+        counts = {("leads", "all"): total}
+        groups = {
+            "stage": func.coalesce(ConversationStateDB.current_agent, "greeter"),
+            "country": func.coalesce(ConversationStateDB.user_country, "unknown"),
+            "level": func.coalesce(ConversationStateDB.user_level, "unknown"),
+        }
+        for dimension, column in groups.items():
+            for value, count in db.query(column, func.count()).group_by(column):
+                counts[(dimension, value)] = count
+        for flag in FUNNEL_FLAGS:
+            column = getattr(ConversationStateDB, flag)
+            counts[("flag", flag)] = db.query(func.count()).filter(column.is_(True)).scalar()
+        db.add_all([
+            FunnelCountDB(dimension=dimension, value=value, count=count)
+            for (dimension, value), count in counts.items()
+        ])
+        db.commit()
+        logger.warning(f"Seeded funnel counters from {total} existing conversations")
+    finally:
+        db.close()
+
+
+async def get_funnel_metrics(hours: int = 24) -> dict:
+    """
+    Funnel counts, conversion rates, time in stage and per-bucket events for
+    the last `hours`, read from the counter and rollup tables
+    """
+    db = SessionLocal()
+    try:
+        counts: dict[str, dict[str, int]] = {}
+        for row in db.query(FunnelCountDB).all():
+            if row.count:
+                counts.setdefault(row.dimension, {})[row.value] = row.count
+
+        since = _bucket_start(datetime.now() - timedelta(hours=hours))
+        timeline: dict[datetime, dict] = {}
+        for row in db.query(FunnelRollupDB).filter(FunnelRollupDB.bucket_start >= since):
+            bucket = timeline.setdefault(row.bucket_start, {})
+            bucket.setdefault(row.event, {})[row.key] = row.count
+
+        durations: dict[str, dict[str, list]] = {}
+        for row in db.query(StageDurationDB).filter(StageDurationDB.bucket_start >= since):
+            per_le = durations.setdefault(row.stage, {})
+            totals = per_le.setdefault(row.le, [0, 0.0])
+            totals[0] += row.count
+            totals[1] += row.seconds_sum
+    finally:
+        db.close()
+
+    by_stage = counts.get("stage", {})
+    flags = counts.get("flag", {})
+    leads = counts.get("leads", {}).get("all", 0)
+    return {
+        "leads": leads,
+        "by_stage": by_stage,
+        "by_country": counts.get("country", {}),
+        "by_level": counts.get("level", {}),
+        "flags": {flag: flags.get(flag, 0) for flag in FUNNEL_FLAGS},
+        "conversion": _conversion_rates(by_stage, flags, leads),
+        "window_hours": hours,
+        "time_in_stage": {stage: _duration_summary(per_le) for stage, per_le in durations.items()},
+        "timeline": [
+            {"bucket_start": bucket_start.isoformat(), **events}
+            for bucket_start, events in sorted(timeline.items())
+        ],
+    }
+
+
+def _conversion_rates(by_stage: dict, flags: dict, leads: int) -> dict:
+    """
+    Stage-to-stage conversion over leads that reached at least each stage
+    (the stages are sequential), plus payment conversion over all leads
+    """
+    reached = [sum(by_stage.get(stage, 0) for stage in FUNNEL_STAGES[index:]) for index in range(len(FUNNEL_STAGES))]
+    rates = {
+        f"{FUNNEL_STAGES[index]}->{FUNNEL_STAGES[index + 1]}":
+            round(reached[index + 1] / reached[index], 4) if reached[index] else None
+        for index in range(len(FUNNEL_STAGES) - 1)
+    }
+    for flag in ("payment_proof_received", "payment_confirmed", "product_delivered"):
+        rates[f"lead->{flag}"] = round(flags.get(flag, 0) / leads, 4) if leads else None
+    return rates
+
+
+def _duration_summary(per_le: dict[str, list]) -> dict:
+    bounds = [*STAGE_SECONDS_BUCKETS, None]
+    counts = [per_le.get(str(bound) if bound else "+Inf", [0, 0.0])[0] for bound in bounds]
+    total = sum(counts)
+    seconds = sum(value[1] for value in per_le.values())
+
+    def quantile(q: float) -> float | None:
+        rank, cumulative = q * total, 0
+        for index, count in enumerate(counts):
+            if count and cumulative + count >= rank:
+                if bounds[index] is None:
+                    return float(STAGE_SECONDS_BUCKETS[-1])
+                lower = STAGE_SECONDS_BUCKETS[index - 1] if index else 0
+                return round(lower + (bounds[index] - lower) * (rank - cumulative) / count, 1)
+            cumulative += count
+        return None
+
+    return {
+        "count": total,
+        "mean_s": round(seconds / total, 1) if total else None,
+        "p50_s": quantile(0.5),
+        "p90_s": quantile(0.9),
+        "histogram": {str(bound) if bound else "+Inf": count for bound, count in zip(bounds, counts)},
+    }
+
+
 async def get_all_conversations() -> list:
     """
     Get all active conversations
@@ -180,10 +584,472 @@ async def delete_conversation_state(phone_number: str):
     """
     db = SessionLocal()
     try:
-        db.query(ConversationStateDB).filter(
+        db_state = db.query(ConversationStateDB).filter(
             ConversationStateDB.phone_number == phone_number
-        ).delete()
+        ).first()
+        if db_state:
+            _untrack_funnel(db, _funnel_view(db_state))
+            db.delete(db_state)
         db.commit()
         logger.info(f"Deleted conversation state for {phone_number}")
     finally:
         db.close()
+
+
+async def save_scheduled_actions(actions: list[dict]):
+    """
+    Persist scheduled actions (one commit for the whole batch)
+    """
+    if not actions:
+        return
+    db = SessionLocal()
+    try:
+        db.add_all([ScheduledActionDB(**action) for action in actions])
+        db.commit()
+    finally:
+        db.close()
+
+
+async def delete_scheduled_actions(ids: list[str] | None = None, group_id: str | None = None):
+    """
+    Delete executed or cancelled scheduled actions, by id or by group
+    """
+    db = SessionLocal()
+    try:
+        query = db.query(ScheduledActionDB)
+        if ids:
+            query = query.filter(ScheduledActionDB.id.in_(ids))
+        elif group_id:
+            query = query.filter(ScheduledActionDB.group_id == group_id)
+        else:
+            return
+        query.delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+async def load_scheduled_actions() -> list[dict]:
+    """
+    Load all pending scheduled actions, oldest first
+    """
+    db = SessionLocal()
+    try:
+        rows = db.query(ScheduledActionDB).order_by(ScheduledActionDB.due_at).all()
+        return [
+            {
+                "id": row.id,
+                "due_at": row.due_at,
+                "kind": row.kind,
+                "chat_id": row.chat_id,
+                "text": row.text,
+                "priority": row.priority,
+                "group_id": row.group_id,
+            }
+            for row in rows
+        ]
+    finally:
+        db.close()
+
+
+async def load_session_bindings() -> dict[str, str]:
+    """
+    Stored conversation → WAHA session assignments
+    """
+    db = SessionLocal()
+    try:
+        rows = db.query(ConversationStateDB.phone_number, ConversationStateDB.waha_session).filter(
+            ConversationStateDB.waha_session.isnot(None)
+        ).all()
+        return {phone_number: session for phone_number, session in rows}
+    finally:
+        db.close()
+
+
+async def enqueue_outbox_messages(messages: list[dict], state: ConversationState | None = None) -> int:
+    """
+    Insert outgoing messages into the outbox. When `state` is given, the
+    conversation state is written in the same transaction, so a reply is
+    never persisted without its state change (or the other way round).
+    If any idempotency key already exists the batch was committed before:
+    nothing is written, neither the messages nor the state.
+    Returns the number of messages inserted.
+    """
+    db = SessionLocal()
+    try:
+        keys = [message["idempotency_key"] for message in messages]
+        existing = db.query(OutboxMessageDB.idempotency_key).filter(
+            OutboxMessageDB.idempotency_key.in_(keys)
+        ).count()
+        if existing:
+            logger.warning(f"Skipped duplicate outbox batch ({existing} of {len(keys)} key(s) already queued)")
+            return 0
+
+        trace_parent = tracing.traceparent()
+        db.add_all([OutboxMessageDB(trace_parent=trace_parent, **message) for message in messages])
+
+        if state is not None:
+            db_state = db.query(ConversationStateDB).filter(
+                ConversationStateDB.phone_number == state.phone_number
+            ).first()
+            if not db_state:
+                db_state = ConversationStateDB(phone_number=state.phone_number, message_count=0)
+                db.add(db_state)
+            _apply_state(db, db_state, state)
+            db_state.message_count += 1
+
+        db.commit()
+        return len(messages)
+    finally:
+        db.close()
+
+
+async def outbox_message_exists(idempotency_key: str) -> bool:
+    """
+    Whether a message with this idempotency key is in the outbox (in any status)
+    """
+    db = SessionLocal()
+    try:
+        return db.query(OutboxMessageDB.id).filter(
+            OutboxMessageDB.idempotency_key == idempotency_key
+        ).first() is not None
+    finally:
+        db.close()
+
+
+async def load_due_outbox_messages(now: float, limit: int) -> list[dict]:
+    """
+    Pending outbox messages that are due, at most one per chat (the oldest),
+    so messages to the same chat go out in order
+    """
+    db = SessionLocal()
+    try:
+        rows = db.query(OutboxMessageDB).filter(
+            OutboxMessageDB.status == "pending",
+            OutboxMessageDB.deliver_at <= now
+        ).order_by(OutboxMessageDB.deliver_at, OutboxMessageDB.id).limit(limit * 4).all()
+
+        due, seen_chats = [], set()
+        for row in rows:
+            if row.chat_id in seen_chats:
+                continue
+            seen_chats.add(row.chat_id)
+            # A chat whose head message is backing off blocks its later messages
+            if row.next_attempt_at <= now:
+                due.append({
+                    "id": row.id,
+                    "chat_id": row.chat_id,
+                    "text": row.text,
+                    "priority": row.priority,
+                    "attempts": row.attempts,
+                    "trace_parent": row.trace_parent,
+                })
+            if len(due) >= limit:
+                break
+        return due
+    finally:
+        db.close()
+
+
+async def get_next_outbox_due() -> float | None:
+    """
+    Epoch time at which the next pending outbox message becomes sendable
+    """
+    db = SessionLocal()
+    try:
+        sendable_at = case(
+            (OutboxMessageDB.next_attempt_at > OutboxMessageDB.deliver_at, OutboxMessageDB.next_attempt_at),
+            else_=OutboxMessageDB.deliver_at
+        )
+        next_due = db.query(func.min(sendable_at)).filter(OutboxMessageDB.status == "pending").scalar()
+        return float(next_due) if next_due is not None else None
+    finally:
+        db.close()
+
+
+async def mark_outbox_sent(message_id: int):
+    """
+    Mark an outbox message as delivered
+    """
+    db = SessionLocal()
+    try:
+        db.query(OutboxMessageDB).filter(OutboxMessageDB.id == message_id).update(
+            {"status": "sent", "sent_at": datetime.now(), "last_error": None},
+            synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+async def mark_outbox_failed(message_id: int, attempts: int, next_attempt_at: float, error: str, dead: bool):
+    """
+    Record a failed delivery attempt; `dead` moves the message to the dead letters
+    """
+    db = SessionLocal()
+    try:
+        db.query(OutboxMessageDB).filter(OutboxMessageDB.id == message_id).update(
+            {
+                "status": "dead" if dead else "pending",
+                "attempts": attempts,
+                "next_attempt_at": next_attempt_at,
+                "last_error": error[:500],
+            },
+            synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+async def defer_outbox_message(message_id: int, next_attempt_at: float):
+    """
+    Push a pending message's next attempt back without counting an attempt
+    """
+    db = SessionLocal()
+    try:
+        db.query(OutboxMessageDB).filter(OutboxMessageDB.id == message_id).update(
+            {"next_attempt_at": next_attempt_at}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+async def get_outbox_stats(dead_limit: int = 20) -> dict:
+    """
+    Outbox counts by status, plus the most recent dead letters
+    """
+    db = SessionLocal()
+    try:
+        counts = dict(
+            db.query(OutboxMessageDB.status, func.count(OutboxMessageDB.id))
+            .group_by(OutboxMessageDB.status).all()
+        )
+        dead = db.query(OutboxMessageDB).filter(
+            OutboxMessageDB.status == "dead"
+        ).order_by(OutboxMessageDB.id.desc()).limit(dead_limit).all()
+        return {
+            "counts": counts,
+            "dead_letters": [
+                {
+                    "id": row.id,
+                    "chat_id": row.chat_id,
+                    "attempts": row.attempts,
+                    "last_error": row.last_error,
+                    "created_at": row.created_at,
+                }
+                for row in dead
+            ],
+        }
+    finally:
+        db.close()
+
+
+async def requeue_outbox_message(message_id: int) -> bool:
+    """
+    Move a dead letter back to pending for another round of attempts
+    """
+    db = SessionLocal()
+    try:
+        updated = db.query(OutboxMessageDB).filter(
+            OutboxMessageDB.id == message_id,
+            OutboxMessageDB.status == "dead"
+        ).update(
+            {"status": "pending", "attempts": 0, "next_attempt_at": 0.0},
+            synchronize_session=False
+        )
+        db.commit()
+        return bool(updated)
+    finally:
+        db.close()
+
+
+def _conversation_filter(query, current_agent: str | None, idle_hours: float | None):
+    if current_agent:
+        query = query.filter(ConversationStateDB.current_agent == current_agent)
+    if idle_hours:
+        cutoff = datetime.now() - timedelta(hours=idle_hours)
+        query = query.filter(ConversationStateDB.updated_at < cutoff)
+    return query
+
+
+async def count_campaign_candidates(current_agent: str | None = None, idle_hours: float | None = None) -> int:
+    """
+    Number of conversations matching campaign filters (dry run)
+    """
+    db = SessionLocal()
+    try:
+        query = db.query(func.count(ConversationStateDB.phone_number))
+        return _conversation_filter(query, current_agent, idle_hours).scalar()
+    finally:
+        db.close()
+
+
+async def create_campaign(
+    campaign_id: str,
+    name: str,
+    message: str,
+    current_agent: str | None = None,
+    idle_hours: float | None = None,
+    limit: int | None = None
+) -> dict:
+    """
+    Create a campaign and snapshot its recipients (indexed on current_agent,
+    updated_at) in one transaction
+    """
+    db = SessionLocal()
+    try:
+        query = db.query(ConversationStateDB.phone_number, ConversationStateDB.user_name)
+        query = _conversation_filter(query, current_agent, idle_hours).order_by(ConversationStateDB.updated_at)
+        if limit:
+            query = query.limit(limit)
+        recipients = query.all()
+
+        campaign = CampaignDB(
+            id=campaign_id,
+            name=name,
+            message=message,
+            filters={"current_agent": current_agent, "idle_hours": idle_hours, "limit": limit},
+            status="running",
+            total=len(recipients),
+            created_at=datetime.now(),
+        )
+        db.add(campaign)
+        db.bulk_insert_mappings(CampaignRecipientDB, [
+            {"campaign_id": campaign_id, "phone_number": phone_number, "user_name": user_name, "status": "pending"}
+            for phone_number, user_name in recipients
+        ])
+        db.commit()
+        logger.info(f"Created campaign {campaign_id} ({name}) with {len(recipients)} recipients")
+        return _campaign_dict(campaign)
+    finally:
+        db.close()
+
+
+def _campaign_dict(campaign: CampaignDB) -> dict:
+    return {
+        "id": campaign.id,
+        "name": campaign.name,
+        "message": campaign.message,
+        "filters": campaign.filters,
+        "status": campaign.status,
+        "total": campaign.total,
+        "sent": campaign.sent,
+        "failed": campaign.failed,
+        "created_at": campaign.created_at,
+        "finished_at": campaign.finished_at,
+    }
+
+
+async def get_campaign(campaign_id: str) -> dict | None:
+    """
+    Campaign with its progress counters
+    """
+    db = SessionLocal()
+    try:
+        campaign = db.query(CampaignDB).filter(CampaignDB.id == campaign_id).first()
+        return _campaign_dict(campaign) if campaign else None
+    finally:
+        db.close()
+
+
+async def list_campaigns(status: str | None = None) -> list[dict]:
+    """
+    All campaigns, newest first
+    """
+    db = SessionLocal()
+    try:
+        query = db.query(CampaignDB)
+        if status:
+            query = query.filter(CampaignDB.status == status)
+        return [_campaign_dict(campaign) for campaign in query.order_by(CampaignDB.created_at.desc())]
+    finally:
+        db.close()
+
+
+async def set_campaign_status(campaign_id: str, status: str) -> bool:
+    """
+    Change a campaign's status (pause, resume, cancel, complete)
+    """
+    db = SessionLocal()
+    try:
+        values = {"status": status}
+        if status in ("completed", "cancelled"):
+            values["finished_at"] = datetime.now()
+        updated = db.query(CampaignDB).filter(CampaignDB.id == campaign_id).update(
+            values, synchronize_session=False)
+        db.commit()
+        return bool(updated)
+    finally:
+        db.close()
+
+
+async def load_pending_recipients(campaign_id: str, after_id: int, limit: int) -> list[dict]:
+    """
+    Next page of pending recipients (keyset pagination on id)
+    """
+    db = SessionLocal()
+    try:
+        rows = db.query(CampaignRecipientDB).filter(
+            CampaignRecipientDB.campaign_id == campaign_id,
+            CampaignRecipientDB.status == "pending",
+            CampaignRecipientDB.id > after_id
+        ).order_by(CampaignRecipientDB.id).limit(limit).all()
+        return [
+            {"id": row.id, "phone_number": row.phone_number, "user_name": row.user_name}
+            for row in rows
+        ]
+    finally:
+        db.close()
+
+
+async def save_recipient_results(campaign_id: str, results: list[dict]):
+    """
+    Checkpoint a batch of recipient outcomes and the campaign counters
+    in one commit
+    """
+    if not results:
+        return
+    db = SessionLocal()
+    try:
+        now = datetime.now()
+        db.bulk_update_mappings(CampaignRecipientDB, [
+            {
+                "id": result["id"],
+                "status": result["status"],
+                "error": result.get("error"),
+                "sent_at": now if result["status"] == "sent" else None,
+            }
+            for result in results
+        ])
+        sent = sum(1 for result in results if result["status"] == "sent")
+        db.query(CampaignDB).filter(CampaignDB.id == campaign_id).update(
+            {"sent": CampaignDB.sent + sent, "failed": CampaignDB.failed + (len(results) - sent)},
+            synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+async def get_campaign_recipients(campaign_id: str, status: str | None = None, limit: int = 100) -> list[dict]:
+    """
+    Recipients of a campaign with their delivery status
+    """
+    db = SessionLocal()
+    try:
+        query = db.query(CampaignRecipientDB).filter(CampaignRecipientDB.campaign_id == campaign_id)
+        if status:
+            query = query.filter(CampaignRecipientDB.status == status)
+        return [
+            {
+                "phone_number": row.phone_number,
+                "status": row.status,
+                "error": row.error,
+                "sent_at": row.sent_at,
+            }
+            for row in query.order_by(CampaignRecipientDB.id).limit(limit)
+        ]
+    finally:
+        db.close()
@@ -1,13 +1,67 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from app.api.routes import router as api_router
 from app.api.webhooks import router as webhook_router
 from app.config.settings import settings
+from app.database.db import backfill_funnel_counts, load_session_bindings
+from app.services.actionScheduler import action_scheduler
+from app.services.campaignRunner import campaign_runner
+from app.services.loopMonitor import loop_monitor
+from app.services.notificationDigest import notification_digest
+from app.services.outboxWorker import outbox_worker
+from app.services.presenceSignals import presence_signals
+from app.services.profiler import sampling_profiler
+from app.services.sessionPool import session_pool
+from app.services.traceExporter import trace_exporter
+from app.services.trafficRecorder import traffic_recorder
+from app.services.usageTracker import usage_tracker
+from app.services.wahaHealth import waha_health
+from app.utils import metrics
+from app.utils.logs import configureLogging, stopLogging
+from app.utils.tracing import TracingMiddleware
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+
+
+configureLogging()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background workers on startup and stop them on shutdown."""
+    session_pool.warm(await load_session_bindings())
+    await asyncio.to_thread(backfill_funnel_counts)
+    await action_scheduler.start()
+    await campaign_runner.resumeInterrupted()
+    sampling_profiler.installSignalHandler()
+    background_tasks = [
+        asyncio.create_task(usage_tracker.runFlusher()),
+        asyncio.create_task(outbox_worker.run()),
+        asyncio.create_task(waha_health.runProber()),
+        asyncio.create_task(traffic_recorder.runFlusher()),
+        asyncio.create_task(loop_monitor.run()),
+        asyncio.create_task(trace_exporter.runFlusher()),
+    ]
+    yield
+    await notification_digest.flush()
+    await action_scheduler.stop()
+    await outbox_worker.stop()
+    await presence_signals.stop()
+    for task in background_tasks:
+        task.cancel()
+    usage_tracker.flush()
+    traffic_recorder.flush()
+    trace_exporter.flush()
+    stopLogging()
+
 
 app = FastAPI(
     title="WhatsApp Agent System",
     description="Multi-agent system for infoproduct sales via WhatsApp",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS configuration
@@ -19,6 +73,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# One trace per webhook request (TRACING_ENABLED)
+app.add_middleware(TracingMiddleware)
+
 # Include routers
 app.include_router(webhook_router, prefix="/webhooks", tags=["webhooks"])
 app.include_router(api_router, prefix="/api", tags=["api"])
@@ -36,3 +93,9 @@ async def root():
 @app.get("/health")
 async def health():
     return {"status": "healthy"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Stage latency histograms in the Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
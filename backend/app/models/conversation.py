@@ -45,6 +45,9 @@ class ConversationState(BaseModel):
     # Conversation History (optional - for analytics)
     message_count: int = 0
 
+    # WAHA session (WhatsApp number) this conversation is pinned to
+    waha_session: Optional[str] = None
+
     class Config:
         from_attributes = True
 
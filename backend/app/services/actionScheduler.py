@@ -0,0 +1,196 @@
+"""
+Action Scheduler - Runs delayed human-behavior actions from a single driver task
+Due actions are popped from a heap; long-delayed ones can be persisted across restarts.
+"""
+import asyncio
+import contextvars
+import heapq
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+from app.config.settings import settings
+from app.database.db import delete_scheduled_actions, load_scheduled_actions, save_scheduled_actions
+
+logger = logging.getLogger(__name__)
+
+# Typing indicators older than this after a restart are pointless; skip them
+_STALE_TYPING_SECONDS = 30
+# How long shutdown waits for handlers that are already running
+_STOP_TIMEOUT_SECONDS = 5
+# Actions due sooner than this are not persisted: they would be over (or
+# stale) by the time a restarted process reloads them
+_PERSIST_MIN_DELAY_SECONDS = 5
+
+
+@dataclass(order=True, slots=True)
+class ScheduledAction:
+    due_at: float  # epoch seconds
+    id: str = field(compare=False, default_factory=lambda: uuid.uuid4().hex)
+    kind: str = field(compare=False, default="send")  # typing_start | typing_stop | send
+    chat_id: str = field(compare=False, default="")
+    text: str | None = field(compare=False, default=None)
+    priority: int = field(compare=False, default=2)
+    group_id: str | None = field(compare=False, default=None)
+
+    def toRow(self) -> dict:
+        return {
+            "id": self.id,
+            "due_at": self.due_at,
+            "kind": self.kind,
+            "chat_id": self.chat_id,
+            "text": self.text,
+            "priority": self.priority,
+            "group_id": self.group_id,
+        }
+
+
+class ActionScheduler:
+    """
+    Heap of scheduled actions driven by one task. Handlers are registered per
+    action kind by the services that own them (e.g. EvolutionApiService).
+    """
+
+    def __init__(self):
+        self._heap: list[ScheduledAction] = []
+        self._handlers: dict[str, Callable[[ScheduledAction], Awaitable]] = {}
+        self._cancelled_groups: set[str] = set()
+        self._wakeup: asyncio.Event | None = None
+        self._driver: asyncio.Task | None = None
+        # The loop only holds weak references to tasks: keep running handlers alive
+        self._running: set[asyncio.Task] = set()
+        # Ids of the heap's actions that have a database row
+        self._persisted: set[str] = set()
+        self._executed: dict[str, int] = {}
+        self._max_lateness = 0.0
+
+    def registerHandler(self, kind: str, handler: Callable[[ScheduledAction], Awaitable]) -> None:
+        self._handlers[kind] = handler
+
+    async def schedule(self, actions: list[ScheduledAction]) -> None:
+        """Add actions to the heap (persisting the long-delayed ones) in one go."""
+        if settings.SCHEDULED_ACTIONS_PERSIST:
+            horizon = time.time() + _PERSIST_MIN_DELAY_SECONDS
+            durable = [action for action in actions if action.due_at > horizon]
+            if durable:
+                try:
+                    await save_scheduled_actions([action.toRow() for action in durable])
+                    self._persisted.update(action.id for action in durable)
+                except Exception as e:
+                    logger.error(f"Could not persist scheduled actions: {str(e)}")
+        for action in actions:
+            heapq.heappush(self._heap, action)
+        self._ensureDriver()
+        self._wakeup.set()
+
+    async def cancelGroup(self, group_id: str) -> None:
+        """Cancel every pending action of a group (e.g. one reply)."""
+        self._cancelled_groups.add(group_id)
+        persisted = [a.id for a in self._heap if a.group_id == group_id and a.id in self._persisted]
+        if persisted:
+            await delete_scheduled_actions(group_id=group_id)
+            self._persisted.difference_update(persisted)
+
+    async def start(self) -> None:
+        """Reload actions persisted before a restart and start the driver."""
+        if settings.SCHEDULED_ACTIONS_PERSIST:
+            now = time.time()
+            stale = []
+            for row in await load_scheduled_actions():
+                action = ScheduledAction(**row)
+                if action.kind != "send" and now - action.due_at > _STALE_TYPING_SECONDS:
+                    stale.append(action.id)
+                    continue
+                heapq.heappush(self._heap, action)
+                self._persisted.add(action.id)
+            if stale:
+                await delete_scheduled_actions(ids=stale)
+            if self._heap:
+                logger.warning(f"[scheduler] restored {len(self._heap)} pending actions")
+        self._ensureDriver()
+
+    async def stop(self) -> None:
+        """Stop the driver and let handlers already running finish (on shutdown)."""
+        if self._driver is not None:
+            self._driver.cancel()
+            self._driver = None
+        if self._running:
+            await asyncio.wait(set(self._running), timeout=_STOP_TIMEOUT_SECONDS)
+
+    def pending(self) -> int:
+        return len(self._heap)
+
+    def snapshot(self) -> dict:
+        return {
+            "pending": len(self._heap),
+            "next_due_in_s": round(self._heap[0].due_at - time.time(), 3) if self._heap else None,
+            "executed": dict(self._executed),
+            "max_lateness_s": round(self._max_lateness, 3),
+        }
+
+    # ── Driver ────────────────────────────────────────────────────────────────
+
+    def _ensureDriver(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._driver is None or self._driver.done() or self._driver.get_loop() is not loop:
+            self._wakeup = asyncio.Event()
+            # Fresh context: the driver outlives the request that started it
+            self._driver = loop.create_task(self._drive(), context=contextvars.Context())
+
+    async def _drive(self) -> None:
+        while True:
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            delay = self._heap[0].due_at - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            now = time.time()
+            done_ids = []
+            while self._heap and self._heap[0].due_at <= now:
+                action = heapq.heappop(self._heap)
+                done_ids.append(action.id)
+                if action.group_id in self._cancelled_groups:
+                    continue
+                self._run(action, now)
+
+            if not any(a.group_id in self._cancelled_groups for a in self._heap):
+                self._cancelled_groups.clear()
+            done_ids = [action_id for action_id in done_ids if action_id in self._persisted]
+            if done_ids:
+                self._persisted.difference_update(done_ids)
+                try:
+                    await delete_scheduled_actions(ids=done_ids)
+                except Exception as e:
+                    logger.error(f"Could not clear executed actions: {str(e)}")
+
+    def _run(self, action: ScheduledAction, now: float) -> None:
+        handler = self._handlers.get(action.kind)
+        if handler is None:
+            logger.error(f"[scheduler] no handler for action kind {action.kind}")
+            return
+        self._executed[action.kind] = self._executed.get(action.kind, 0) + 1
+        self._max_lateness = max(self._max_lateness, now - action.due_at)
+        # Handlers run as their own tasks so a slow WAHA call never stalls the driver
+        running = asyncio.create_task(self._safeRun(handler, action))
+        self._running.add(running)
+        running.add_done_callback(self._running.discard)
+
+    @staticmethod
+    async def _safeRun(handler: Callable[[ScheduledAction], Awaitable], action: ScheduledAction) -> None:
+        try:
+            await handler(action)
+        except Exception as e:
+            logger.error(f"[scheduler] {action.kind} for {action.chat_id} failed: {str(e)}")
+
+
+action_scheduler = ActionScheduler()
@@ -0,0 +1,121 @@
+"""
+Campaign Runner - Throttled bulk sends for broadcast / re-engagement campaigns
+Progress is checkpointed per page, so a campaign resumes where it stopped.
+"""
+import asyncio
+import logging
+import time
+
+from app.config.settings import settings
+from app.database.db import (
+    get_campaign,
+    list_campaigns,
+    load_pending_recipients,
+    save_recipient_results,
+    set_campaign_status,
+)
+from app.services.sendScheduler import PRIORITY_LOW, TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+def renderCampaignMessage(template: str, user_name: str | None) -> str:
+    """
+    Fill the `{name}` placeholder (only that one, so other braces are left
+    alone); a missing name doesn't leave "Hola , ..." behind.
+    """
+    return template.replace("{name}", user_name or "").replace(" ,", ",")
+
+
+class CampaignRunner:
+    """Runs campaigns as background tasks; one task per running campaign."""
+
+    def __init__(self):
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._stop: dict[str, str] = {}  # campaign_id -> status to stop with
+        self._bucket: TokenBucket | None = None
+
+    def isRunning(self, campaign_id: str) -> bool:
+        task = self._tasks.get(campaign_id)
+        return task is not None and not task.done()
+
+    def start(self, campaign_id: str) -> None:
+        if self.isRunning(campaign_id):
+            return
+        self._stop.pop(campaign_id, None)
+        self._tasks[campaign_id] = asyncio.create_task(self._run(campaign_id))
+
+    async def stop(self, campaign_id: str, status: str) -> None:
+        """Pause or cancel: finishes the current page, then stops."""
+        if self.isRunning(campaign_id):
+            self._stop[campaign_id] = status
+        else:
+            await set_campaign_status(campaign_id, status)
+
+    async def resumeInterrupted(self) -> None:
+        """Restart campaigns left running by a previous process."""
+        for campaign in await list_campaigns(status="running"):
+            logger.warning(f"[campaign] resuming {campaign['id']} ({campaign['sent'] + campaign['failed']}"
+                           f"/{campaign['total']} done)")
+            self.start(campaign["id"])
+
+    async def _run(self, campaign_id: str) -> None:
+        campaign = await get_campaign(campaign_id)
+        if campaign is None:
+            return
+        await set_campaign_status(campaign_id, "running")
+        started = time.monotonic()
+        after_id = 0
+
+        try:
+            while campaign_id not in self._stop:
+                page = await load_pending_recipients(campaign_id, after_id, settings.CAMPAIGN_PAGE_SIZE)
+                if not page:
+                    break
+                after_id = page[-1]["id"]
+                results = await self._sendPage(campaign_id, campaign["message"], page)
+                await save_recipient_results(campaign_id, results)
+
+            status = self._stop.pop(campaign_id, "completed")
+            await set_campaign_status(campaign_id, status)
+            logger.info(f"[campaign] {campaign_id} {status} after {time.monotonic() - started:.0f}s")
+        except Exception as e:
+            # Left as "running": resumed on the next start from the last checkpoint
+            logger.error(f"[campaign] {campaign_id} interrupted: {str(e)}")
+
+    async def _sendPage(self, campaign_id: str, template: str, page: list[dict]) -> list[dict]:
+        from app.services.evolutionApi import EvolutionApiService
+
+        service = EvolutionApiService()
+        semaphore = asyncio.Semaphore(settings.CAMPAIGN_CONCURRENCY)
+
+        async def send(recipient: dict) -> dict | None:
+            async with semaphore:
+                if campaign_id in self._stop:
+                    return None  # stays pending for a resume
+                await self._throttle()
+                try:
+                    await service.sendTextMessage(
+                        recipient["phone_number"],
+                        renderCampaignMessage(template, recipient["user_name"]),
+                        priority=PRIORITY_LOW
+                    )
+                    return {"id": recipient["id"], "status": "sent"}
+                except Exception as e:
+                    return {"id": recipient["id"], "status": "failed", "error": str(e)[:300]}
+
+        results = await asyncio.gather(*(send(recipient) for recipient in page))
+        return [result for result in results if result is not None]
+
+    async def _throttle(self) -> None:
+        if self._bucket is None:
+            self._bucket = TokenBucket(settings.CAMPAIGN_RATE, settings.CAMPAIGN_BURST)
+        while True:
+            wait = self._bucket.waitTime(time.monotonic())
+            if wait <= 0:
+                self._bucket.take(time.monotonic())
+                return
+            await asyncio.sleep(wait)
+
+
+campaign_runner = CampaignRunner()
@@ -0,0 +1,122 @@
+"""
+Loop Monitor - Event-loop lag sampling and blocking-call detection
+The watchdog thread (debug only) logs the stack of whatever blocks the loop.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+
+from app.config.settings import settings
+from app.utils.metrics import loop_lag_seconds, loop_stalls_total
+
+logger = logging.getLogger(__name__)
+
+_APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Hot spots kept (most frequent first)
+_MAX_HOT_SPOTS = 50
+
+
+class LoopMonitor:
+    """Samples loop lag and, optionally, dumps the stack of blocking code."""
+
+    def __init__(self):
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: int | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._max_lag = 0.0
+        self._stalls = 0
+        self._longest_stall = 0.0
+        self._hot_spots: dict[str, int] = {}
+
+    async def run(self) -> None:
+        """Lag sampler; started from the app lifespan."""
+        self._loop_thread_id = threading.get_ident()
+        if settings.LOOP_WATCHDOG_ENABLED:
+            self._startWatchdog()
+        interval = settings.LOOP_LAG_SAMPLE_SECONDS
+        try:
+            while True:
+                expected = time.monotonic() + interval
+                self._heartbeat = time.monotonic()
+                await asyncio.sleep(interval)
+                now = time.monotonic()
+                self._heartbeat = now
+                lag = max(now - expected, 0.0)
+                loop_lag_seconds.observe(lag)
+                self._max_lag = max(self._max_lag, lag)
+        finally:
+            self._stop.set()
+
+    def snapshot(self) -> dict:
+        return {
+            "watchdog": settings.LOOP_WATCHDOG_ENABLED,
+            "max_lag_s": round(self._max_lag, 4),
+            "lag_p99_s": loop_lag_seconds.quantile(0.99),
+            "stalls": self._stalls,
+            "longest_stall_s": round(self._longest_stall, 3),
+            "hot_spots": dict(sorted(self._hot_spots.items(), key=lambda item: -item[1])),
+        }
+
+    # ── Watchdog ──────────────────────────────────────────────────────────────
+
+    def _startWatchdog(self) -> None:
+        if self._watchdog is not None and self._watchdog.is_alive():
+            return
+        self._stop.clear()
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+        logger.warning(
+            f"[loop] watchdog on: stacks of code blocking the loop > "
+            f"{settings.LOOP_BLOCKING_THRESHOLD_MS}ms will be logged")
+
+    def _watch(self) -> None:
+        threshold = settings.LOOP_BLOCKING_THRESHOLD_MS / 1000
+        # Heartbeats come every sample interval, so only lateness beyond it counts
+        allowance = settings.LOOP_LAG_SAMPLE_SECONDS + threshold
+        reported_beat = None
+        while not self._stop.wait(threshold / 4):
+            beat = self._heartbeat
+            stalled = time.monotonic() - beat
+            if stalled < allowance:
+                if reported_beat is not None and beat != reported_beat:
+                    reported_beat = None
+                continue
+            if beat == reported_beat:
+                self._longest_stall = max(self._longest_stall, stalled - settings.LOOP_LAG_SAMPLE_SECONDS)
+                continue
+            reported_beat = beat
+            self._reportStall(stalled - settings.LOOP_LAG_SAMPLE_SECONDS)
+
+    def _reportStall(self, blocked_for: float) -> None:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+        stack = traceback.extract_stack(frame)
+        self._stalls += 1
+        self._longest_stall = max(self._longest_stall, blocked_for)
+        loop_stalls_total.inc()
+
+        spot = self._hotSpot(stack)
+        if spot not in self._hot_spots and len(self._hot_spots) >= _MAX_HOT_SPOTS:
+            return
+        self._hot_spots[spot] = self._hot_spots.get(spot, 0) + 1
+        logger.warning(
+            f"[loop] event loop blocked > {blocked_for * 1000:.0f}ms at {spot}\n"
+            + "".join(traceback.format_list(stack[-settings.LOOP_WATCHDOG_STACK_DEPTH:])))
+
+    @staticmethod
+    def _hotSpot(stack: traceback.StackSummary) -> str:
+        """Innermost frame in app code (else the innermost frame at all)."""
+        for frame in reversed(stack):
+            if frame.filename.startswith(_APP_DIR):
+                return f"{os.path.relpath(frame.filename, os.path.dirname(_APP_DIR))}:{frame.lineno} {frame.name}"
+        frame = stack[-1]
+        return f"{frame.filename}:{frame.lineno} {frame.name}"
+
+
+loop_monitor = LoopMonitor()
@@ -0,0 +1,178 @@
+"""
+Model Routing - Per-task model/max_tokens/timeout table with latency-driven demotion
+"""
+import logging
+import random
+from collections import defaultdict, deque
+
+from app.config.settings import settings
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+TIERS = ("primary", "fast", "local")
+
+
+class ModelRoute(BaseModel):
+    """
+    How a task is sent to the AI provider
+    """
+    model: str
+    max_tokens: int
+    timeout: float  # seconds
+    fast_model: str | None = None  # faster tier used for hedging and demotion
+    hedge: bool = True
+
+
+def _defaultRoutes() -> dict[str, ModelRoute]:
+    primary = settings.AI_MODEL
+    fast = settings.AI_FAST_MODEL or None
+    return {
+        "level": ModelRoute(model=primary, max_tokens=10, timeout=4.0, fast_model=fast),
+        "intent": ModelRoute(model=primary, max_tokens=10, timeout=4.0, fast_model=fast),
+        "upsell": ModelRoute(model=primary, max_tokens=10, timeout=4.0, fast_model=fast),
+        "name_country": ModelRoute(model=primary, max_tokens=50, timeout=5.0, fast_model=fast),
+        "objection": ModelRoute(model=primary, max_tokens=200, timeout=12.0, fast_model=fast, hedge=False),
+    }
+
+
+class LatencyStats:
+    """Rolling window of (latency, ok) samples."""
+
+    def __init__(self, window: int):
+        self.samples: deque[tuple[float, bool]] = deque(maxlen=window)
+
+    def add(self, latency: float, ok: bool) -> None:
+        self.samples.append((latency, ok))
+
+    def percentile(self, q: float) -> float | None:
+        if not self.samples:
+            return None
+        latencies = sorted(latency for latency, _ in self.samples)
+        index = min(len(latencies) - 1, int(q * len(latencies)))
+        return latencies[index]
+
+    def errorRate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, ok in self.samples if not ok) / len(self.samples)
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+
+class ModelRouter:
+    """
+    Picks the model for each task and keeps rolling latency stats per
+    (task, model). A tier whose p95 gets close to the route timeout, or whose
+    error rate is too high, is demoted: primary → fast model → local logic.
+    A small share of calls still probes the demoted tier so it can recover.
+    """
+
+    def __init__(self):
+        self._routes: dict[str, ModelRoute] | None = None
+        self._stats: dict[tuple[str, str], LatencyStats] = defaultdict(
+            lambda: LatencyStats(settings.AI_LATENCY_WINDOW))
+        self._tiers: dict[str, str] = {}
+
+    @property
+    def routes(self) -> dict[str, ModelRoute]:
+        if self._routes is None:
+            routes = _defaultRoutes()
+            for task, override in settings.AI_ROUTES.items():
+                base = routes.get(task) or routes["intent"]
+                routes[task] = base.model_copy(update=override)
+            self._routes = routes
+        return self._routes
+
+    def route(self, task: str) -> ModelRoute:
+        """Route for a task, with `model` set to the tier chosen for this call."""
+        task = self._baseTask(task)
+        route = self.routes.get(task) or self.routes["intent"]
+        # Calls reaching the provider while the task is "local" are probes of the fast tier
+        tier = self.tierFor(task, probe=True)
+        if tier in ("fast", "local") and route.fast_model:
+            return route.model_copy(update={"model": route.fast_model, "fast_model": None})
+        return route
+
+    def tierFor(self, task: str, probe: bool = False) -> str:
+        """
+        Current tier for a task. With `probe`, a share of calls is let through
+        to the next better tier so its stats keep refreshing.
+        """
+        task = self._baseTask(task)
+        tier = self._tiers.get(task, "primary")
+        if probe and tier != "primary" and random.random() < settings.AI_DEMOTION_PROBE_RATE:
+            return TIERS[TIERS.index(tier) - 1]
+        return tier
+
+    def observe(self, task: str, model: str, latency: float, ok: bool) -> None:
+        """Record a call outcome and re-evaluate the task's tier."""
+        task = self._baseTask(task)
+        self._stats[(task, model)].add(latency, ok)
+        self._reevaluate(task)
+
+    def hedgeDelay(self, task: str, model: str) -> float:
+        """Seconds to wait for the primary request before firing a hedge (its p95)."""
+        task = self._baseTask(task)
+        stats = self._stats.get((task, model))
+        route = self.routes.get(task) or self.routes["intent"]
+        floor = settings.AI_HEDGE_MIN_DELAY_MS / 1000
+        if stats is None or len(stats) < settings.AI_LATENCY_MIN_SAMPLES:
+            return max(floor, route.timeout / 4)
+        return min(max(stats.percentile(0.95), floor), route.timeout)
+
+    def snapshot(self) -> dict:
+        """Routes, tiers and rolling latency stats, for the metrics endpoint."""
+        return {
+            task: {
+                "tier": self._tiers.get(task, "primary"),
+                "route": route.model_dump(),
+                "models": {
+                    model: {
+                        "samples": len(stats),
+                        "p50": stats.percentile(0.5),
+                        "p95": stats.percentile(0.95),
+                        "error_rate": round(stats.errorRate(), 4),
+                    }
+                    for (stats_task, model), stats in self._stats.items()
+                    if stats_task == task
+                },
+            }
+            for task, route in self.routes.items()
+        }
+
+    def _reevaluate(self, task: str) -> None:
+        route = self.routes.get(task)
+        if route is None:
+            return
+        primary_slow = self._isSlow(task, route.model, route.timeout)
+        fast_slow = route.fast_model is None or self._isSlow(task, route.fast_model, route.timeout)
+
+        if not primary_slow:
+            tier = "primary"
+        elif not fast_slow:
+            tier = "fast"
+        else:
+            tier = "local"
+
+        previous = self._tiers.get(task, "primary")
+        if tier != previous:
+            logger.warning(f"[ai-routing] {task}: {previous} → {tier}")
+            self._tiers[task] = tier
+
+    def _isSlow(self, task: str, model: str, timeout: float) -> bool:
+        stats = self._stats.get((task, model))
+        if stats is None or len(stats) < settings.AI_LATENCY_MIN_SAMPLES:
+            return False
+        return (
+            stats.percentile(0.95) > timeout * settings.AI_DEMOTE_P95_RATIO
+            or stats.errorRate() > settings.AI_DEMOTE_ERROR_RATE
+        )
+
+    @staticmethod
+    def _baseTask(task: str) -> str:
+        return task.removesuffix("_batch")
+
+
+model_router = ModelRouter()
@@ -0,0 +1,119 @@
+"""
+Notification Digest - Coalesces owner notifications into periodic digests
+Urgent events skip the buffer; digests go out through the durable outbox.
+"""
+import asyncio
+import contextvars
+import logging
+from dataclasses import dataclass
+
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Lines listed per event type in a digest; the rest are summarised as a count
+_MAX_LINES_PER_TYPE = 15
+
+# event type -> (emoji, singular, plural) used in digest headings
+EVENT_LABELS = {
+    "new_lead": ("👤", "nuevo lead", "nuevos leads"),
+    "payment_pending": ("💰", "pago pendiente", "pagos pendientes"),
+    "payment_confirmed": ("✅", "pago confirmado", "pagos confirmados"),
+    "product_delivered": ("📦", "producto entregado", "productos entregados"),
+}
+
+
+@dataclass(slots=True)
+class OwnerEvent:
+    event_type: str
+    message: str  # full message, used when the event is sent on its own
+    summary: str  # one line, used inside a digest
+
+
+def renderDigest(events: list[OwnerEvent]) -> str:
+    """One message with the events grouped by type (in order of first appearance)."""
+    grouped: dict[str, list[OwnerEvent]] = {}
+    for event in events:
+        grouped.setdefault(event.event_type, []).append(event)
+
+    sections = []
+    for event_type, items in grouped.items():
+        emoji, singular, plural = EVENT_LABELS.get(event_type, ("🔔", event_type, event_type))
+        lines = [f"{emoji} **{len(items)} {singular if len(items) == 1 else plural}:**"]
+        lines += [f"• {item.summary}" for item in items[:_MAX_LINES_PER_TYPE]]
+        if len(items) > _MAX_LINES_PER_TYPE:
+            lines.append(f"… y {len(items) - _MAX_LINES_PER_TYPE} más")
+        sections.append("\n".join(lines))
+
+    return f"🔔 **Resumen ({len(events)} eventos)**\n\n" + "\n\n".join(sections)
+
+
+class NotificationDigest:
+    """Buffer of owner events flushed as a digest once per window."""
+
+    def __init__(self):
+        self._buffer: list[OwnerEvent] = []
+        self._timer: asyncio.Task | None = None
+        self._counts: dict[str, int] = {}
+        self._urgent = 0
+        self._digests = 0
+        self._messages_saved = 0
+
+    async def add(self, event: OwnerEvent, urgent: bool = False) -> bool:
+        """
+        Queue an event for the next digest, or send it right away if urgent
+        (or digests are disabled). Returns False only if an immediate event
+        could not be queued.
+        """
+        self._counts[event.event_type] = self._counts.get(event.event_type, 0) + 1
+        if urgent or settings.NOTIFY_DIGEST_WINDOW_SECONDS <= 0:
+            self._urgent += urgent
+            return await self._send(event.message, urgent)
+
+        self._buffer.append(event)
+        if len(self._buffer) >= settings.NOTIFY_DIGEST_MAX_EVENTS:
+            await self.flush()
+        elif self._timer is None or self._timer.done():
+            # Fresh context: the digest covers many requests, not the one that opened it
+            self._timer = asyncio.create_task(self._flushAfterWindow(), context=contextvars.Context())
+        return True
+
+    async def flush(self) -> None:
+        """Send whatever is buffered now."""
+        if self._timer is not None and not self._timer.done() and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+        self._timer = None
+        events, self._buffer = self._buffer, []
+        if not events:
+            return
+        if len(events) == 1:
+            await self._send(events[0].message)
+            return
+        self._digests += 1
+        self._messages_saved += len(events) - 1
+        await self._send(renderDigest(events))
+
+    def snapshot(self) -> dict:
+        return {
+            "buffered": len(self._buffer),
+            "events": dict(self._counts),
+            "urgent": self._urgent,
+            "digests_sent": self._digests,
+            "messages_saved": self._messages_saved,
+        }
+
+    async def _flushAfterWindow(self) -> None:
+        await asyncio.sleep(settings.NOTIFY_DIGEST_WINDOW_SECONDS)
+        await self.flush()
+
+    @staticmethod
+    async def _send(message: str, urgent: bool = False) -> bool:
+        from app.services.notificationService import NotificationService
+        from app.services.sendScheduler import PRIORITY_CRITICAL, PRIORITY_HIGH
+
+        # Queued, not sent inline: a parked send (WAHA circuit open) must not
+        # hold up the webhook turn or the shutdown flush
+        return await NotificationService().queueForOwner(message, PRIORITY_CRITICAL if urgent else PRIORITY_HIGH)
+
+
+notification_digest = NotificationDigest()
@@ -2,9 +2,16 @@
 Notification Service - Send notifications to Angelo
 """
 import logging
+import time
+import uuid
 
 from app.config.settings import settings
+from app.database.db import enqueue_outbox_messages
 from app.services.evolutionApi import EvolutionApiService
+from app.services.notificationDigest import OwnerEvent, notification_digest
+from app.services.outboxWorker import outbox_worker
+from app.services.sendScheduler import PRIORITY_HIGH
+from app.utils.metrics import span
 
 logger = logging.getLogger(__name__)
 
@@ -18,23 +25,19 @@ class NotificationService:
         self.evolution_service = EvolutionApiService()
         self.owner_phone = settings.OWNER_WHATSAPP
 
-    async def sendToOwner(self, message: str) -> bool:
+    async def sendToOwner(self, message: str, priority: int = PRIORITY_HIGH) -> bool:
         """
         Send notification message to Angelo's WhatsApp
 
         Args:
             message: Notification message
+            priority: Send scheduler lane
 
         Returns:
             True if sent successfully, False otherwise
         """
         try:
-            # Ensure owner phone has correct format
-            owner_phone = self.owner_phone
-            if "@s.whatsapp.net" not in owner_phone:
-                owner_phone = f"{owner_phone}@s.whatsapp.net"
-
-            await self.evolution_service.sendTextMessage(owner_phone, message)
+            await self.evolution_service.sendTextMessage(self._ownerChatId(), message, priority)
             logger.info(f"Notification sent to owner: {message[:50]}...")
             return True
 
@@ -42,6 +45,49 @@ class NotificationService:
             logger.error(f"Failed to send notification to owner: {str(e)}")
             return False
 
+    async def queueForOwner(self, message: str, priority: int = PRIORITY_HIGH) -> bool:
+        """
+        Queue a notification in the outbox: it survives restarts and WAHA
+        outages, and the caller never waits on the send itself.
+        Returns False if it could not be queued.
+        """
+        try:
+            await enqueue_outbox_messages([{
+                "idempotency_key": f"owner:{uuid.uuid4().hex}",
+                "chat_id": self._ownerChatId(),
+                "text": message,
+                "priority": priority,
+                "deliver_at": time.time(),
+            }])
+            outbox_worker.wake()
+            return True
+
+        except Exception as e:
+            logger.error(f"Failed to queue notification to owner: {str(e)}")
+            return False
+
+    def _ownerChatId(self) -> str:
+        # Ensure owner phone has correct format
+        if "@s.whatsapp.net" not in self.owner_phone:
+            return f"{self.owner_phone}@s.whatsapp.net"
+        return self.owner_phone
+
+    async def notify(self, event_type: str, message: str, summary: str, urgent: bool = False) -> bool:
+        """
+        Notify the owner about an event, batched into the next digest
+
+        Args:
+            event_type: Key used to group and count events (see EVENT_LABELS)
+            message: Full message, sent as-is when the event goes out alone
+            summary: One-line version used inside a digest
+            urgent: Send right away instead of waiting for the digest
+
+        Returns:
+            False if an urgent notification could not be queued, True otherwise
+        """
+        with span(f"notify:{event_type}"):
+            return await notification_digest.add(OwnerEvent(event_type, message, summary), urgent=urgent)
+
     async def notifyNewLead(self, user_name: str, user_country: str, phone: str):
         """
         Notify about new lead
@@ -52,7 +98,7 @@ class NotificationService:
             f"País: {user_country}\n"
             f"Teléfono: {phone}"
         )
-        await self.sendToOwner(message)
+        await self.notify("new_lead", message, f"{user_name} ({user_country}) {phone}")
 
     async def notifyPaymentPending(
         self,
@@ -72,7 +118,8 @@ class NotificationService:
             f"Monto: ${amount}\n\n"
             "Revisa tu banco y confirma el pago."
         )
-        await self.sendToOwner(message)
+        await self.notify(
+            "payment_pending", message, f"{user_name} ({user_country}) {phone} - ${amount}", urgent=True)
 
     async def notifyPaymentConfirmed(self, user_name: str, amount: float):
         """
@@ -84,4 +131,4 @@ class NotificationService:
             f"Monto: ${amount}\n\n"
             "Producto entregado exitosamente."
         )
-        await self.sendToOwner(message)
+        await self.notify("payment_confirmed", message, f"{user_name} - ${amount}")
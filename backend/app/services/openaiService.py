@@ -1,15 +1,43 @@
 """
 AI Service - powered by Anthropic Claude
 """
+import asyncio
 import json
 import logging
-from typing import Literal
+import re
+import time
+from typing import AsyncIterator, Literal
 
 import anthropic
 from app.config.settings import settings
+from app.services.modelRouting import model_router
+from app.services.usageTracker import current_conversation, usage_tracker
+from app.utils.helpers import parseNameAndCountry as parseNameAndCountryLocally
+from app.utils.metrics import observeStage, span
 
 logger = logging.getLogger(__name__)
 
+_client: tuple[asyncio.AbstractEventLoop | None, anthropic.AsyncAnthropic] | None = None
+
+
+def _sharedClient() -> anthropic.AsyncAnthropic:
+    """
+    One Anthropic client (and connection pool) per event loop. Agents create
+    an OpenAiService per message, and building a client blocks the loop for
+    ~100ms (SSL context setup).
+    """
+    global _client
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    if _client is None or _client[0] is not loop:
+        _client = (loop, anthropic.AsyncAnthropic(
+            api_key=settings.ANTHROPIC_API_KEY,
+            base_url=settings.ANTHROPIC_BASE_URL or None
+        ))
+    return _client[1]
+
 
 class OpenAiService:
     """
@@ -18,42 +46,14 @@ class OpenAiService:
     """
 
     def __init__(self):
-        self.client = anthropic.AsyncAnthropic(api_key=settings.ANTHROPIC_API_KEY)
-        self.model = "claude-3-5-haiku-20241022"  # Fast and cost-effective
-
-    async def classifyUserLevel(self, message: str, user_name: str) -> Literal["beginner", "intermediate", "advanced"]:
-        try:
-            prompt = f"""Analiza la siguiente respuesta de {user_name} sobre su nivel de experiencia y clasifícalo.
+        self.model = settings.AI_MODEL  # default; per-task models come from model_router
 
-Respuesta del usuario: "{message}"
-
-Clasifica su nivel como:
-- "beginner" si es novato, principiante, empieza de cero, nunca ha hecho esto
-- "intermediate" si tiene algo de experiencia, conoce lo básico, ha probado antes
-- "advanced" si es experto, avanzado, tiene mucha experiencia, domina el tema
-
-Responde SOLO con una palabra: beginner, intermediate o advanced"""
-
-            response = await self.client.messages.create(
-                model=self.model,
-                max_tokens=10,
-                system="Eres un clasificador experto que determina el nivel de experiencia de usuarios. Responde solo con: beginner, intermediate o advanced",
-                messages=[{"role": "user", "content": prompt}]
-            )
-
-            classification = response.content[0].text.strip().lower()
-
-            if classification not in ["beginner", "intermediate", "advanced"]:
-                logger.warning(
-                    f"Unexpected classification: {classification}, defaulting to beginner")
-                return "beginner"
+    @property
+    def client(self) -> anthropic.AsyncAnthropic:
+        return _sharedClient()
 
-            logger.info(f"User level classified as: {classification}")
-            return classification
-
-        except Exception as e:
-            logger.error(f"Error classifying user level: {str(e)}")
-            return "beginner"
+    async def classifyUserLevel(self, message: str, user_name: str) -> Literal["beginner", "intermediate", "advanced"]:
+        return await self._classify("level", message, user_name)
 
     async def classifyIntent(
         self,
@@ -61,58 +61,17 @@ Responde SOLO con una palabra: beginner, intermediate o advanced"""
         user_name: str,
         context: str = ""
     ) -> Literal["purchase", "info", "objection", "unclear"]:
-        try:
-            prompt = f"""Analiza la intención del siguiente mensaje de {user_name}.
-
-Mensaje: "{message}"
-{f'Contexto: {context}' if context else ''}
-
-Clasifica la intención como:
-- "purchase" si quiere comprar, proceder, le interesa, dice cuánto cuesta, pregunta cómo pagar
-- "info" si quiere más información, detalles, características, cómo funciona
-- "objection" si tiene dudas, dice que está caro, no tiene dinero, lo dejará para después
-- "unclear" si no está claro o es otro tema
-
-Responde SOLO con una palabra: purchase, info, objection o unclear"""
-
-            response = await self.client.messages.create(
-                model=self.model,
-                max_tokens=10,
-                system="Eres un clasificador experto de intenciones de compra. Responde solo con: purchase, info, objection o unclear",
-                messages=[{"role": "user", "content": prompt}]
-            )
-
-            intent = response.content[0].text.strip().lower()
-
-            if intent not in ["purchase", "info", "objection", "unclear"]:
-                logger.warning(f"Unexpected intent: {intent}, defaulting to unclear")
-                return "unclear"
-
-            logger.info(f"Intent classified as: {intent}")
-            return intent
-
-        except Exception as e:
-            logger.error(f"Error classifying intent: {str(e)}")
-            return "unclear"
+        return await self._classify("intent", message, user_name, context)
 
     async def parseNameAndCountry(self, message: str) -> tuple[str | None, str | None]:
-        try:
-            prompt = f"""Extrae el nombre y el país del siguiente mensaje:
-
-Mensaje: "{message}"
-
-Responde en formato JSON exactamente así:
-{{"name": "Nombre", "country": "País"}}
-
-Si no encuentras el nombre o país, usa null.
-El país debe estar en español y capitalizado (Ecuador, Colombia, Perú, etc.)
-Responde SOLO con el JSON, sin texto adicional."""
+        if self._answerLocally("name_country"):
+            return parseNameAndCountryLocally(message)
 
-            response = await self.client.messages.create(
-                model=self.model,
-                max_tokens=50,
-                system="Eres un extractor experto de información. Responde SOLO con JSON válido, sin texto adicional.",
-                messages=[{"role": "user", "content": prompt}]
+        try:
+            response = await self._create(
+                "name_country",
+                system=_cacheableSystem(_NAME_COUNTRY_SYSTEM),
+                messages=[{"role": "user", "content": f'Mensaje: "{message}"'}]
             )
 
             text = response.content[0].text.strip()
@@ -139,27 +98,14 @@ Responde SOLO con el JSON, sin texto adicional."""
         user_name: str,
         objection_type: str = "general"
     ) -> str:
-        try:
-            prompt = f"""Eres un vendedor experto y empático. {user_name} tiene una objeción sobre un producto.
-
-Objeción de {user_name}: "{message}"
-
-Genera una respuesta que:
-1. Sea empática y comprensiva
-2. Maneje la objeción de forma natural
-3. Reoriente hacia el valor del producto
-4. Use emojis de forma moderada
-5. Sea conversacional y amigable
-6. Máximo 3-4 líneas
-7. NO seas insistente ni presiones
-
-Genera SOLO la respuesta, sin introducción."""
+        if self._answerLocally("objection"):
+            return self._objectionFallback(user_name)
 
-            response = await self.client.messages.create(
-                model=self.model,
-                max_tokens=200,
-                system="Eres un vendedor consultivo experto que maneja objeciones con empatía y profesionalismo.",
-                messages=[{"role": "user", "content": prompt}]
+        try:
+            response = await self._create(
+                "objection",
+                system=_cacheableSystem(_OBJECTION_SYSTEM),
+                messages=[{"role": "user", "content": self._objectionPrompt(message, user_name)}]
             )
 
             objection_response = response.content[0].text.strip()
@@ -168,11 +114,61 @@ Genera SOLO la respuesta, sin introducción."""
 
         except Exception as e:
             logger.error(f"Error handling objection: {str(e)}")
-            return (
-                f"Entiendo tus dudas, {user_name}. 🤔\n\n"
-                "Cuéntame específicamente qué te preocupa y con gusto te lo aclaro.\n\n"
-                "Estoy aquí para ayudarte a tomar la mejor decisión. 😊"
-            )
+            return self._objectionFallback(user_name)
+
+    async def streamObjection(
+        self,
+        message: str,
+        user_name: str,
+        objection_type: str = "general"
+    ) -> AsyncIterator[str]:
+        """
+        Streaming variant of handleObjection.
+        Yields text deltas as they arrive so the caller can react (e.g. start
+        typing) before the full completion is ready. If the request fails before
+        any text was produced, the template fallback is yielded instead.
+        """
+        if self._answerLocally("objection"):
+            yield self._objectionFallback(user_name)
+            return
+
+        # Streams aren't hedged: the first tokens already unblock the typing indicator
+        route = model_router.route("objection")
+        produced = False
+        started = time.monotonic()
+        try:
+            async with self.client.with_options(timeout=route.timeout).messages.stream(
+                model=route.model,
+                max_tokens=route.max_tokens,
+                system=_cacheableSystem(_OBJECTION_SYSTEM),
+                messages=[{"role": "user", "content": self._objectionPrompt(message, user_name)}]
+            ) as stream:
+                async for text in stream.text_stream:
+                    if text:
+                        produced = True
+                        yield text
+                final = await stream.get_final_message()
+            latency = time.monotonic() - started
+            observeStage("ai:objection_stream", latency)
+            model_router.observe("objection", route.model, latency, True)
+            self._recordUsage("objection", final, latency)
+            logger.info(f"Streamed objection response for {user_name}")
+
+        except Exception as e:
+            model_router.observe("objection", route.model, time.monotonic() - started, False)
+            logger.error(f"Error streaming objection: {str(e)}")
+            if not produced:
+                yield self._objectionFallback(user_name)
+
+    def _objectionPrompt(self, message: str, user_name: str) -> str:
+        return f'Cliente: {user_name}\nObjeción: "{message}"'
+
+    def _objectionFallback(self, user_name: str) -> str:
+        return (
+            f"Entiendo tus dudas, {user_name}. 🤔\n\n"
+            "Cuéntame específicamente qué te preocupa y con gusto te lo aclaro.\n\n"
+            "Estoy aquí para ayudarte a tomar la mejor decisión. 😊"
+        )
 
     async def classifyUpsellIntent(
         self,
@@ -189,36 +185,370 @@ Genera SOLO la respuesta, sin introducción."""
         Returns:
             Intent: "accept", "info", "reject", or "unclear"
         """
-        try:
-            prompt = f"""Analiza la respuesta de {user_name} a una oferta de un curso avanzado (upsell).
+        return await self._classify("upsell", message, user_name)
 
-Mensaje: "{message}"
+    # ── Request helpers ───────────────────────────────────────────────────────
 
-Clasifica la intención como:
-- "accept" si dice que sí, lo quiere, le interesa, pregunta cómo pagar, acepta la oferta
-- "info" si quiere más información, de qué trata, qué incluye, cuánto dura
-- "reject" si dice que no, no gracias, por ahora no, en otro momento, está muy caro
-- "unclear" si no está claro o habla de otra cosa
+    def _answerLocally(self, task: str) -> bool:
+        """
+        True when this call should skip the AI: the daily budget is nearly
+        spent, or latency stats have demoted the task to local logic.
+        """
+        if usage_tracker.shouldDegrade():
+            usage_tracker.recordDegraded(task)
+            return True
+        if model_router.tierFor(task, probe=True) == "local":
+            logger.info(f"[ai-routing] {task} answered locally (demoted)")
+            return True
+        return False
+
+    async def _create(self, task: str, conversation: str | list | None = None, **kwargs):
+        """
+        Send a Messages API request using the task's route and record its usage.
+        If the primary request hasn't answered by its p95 (or failed before),
+        a hedge request is fired on the fast tier and whichever answers first wins.
+        """
+        route = model_router.route(task)
+        kwargs.setdefault("max_tokens", route.max_tokens)
+        hedged = settings.AI_HEDGING_ENABLED and route.hedge
+        # Hedging replaces the SDK's retries, which would stretch the route timeout
+        client = self.client.with_options(
+            timeout=route.timeout, **({"max_retries": 0} if hedged else {}))
+
+        async def attempt(model: str):
+            started = time.monotonic()
+            try:
+                with span(f"ai:{task}"):
+                    response = await client.messages.create(model=model, **kwargs)
+            except asyncio.CancelledError:
+                # Lost the hedge race (or the caller gave up): not a failure,
+                # but the time it ran is a lower bound of its latency, so a
+                # tier that keeps losing still shows up as slow
+                model_router.observe(task, model, time.monotonic() - started, True)
+                raise
+            except Exception:
+                model_router.observe(task, model, time.monotonic() - started, False)
+                raise
+            latency = time.monotonic() - started
+            model_router.observe(task, model, latency, True)
+            self._recordUsage(task, response, latency, conversation)
+            return response
+
+        hedge_model = route.fast_model or route.model
+        if not hedged:
+            return await attempt(route.model)
+
+        pending = {asyncio.create_task(attempt(route.model))}
+        error: BaseException | None = None
+        try:
+            done, pending = await asyncio.wait(pending, timeout=model_router.hedgeDelay(task, route.model))
+            for finished in done:
+                if finished.exception() is None:
+                    return finished.result()
+                error = finished.exception()
+            # Slow, or failed fast (429, 5xx, reset): with the SDK retries off,
+            # the hedge is also the retry
+            reason = "slow" if pending else f"failed ({error.__class__.__name__})"
+            logger.info(f"[ai-routing] hedging {task}: {route.model} {reason}, firing {hedge_model}")
+            pending.add(asyncio.create_task(attempt(hedge_model)))
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for finished in done:
+                    if finished.exception() is None:
+                        return finished.result()
+                    error = finished.exception()
+            raise error
+        finally:
+            # Also reached when the caller is cancelled mid-wait: never leak an attempt
+            for running in pending:
+                running.cancel()
+
+    def _recordUsage(self, task: str, response, latency: float, conversation: str | list | None = None):
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        usage_tracker.record(
+            task,
+            getattr(response, "model", None) or self.model,
+            usage.input_tokens or 0,
+            usage.output_tokens or 0,
+            latency,
+            conversation,
+            cache_read_tokens=getattr(usage, "cache_read_input_tokens", None) or 0,
+            cache_write_tokens=getattr(usage, "cache_creation_input_tokens", None) or 0,
+        )
+
+    # ── Single-label classification (optionally micro-batched) ────────────────
+
+    async def _classify(self, task: str, message: str, user_name: str, context: str = "") -> str:
+        """
+        Classify one message for a task. When batching is enabled, concurrent
+        calls of the same task are merged into one numbered-list request.
+        """
+        item = {
+            "message": message,
+            "user_name": user_name,
+            "context": context,
+            "conversation": current_conversation.get(),
+        }
+        if self._answerLocally(task):
+            return self._classifyLocally(task, item)
+        if settings.AI_BATCH_ENABLED:
+            return await _batcher.submit(self, task, item)
+        return await self._classifyOne(task, item)
+
+    def _classifyLocally(self, task: str, item: dict) -> str:
+        """
+        Answer used when the AI is skipped: the task default. Callers only
+        get here after their own keyword matcher found nothing.
+        """
+        return _CLASSIFICATION_TASKS[task]["default"]
 
-Responde SOLO con una palabra: accept, info, reject o unclear"""
+    async def _classifyOne(self, task: str, item: dict) -> str:
+        """Classify a single message with its own request."""
+        spec = _CLASSIFICATION_TASKS[task]
+        labels = spec["labels"]
+        try:
+            context = item.get("context")
+            prompt = (
+                f"Usuario: {item['user_name']}\n"
+                f"Mensaje: \"{item['message']}\""
+                f"{f'{chr(10)}Contexto: {context}' if context else ''}"
+            )
 
-            response = await self.client.messages.create(
-                model=self.model,
-                max_tokens=10,
-                system="Eres un clasificador experto de intenciones de compra para upsells. Responde solo con: accept, info, reject o unclear",
+            response = await self._create(
+                task,
+                conversation=item.get("conversation"),
+                system=_cacheableSystem(spec["system"]),
                 messages=[{"role": "user", "content": prompt}]
             )
 
-            intent = response.content[0].text.strip().lower()
+            label = response.content[0].text.strip().lower()
 
-            if intent not in ["accept", "info", "reject", "unclear"]:
+            if label not in labels:
                 logger.warning(
-                    f"Unexpected upsell intent: {intent}, defaulting to unclear")
-                return "unclear"
+                    f"Unexpected {task} classification: {label}, defaulting to {spec['default']}")
+                return spec["default"]
 
-            logger.info(f"Upsell intent classified as: {intent}")
-            return intent
+            logger.info(f"{spec['log_name']} classified as: {label}")
+            return label
 
         except Exception as e:
-            logger.error(f"Error classifying upsell intent: {str(e)}")
-            return "unclear"
+            logger.error(f"Error classifying {spec['log_name'].lower()}: {str(e)}")
+            return spec["default"]
+
+    async def _classifyBatch(self, task: str, items: list[dict]) -> list[str | None]:
+        """
+        Classify several messages of the same task in one request.
+        Returns one label per item, or None where the answer could not be parsed.
+        """
+        spec = _CLASSIFICATION_TASKS[task]
+        labels = spec["labels"]
+        lines = []
+        for index, item in enumerate(items, start=1):
+            context = item.get("context")
+            lines.append(
+                f"{index}. ({item['user_name']}) \"{item['message']}\""
+                f"{f' [Contexto: {context}]' if context else ''}"
+            )
+
+        response = await self._create(
+            f"{task}_batch",
+            conversation=[item.get("conversation") for item in items],
+            max_tokens=model_router.route(task).max_tokens * len(items) + 10,
+            system=_cacheableSystem(spec["batch_system"]),
+            messages=[{"role": "user", "content": "Mensajes:\n" + "\n".join(lines)}]
+        )
+
+        results: list[str | None] = [None] * len(items)
+        for line in response.content[0].text.splitlines():
+            match = _BATCH_LINE.match(line.strip().lower())
+            if not match:
+                continue
+            index = int(match.group(1)) - 1
+            label = match.group(2)
+            if 0 <= index < len(items) and label in labels:
+                results[index] = label
+
+        logger.info(
+            f"Batch {task} classification: {len(items)} items, "
+            f"{results.count(None)} unparsed")
+        return results
+
+
+# ── Static prompts ────────────────────────────────────────────────────────────
+# Everything that doesn't change between calls lives in the system prompt and
+# is marked as a cacheable prefix; the user turn only carries the variable data.
+
+def _cacheableSystem(text: str) -> str | list[dict]:
+    """System prompt as a block marked for provider-side prompt caching."""
+    if not settings.AI_PROMPT_CACHING:
+        return text
+    return [{"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}]
+
+
+_NAME_COUNTRY_SYSTEM = """Eres un extractor experto de información. Responde SOLO con JSON válido, sin texto adicional.
+
+Extrae el nombre y el país del mensaje que envía el usuario.
+
+Responde en formato JSON exactamente así:
+{"name": "Nombre", "country": "País"}
+
+Si no encuentras el nombre o país, usa null.
+El país debe estar en español y capitalizado (Ecuador, Colombia, Perú, etc.)
+Responde SOLO con el JSON, sin texto adicional."""
+
+_OBJECTION_SYSTEM = """Eres un vendedor consultivo experto que maneja objeciones con empatía y profesionalismo.
+
+Un cliente tiene una objeción sobre un producto. Recibirás su nombre y su objeción.
+
+Genera una respuesta que:
+1. Sea empática y comprensiva
+2. Maneje la objeción de forma natural
+3. Reoriente hacia el valor del producto
+4. Use emojis de forma moderada
+5. Sea conversacional y amigable
+6. Máximo 3-4 líneas
+7. NO seas insistente ni presiones
+
+Genera SOLO la respuesta, sin introducción."""
+
+# ── Classification task definitions ───────────────────────────────────────────
+
+_CLASSIFICATION_TASKS = {
+    "level": {
+        "labels": ["beginner", "intermediate", "advanced"],
+        "default": "beginner",
+        "log_name": "User level",
+        "role": "Eres un clasificador experto que determina el nivel de experiencia de usuarios.",
+        "subject": "Analiza la respuesta del usuario sobre su nivel de experiencia y clasifícalo.",
+        "criteria": (
+            "Clasifica su nivel como:\n"
+            "- \"beginner\" si es novato, principiante, empieza de cero, nunca ha hecho esto\n"
+            "- \"intermediate\" si tiene algo de experiencia, conoce lo básico, ha probado antes\n"
+            "- \"advanced\" si es experto, avanzado, tiene mucha experiencia, domina el tema"
+        ),
+    },
+    "intent": {
+        "labels": ["purchase", "info", "objection", "unclear"],
+        "default": "unclear",
+        "log_name": "Intent",
+        "role": "Eres un clasificador experto de intenciones de compra.",
+        "subject": "Analiza la intención del mensaje del usuario.",
+        "criteria": (
+            "Clasifica la intención como:\n"
+            "- \"purchase\" si quiere comprar, proceder, le interesa, dice cuánto cuesta, pregunta cómo pagar\n"
+            "- \"info\" si quiere más información, detalles, características, cómo funciona\n"
+            "- \"objection\" si tiene dudas, dice que está caro, no tiene dinero, lo dejará para después\n"
+            "- \"unclear\" si no está claro o es otro tema"
+        ),
+    },
+    "upsell": {
+        "labels": ["accept", "info", "reject", "unclear"],
+        "default": "unclear",
+        "log_name": "Upsell intent",
+        "role": "Eres un clasificador experto de intenciones de compra para upsells.",
+        "subject": "Analiza la respuesta del usuario a una oferta de un curso avanzado (upsell).",
+        "criteria": (
+            "Clasifica la intención como:\n"
+            "- \"accept\" si dice que sí, lo quiere, le interesa, pregunta cómo pagar, acepta la oferta\n"
+            "- \"info\" si quiere más información, de qué trata, qué incluye, cuánto dura\n"
+            "- \"reject\" si dice que no, no gracias, por ahora no, en otro momento, está muy caro\n"
+            "- \"unclear\" si no está claro o habla de otra cosa"
+        ),
+    },
+}
+
+for _spec in _CLASSIFICATION_TASKS.values():
+    _labels = _spec["labels"]
+    _one_word = f"{', '.join(_labels[:-1])} o {_labels[-1]}"
+    _spec["system"] = (
+        f"{_spec['role']} Responde solo con: {_one_word}\n\n"
+        f"{_spec['subject']}\n\n"
+        f"{_spec['criteria']}\n\n"
+        f"Responde SOLO con una palabra: {_one_word}"
+    )
+    _spec["batch_system"] = (
+        f"{_spec['role']}\n\n"
+        "Recibirás una lista numerada de mensajes de distintos usuarios. "
+        f"{_spec['subject']} Hazlo para cada mensaje.\n\n"
+        f"{_spec['criteria']}\n\n"
+        "Responde con una línea por mensaje, en el mismo orden, con el formato "
+        f"\"N. etiqueta\". Usa SOLO: {', '.join(_labels)}"
+    )
+
+_BATCH_LINE = re.compile(r"^\W*(\d+)\s*[.):\-]\s*\W*([a-z]+)")
+
+
+class _ClassificationBatcher:
+    """
+    Collects classification requests of the same task for a short window and
+    sends them as one numbered-list prompt. Each caller awaits its own future;
+    items whose answer can't be parsed fall back to an individual request.
+    """
+
+    def __init__(self):
+        self._pending: dict[str, list[tuple[dict, asyncio.Future]]] = {}
+        self._services: dict[str, "OpenAiService"] = {}
+        self._timers: dict[str, asyncio.TimerHandle] = {}
+        # The loop only holds weak references to tasks: keep in-flight batches alive
+        self._running: set[asyncio.Task] = set()
+
+    async def submit(self, service: "OpenAiService", task: str, item: dict) -> str:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        bucket = self._pending.setdefault(task, [])
+        bucket.append((item, future))
+        self._services.setdefault(task, service)
+
+        if len(bucket) >= settings.AI_BATCH_MAX_SIZE:
+            self._flush(task)
+        elif task not in self._timers:
+            self._timers[task] = loop.call_later(
+                settings.AI_BATCH_WINDOW_MS / 1000, self._flush, task)
+
+        return await future
+
+    def _flush(self, task: str) -> None:
+        timer = self._timers.pop(task, None)
+        if timer:
+            timer.cancel()
+        batch = self._pending.pop(task, [])
+        service = self._services.pop(task, None)
+        if batch and service:
+            running = asyncio.create_task(self._run(service, task, batch))
+            self._running.add(running)
+            running.add_done_callback(self._running.discard)
+
+    async def _run(self, service: "OpenAiService", task: str, batch: list[tuple[dict, asyncio.Future]]) -> None:
+        items = [item for item, _ in batch]
+        try:
+            if len(items) == 1:
+                results: list[str | None] = [await service._classifyOne(task, items[0])]
+            else:
+                try:
+                    results = await service._classifyBatch(task, items)
+                except Exception as e:
+                    logger.error(f"Batch {task} classification failed: {str(e)}")
+                    results = [None] * len(items)
+
+                # Per-item fallback for anything the batch answer didn't cover
+                missing = [i for i, label in enumerate(results) if label is None]
+                if missing:
+                    fallbacks = await asyncio.gather(
+                        *(service._classifyOne(task, items[i]) for i in missing))
+                    for i, label in zip(missing, fallbacks):
+                        results[i] = label
+
+            for (_, future), label in zip(batch, results):
+                if not future.done():
+                    future.set_result(label)
+        except Exception as e:
+            logger.error(f"Error resolving {task} batch: {str(e)}")
+            default = _CLASSIFICATION_TASKS[task]["default"]
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(default)
+
+
+_batcher = _ClassificationBatcher()
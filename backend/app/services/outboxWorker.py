@@ -0,0 +1,181 @@
+"""
+Outbox Worker - Drains the durable outbox of outgoing WhatsApp messages
+Retries with backoff and dead-letters; delivery is at-least-once.
+"""
+import asyncio
+import logging
+import random
+import time
+
+import httpx
+from app.config.settings import settings
+from app.database.db import (
+    defer_outbox_message,
+    get_next_outbox_due,
+    load_due_outbox_messages,
+    mark_outbox_failed,
+    mark_outbox_sent,
+)
+from app.services.sessionPool import session_pool
+from app.services.wahaHealth import CircuitOpenError, waha_health
+from app.utils import tracing
+
+logger = logging.getLogger(__name__)
+
+# Re-check interval while due messages wait behind an in-flight send
+_IN_FLIGHT_RECHECK_SECONDS = 0.5
+# How long stop() lets in-flight deliveries finish before cancelling them
+_STOP_TIMEOUT_SECONDS = 5
+
+
+class OutboxWorker:
+    """
+    Single background task delivering outbox messages. `wake` is called after
+    new messages are enqueued so the worker re-checks the next due time.
+    """
+
+    def __init__(self):
+        self._wakeup: asyncio.Event | None = None
+        self._in_flight_chats: set[str] = set()
+        # The loop only keeps weak references to tasks: hold the deliveries
+        self._delivering: set[asyncio.Task] = set()
+        self._stopping = False
+        self._sent = 0
+        self._retried = 0
+        self._dead = 0
+
+    def wake(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def snapshot(self) -> dict:
+        return {
+            "in_flight": len(self._in_flight_chats),
+            "sent": self._sent,
+            "retried": self._retried,
+            "dead_lettered": self._dead,
+        }
+
+    async def run(self) -> None:
+        """Worker loop; started from the app lifespan."""
+        self._wakeup = asyncio.Event()
+        while True:
+            self._wakeup.clear()
+            # Every session down: leave messages parked in the outbox until one is back
+            if session_pool.allDown():
+                await waha_health.breaker(session_pool.sessions[0]).waitClosed(
+                    timeout=settings.OUTBOX_POLL_SECONDS)
+                continue
+            try:
+                await self._drainDue()
+                next_due = await get_next_outbox_due()
+            except Exception as e:
+                logger.error(f"[outbox] drain failed: {str(e)}")
+                next_due = None
+
+            timeout = settings.OUTBOX_POLL_SECONDS
+            if next_due is not None:
+                timeout = min(max(next_due - time.time(), 0.0), timeout)
+            if timeout <= 0:
+                if not self._in_flight_chats:
+                    continue  # more due messages than one batch
+                # Due messages are waiting on an in-flight send to their chat
+                timeout = _IN_FLIGHT_RECHECK_SECONDS
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _drainDue(self) -> None:
+        if self._stopping:
+            return
+        messages = await load_due_outbox_messages(time.time(), settings.OUTBOX_BATCH_SIZE)
+        for message in messages:
+            if message["chat_id"] in self._in_flight_chats:
+                continue
+            self._in_flight_chats.add(message["chat_id"])
+            delivering = asyncio.create_task(self._deliver(message))
+            self._delivering.add(delivering)
+            delivering.add_done_callback(self._delivering.discard)
+
+    async def stop(self) -> None:
+        """
+        Let in-flight deliveries finish (on shutdown); the ones cancelled after
+        the timeout stay pending and go out after the restart.
+        """
+        self._stopping = True
+        if not self._delivering:
+            return
+        _, unfinished = await asyncio.wait(set(self._delivering), timeout=_STOP_TIMEOUT_SECONDS)
+        for delivering in unfinished:
+            delivering.cancel()
+
+    async def _deliver(self, message: dict) -> None:
+        from app.services.evolutionApi import EvolutionApiService
+
+        circuit_open = False
+        try:
+            # Continues the trace of the turn that queued the message
+            with tracing.trace("outbox_deliver", message.get("trace_parent")):
+                await EvolutionApiService().sendTextMessage(
+                    message["chat_id"], message["text"], message["priority"])
+            await mark_outbox_sent(message["id"])
+            self._sent += 1
+        except CircuitOpenError as e:
+            # Not an attempt: the message stays pending until the session is back.
+            # No wake-up either, or every chat would retry against a half-open
+            # circuit whose single trial is still in flight
+            circuit_open = True
+            await self._deferWhileOpen(message, e)
+        except Exception as e:
+            await self._recordFailure(message, e)
+        finally:
+            self._in_flight_chats.discard(message["chat_id"])
+            if not circuit_open:
+                self.wake()
+
+    async def _deferWhileOpen(self, message: dict, error: CircuitOpenError) -> None:
+        retry_after = waha_health.breaker(error.session).retryAfter()
+        if retry_after == float("inf"):
+            retry_after = 0.0  # held open by a session status: re-check at the poll interval
+        delay = max(retry_after, settings.OUTBOX_POLL_SECONDS)
+        try:
+            await defer_outbox_message(message["id"], time.time() + delay)
+        except Exception as e:
+            logger.error(f"[outbox] could not defer message {message['id']}: {str(e)}")
+
+    async def _recordFailure(self, message: dict, error: Exception) -> None:
+        attempts = message["attempts"] + 1
+        dead = attempts >= settings.OUTBOX_MAX_ATTEMPTS or not _isRetryable(error)
+        backoff = min(
+            settings.OUTBOX_BACKOFF_BASE_SECONDS * 2 ** (attempts - 1),
+            settings.OUTBOX_BACKOFF_MAX_SECONDS,
+        )
+        backoff *= random.uniform(0.8, 1.2)  # jitter so retries don't line up
+        try:
+            await mark_outbox_failed(message["id"], attempts, time.time() + backoff, str(error), dead)
+        except Exception as e:
+            logger.error(f"[outbox] could not record failure of message {message['id']}: {str(e)}")
+            return
+
+        if dead:
+            self._dead += 1
+            logger.error(
+                f"[outbox] message {message['id']} to {message['chat_id']} dead-lettered "
+                f"after {attempts} attempt(s): {str(error)}")
+        else:
+            self._retried += 1
+            logger.warning(
+                f"[outbox] message {message['id']} to {message['chat_id']} failed "
+                f"(attempt {attempts}), retrying in {backoff:.1f}s: {str(error)}")
+
+
+def _isRetryable(error: Exception) -> bool:
+    """Client errors (bad chat id, bad payload) won't succeed on retry; 429 and 5xx may."""
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status == 429 or status >= 500
+    return True
+
+
+outbox_worker = OutboxWorker()
@@ -0,0 +1,158 @@
+"""
+Presence Signals - Best-effort read receipts and typing indicators
+Coalesced per chat and flushed by a background task, off the critical path.
+"""
+import asyncio
+import contextvars
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Chats flushed concurrently
+_MAX_CONCURRENT_FLUSHES = 10
+# How long stop() lets flushes in flight finish before cancelling them
+_STOP_TIMEOUT_SECONDS = 2
+
+
+class _ChatSignals:
+    __slots__ = ("seen", "typing", "session")
+
+    def __init__(self):
+        self.seen = False
+        self.typing: bool | None = None
+        self.session: str | None = None
+
+
+class PresenceSignals:
+    """Latest wanted seen/typing state per chat, flushed by one driver task."""
+
+    def __init__(self):
+        self._pending: dict[str, _ChatSignals] = {}
+        self._flushing: set[str] = set()
+        self._typing_shown: set[str] = set()
+        self._sending: dict[str, int] = {}
+        self._wakeup: asyncio.Event | None = None
+        self._driver: asyncio.Task | None = None
+        # The loop only keeps weak references to tasks: hold the flushes
+        self._running: set[asyncio.Task] = set()
+        self._sent = 0
+        self._coalesced = 0
+        self._dropped = 0
+
+    def markSeen(self, chat_id: str, session: str | None = None) -> None:
+        entry = self._entry(chat_id, session)
+        if entry.seen:
+            self._coalesced += 1
+        entry.seen = True
+        self._kick()
+
+    def setTyping(self, chat_id: str, typing: bool, session: str | None = None) -> None:
+        if not typing and (chat_id in self._sending or chat_id not in self._typing_shown):
+            # Nothing to stop; a start that hasn't gone out yet is simply withdrawn
+            entry = self._pending.get(chat_id)
+            if entry is not None and entry.typing:
+                entry.typing = None
+            self._dropped += 1
+            return
+        entry = self._entry(chat_id, session)
+        if entry.typing is not None:
+            self._coalesced += 1
+        entry.typing = typing
+        self._kick()
+
+    def sendStarted(self, chat_id: str) -> None:
+        """A real message is going out: pending typing signals are moot."""
+        self._sending[chat_id] = self._sending.get(chat_id, 0) + 1
+        entry = self._pending.get(chat_id)
+        if entry is not None and entry.typing is not None:
+            entry.typing = None
+            self._dropped += 1
+        self._typing_shown.discard(chat_id)
+
+    def sendFinished(self, chat_id: str) -> None:
+        remaining = self._sending.get(chat_id, 1) - 1
+        if remaining > 0:
+            self._sending[chat_id] = remaining
+        else:
+            self._sending.pop(chat_id, None)
+
+    async def stop(self) -> None:
+        """Stop the driver and let flushes in flight finish (on shutdown)."""
+        if self._driver is not None:
+            self._driver.cancel()
+            self._driver = None
+        if self._running:
+            _, unfinished = await asyncio.wait(set(self._running), timeout=_STOP_TIMEOUT_SECONDS)
+            for running in unfinished:
+                running.cancel()
+
+    def snapshot(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "sent": self._sent,
+            "coalesced": self._coalesced,
+            "dropped": self._dropped,
+        }
+
+    # ── Driver ────────────────────────────────────────────────────────────────
+
+    def _entry(self, chat_id: str, session: str | None) -> _ChatSignals:
+        entry = self._pending.get(chat_id)
+        if entry is None:
+            entry = self._pending[chat_id] = _ChatSignals()
+        if session:
+            entry.session = session
+        return entry
+
+    def _kick(self) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._driver is None or self._driver.done() or self._driver.get_loop() is not loop:
+            self._wakeup = asyncio.Event()
+            # Fresh context: the driver outlives the request that started it
+            self._driver = loop.create_task(self._drive(), context=contextvars.Context())
+        self._wakeup.set()
+
+    async def _drive(self) -> None:
+        semaphore = asyncio.Semaphore(_MAX_CONCURRENT_FLUSHES)
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            # One flush per chat at a time keeps composing/paused in order
+            for chat_id in [chat for chat in self._pending if chat not in self._flushing]:
+                entry = self._pending.pop(chat_id)
+                if not entry.seen and entry.typing is None:
+                    continue
+                self._flushing.add(chat_id)
+                running = asyncio.create_task(self._flush(chat_id, entry, semaphore))
+                self._running.add(running)
+                running.add_done_callback(self._running.discard)
+
+    async def _flush(self, chat_id: str, entry: _ChatSignals, semaphore: asyncio.Semaphore) -> None:
+        from app.services.evolutionApi import EvolutionApiService
+
+        service = EvolutionApiService(session=entry.session)
+        try:
+            async with semaphore:
+                if entry.seen:
+                    await service.sendSeen(chat_id)
+                    self._sent += 1
+                # Re-check: a send may have started while this was queued
+                if entry.typing is not None and chat_id not in self._sending:
+                    await service.sendPresenceUpdate(chat_id, "composing" if entry.typing else "paused")
+                    self._sent += 1
+                    if entry.typing:
+                        self._typing_shown.add(chat_id)
+                    else:
+                        self._typing_shown.discard(chat_id)
+        except Exception as e:
+            logger.debug(f"[presence] signal for {chat_id} failed: {str(e)}")
+        finally:
+            self._flushing.discard(chat_id)
+            if chat_id in self._pending:
+                self._wakeup.set()
+
+
+presence_signals = PresenceSignals()
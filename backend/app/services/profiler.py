@@ -0,0 +1,234 @@
+"""
+Profiler - On-demand sampling profiler and allocation diffs for the live process
+Profiles are collapsed stacks (flamegraph.pl, speedscope) rooted at agent/step.
+"""
+import asyncio
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+from app.config.settings import settings
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+_STDLIB_DIR = os.path.dirname(os.__file__)
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class ProfilerBusy(Exception):
+    """A profile is already being taken."""
+
+
+def _shortPath(filename: str) -> str:
+    for root in (_BACKEND_DIR, _STDLIB_DIR):
+        if filename.startswith(root):
+            return os.path.relpath(filename, root)
+    parts = filename.replace("\\", "/").split("/site-packages/")
+    return parts[-1]
+
+
+def _frameLabel(frame, lines: bool) -> str:
+    code = frame.f_code
+    where = f"{_shortPath(code.co_filename)}:{frame.f_lineno}" if lines else _shortPath(code.co_filename)
+    # ';' separates frames and ' ' the count in collapsed stacks
+    return f"{code.co_name} ({where})".replace(";", ":")
+
+
+class SamplingProfiler:
+    """Collapsed-stack sampler for the event-loop thread (or all threads)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread_id: int | None = None
+        self._last: dict | None = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Remember the loop to sample; call from the loop thread."""
+        self._loop = loop
+        self._loop_thread_id = threading.get_ident()
+
+    async def profile(self, seconds: float, all_threads: bool = False, lines: bool = False) -> str:
+        """Sample for `seconds` without blocking the loop; returns collapsed stacks."""
+        self.bind(asyncio.get_running_loop())
+        return await asyncio.to_thread(self.sample, seconds, all_threads, lines)
+
+    def sample(self, seconds: float, all_threads: bool = False, lines: bool = False) -> str:
+        if self._loop_thread_id is None:
+            raise RuntimeError("Profiler not bound to an event loop")
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy()
+        interval = settings.PROFILER_INTERVAL_MS / 1000
+        stacks: Counter[str] = Counter()
+        me = threading.get_ident()
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        samples = 0
+        started = time.perf_counter()
+        metrics.task_tagging = True
+        try:
+            deadline = started + seconds
+            while time.perf_counter() < deadline:
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == me or (not all_threads and thread_id != self._loop_thread_id):
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(_frameLabel(frame, lines))
+                        frame = frame.f_back
+                    stack.extend(self._rootFrames(thread_id, thread_names))
+                    stacks[";".join(reversed(stack))] += 1
+                samples += 1
+                time.sleep(interval)
+        finally:
+            metrics.task_tagging = False
+            metrics.task_steps.clear()
+            self._lock.release()
+
+        elapsed = time.perf_counter() - started
+        self._last = {
+            "at": datetime.now().isoformat(timespec="seconds"),
+            "seconds": round(elapsed, 2),
+            "samples": samples,
+            "effective_hz": round(samples / elapsed, 1) if elapsed else None,
+            "distinct_stacks": len(stacks),
+        }
+        logger.info(f"[profiler] {samples} samples in {elapsed:.1f}s, {len(stacks)} distinct stacks")
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+    def _rootFrames(self, thread_id: int, thread_names: dict) -> list[str]:
+        """Synthetic root frames (appended innermost-last, so reversed order)."""
+        if thread_id != self._loop_thread_id:
+            return [f"thread:{thread_names.get(thread_id, thread_id)}"]
+        task = asyncio.current_task(self._loop)
+        if task is None:
+            return ["loop:idle"]
+        tags = metrics.task_steps.get(task)
+        if tags is None:
+            # Outside any span (HTTP parsing, background loops): name the task
+            coro = task.get_coro()
+            return [f"task:{getattr(coro, '__qualname__', type(coro).__name__)}"]
+        return [f"step:{tags[1]}", f"agent:{tags[0]}"]
+
+    def snapshot(self) -> dict:
+        return {"running": self._lock.locked(), "last": self._last}
+
+    # ── Signal trigger ────────────────────────────────────────────────────────
+
+    def installSignalHandler(self) -> None:
+        """SIGUSR2 -> write a profile to PROFILER_OUTPUT_DIR (POSIX only)."""
+        if not hasattr(signal, "SIGUSR2"):
+            return
+        self.bind(asyncio.get_running_loop())
+        try:
+            signal.signal(signal.SIGUSR2, lambda signum, frame: threading.Thread(
+                target=self._profileToFile, name="profiler", daemon=True).start())
+        except ValueError:  # not the main thread (e.g. embedded in another server)
+            logger.warning("[profiler] SIGUSR2 trigger unavailable outside the main thread")
+
+    def _profileToFile(self) -> None:
+        try:
+            collapsed = self.sample(settings.PROFILER_SIGNAL_SECONDS)
+        except ProfilerBusy:
+            logger.warning("[profiler] SIGUSR2 ignored: a profile is already running")
+            return
+        os.makedirs(settings.PROFILER_OUTPUT_DIR, exist_ok=True)
+        path = os.path.join(
+            settings.PROFILER_OUTPUT_DIR, f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.collapsed")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(collapsed)
+        logger.warning(f"[profiler] profile written to {path}")
+
+
+class MemoryTracker:
+    """tracemalloc baseline/diff plus a census of pending asyncio tasks."""
+
+    def __init__(self):
+        self._baseline: tracemalloc.Snapshot | None = None
+        self._baseline_at: str | None = None
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int) -> dict:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            logger.warning(f"[profiler] tracemalloc on ({frames} frames): allocations are slower until stopped")
+        self._rebase(self._take())
+        return self.status()
+
+    def stop(self) -> dict:
+        tracemalloc.stop()
+        self._baseline = None
+        self._baseline_at = None
+        return self.status()
+
+    def diff(self, top: int, group_by: str = "lineno", rebase: bool = False) -> dict:
+        """Heap growth since the baseline, largest first (call via to_thread)."""
+        if not tracemalloc.is_tracing() or self._baseline is None:
+            raise RuntimeError("tracemalloc is not running; start it first")
+        current = self._take()
+        stats = current.compare_to(self._baseline, group_by)
+        result = {
+            **self.status(),
+            "growth": [
+                {
+                    "where": self._where(stat.traceback, group_by),
+                    "size_diff_kb": round(stat.size_diff / 1024, 1),
+                    "size_kb": round(stat.size / 1024, 1),
+                    "count_diff": stat.count_diff,
+                    "count": stat.count,
+                }
+                for stat in stats[:top]
+            ],
+        }
+        if rebase:
+            self._rebase(current)
+        return result
+
+    def status(self) -> dict:
+        traced, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        return {
+            "tracing": tracemalloc.is_tracing(),
+            "baseline_at": self._baseline_at,
+            "traced_mb": round(traced / 1024 / 1024, 2),
+            "peak_mb": round(peak / 1024 / 1024, 2),
+        }
+
+    @staticmethod
+    def pendingTasks(top: int = 20) -> dict:
+        """Pending tasks per coroutine; call from the loop thread."""
+        counts: Counter[str] = Counter()
+        for task in asyncio.all_tasks():
+            coro = task.get_coro()
+            counts[getattr(coro, "__qualname__", type(coro).__name__)] += 1
+        return {"total": sum(counts.values()), "by_coroutine": dict(counts.most_common(top))}
+
+    @staticmethod
+    def _take() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),  # the sampler's own stack counts
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ))
+
+    def _rebase(self, snapshot: tracemalloc.Snapshot) -> None:
+        self._baseline = snapshot
+        self._baseline_at = datetime.now().isoformat(timespec="seconds")
+
+    @staticmethod
+    def _where(traceback: tracemalloc.Traceback, group_by: str) -> str | list[str]:
+        frames = [f"{_shortPath(frame.filename)}:{frame.lineno}" for frame in traceback]
+        return frames if group_by == "traceback" else frames[0]
+
+
+sampling_profiler = SamplingProfiler()
+memory_tracker = MemoryTracker()
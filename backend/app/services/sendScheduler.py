@@ -0,0 +1,272 @@
+"""
+Send Scheduler - Paces all outbound WhatsApp traffic
+Token buckets per chat, session and globally, dispatched by priority lane.
+"""
+import asyncio
+import contextvars
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+from app.config.settings import settings
+from app.services.wahaHealth import waha_health
+from app.utils import tracing
+
+logger = logging.getLogger(__name__)
+
+# Priority lanes (lower goes first)
+PRIORITY_CRITICAL = 0  # payment confirmations, product delivery
+PRIORITY_HIGH = 1      # owner notifications
+PRIORITY_NORMAL = 2    # regular agent replies, manual sends
+PRIORITY_LOW = 3       # greetings, bulk traffic
+
+LANE_NAMES = {
+    PRIORITY_CRITICAL: "critical",
+    PRIORITY_HIGH: "high",
+    PRIORITY_NORMAL: "normal",
+    PRIORITY_LOW: "low",
+}
+
+# Max queued jobs inspected per dispatch pass when heads are throttled
+_SCAN_LIMIT = 200
+
+# Re-check interval for jobs parked behind an open WAHA circuit
+_PARKED_RECHECK_SECONDS = 1.0
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def waitTime(self, now: float) -> float:
+        """Seconds until one token is available (0 if available now)."""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+
+class _SendJob:
+    __slots__ = ("chat_id", "session", "priority", "send", "future", "enqueued_at", "context")
+
+    def __init__(self, chat_id: str, session: str, priority: int,
+                 send: Callable[[], Awaitable[Any]], future: asyncio.Future):
+        self.chat_id = chat_id
+        self.session = session
+        self.priority = priority
+        self.send = send
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        # The send runs in the submitter's context (agent label, trace span)
+        self.context = contextvars.copy_context()
+
+
+class SendScheduler:
+    """
+    Async send queue with per-chat, per-session and global token buckets and
+    priority lanes. Callers await `submit`, which resolves with the result of
+    the send once it has been dispatched.
+    """
+
+    def __init__(self):
+        self._lanes: dict[int, deque[_SendJob]] = {p: deque() for p in LANE_NAMES}
+        self._chat_buckets: dict[str, TokenBucket] = {}
+        self._session_buckets: dict[str, TokenBucket] = {}
+        self._global_bucket: TokenBucket | None = None
+        self._last_prune = 0.0
+        self._in_flight = 0
+        # The loop only keeps weak references to tasks: hold the sends in flight
+        self._running: set[asyncio.Task] = set()
+        self._wakeup: asyncio.Event | None = None
+        self._driver: asyncio.Task | None = None
+
+        # Metrics
+        self._sent = {p: 0 for p in LANE_NAMES}
+        self._failed = 0
+        self._wait_total = {p: 0.0 for p in LANE_NAMES}
+        self._wait_max = {p: 0.0 for p in LANE_NAMES}
+        self._recent_waits: deque[float] = deque(maxlen=1000)
+
+    async def submit(
+        self,
+        chat_id: str,
+        send: Callable[[], Awaitable[Any]],
+        priority: int = PRIORITY_NORMAL,
+        session: str | None = None
+    ) -> Any:
+        """Queue a send and wait for its result."""
+        self._ensureDriver()
+        future = asyncio.get_running_loop().create_future()
+        job = _SendJob(chat_id, session or settings.WAHA_SESSION, priority, send, future)
+        self._lanes.setdefault(priority, deque()).append(job)
+        self._wakeup.set()
+        return await future
+
+    def queueDepth(self) -> int:
+        return sum(len(lane) for lane in self._lanes.values())
+
+    def snapshot(self) -> dict:
+        """Queue depth and wait-time metrics per lane."""
+        waits = sorted(self._recent_waits)
+        return {
+            "queue_depth": self.queueDepth(),
+            "parked": sum(
+                1 for lane in self._lanes.values() for job in lane
+                if waha_health.breaker(job.session).isOpen()
+            ),
+            "in_flight": self._in_flight,
+            "failed": self._failed,
+            "wait_p95_s": waits[int(0.95 * (len(waits) - 1))] if waits else None,
+            "lanes": {
+                LANE_NAMES.get(p, str(p)): {
+                    "queued": len(lane),
+                    "sent": self._sent.get(p, 0),
+                    "avg_wait_s": (self._wait_total.get(p, 0.0) / self._sent[p]) if self._sent.get(p) else None,
+                    "max_wait_s": self._wait_max.get(p, 0.0),
+                }
+                for p, lane in sorted(self._lanes.items())
+            },
+        }
+
+    # ── Driver ────────────────────────────────────────────────────────────────
+
+    def _ensureDriver(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._driver is None or self._driver.done() or self._driver.get_loop() is not loop:
+            self._wakeup = asyncio.Event()
+            # Fresh context: the driver outlives the request that started it
+            self._driver = loop.create_task(self._drive(), context=contextvars.Context())
+
+    async def _drive(self) -> None:
+        while True:
+            self._wakeup.clear()
+            wait = self._dispatchReady()
+            if wait is None:
+                await self._wakeup.wait()
+                continue
+            if wait > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _dispatchReady(self) -> float | None:
+        """
+        Dispatch every job whose buckets allow it, highest lane first.
+        Returns seconds until the next job may be ready (0 to loop again),
+        or None when the queue is empty.
+        """
+        if not self.queueDepth():
+            return None
+
+        now = time.monotonic()
+        next_wait = float("inf")
+        blocked_chats: set[str] = set()
+        scanned = 0
+
+        for priority in sorted(self._lanes):
+            lane = self._lanes[priority]
+            for job in list(lane):
+                if scanned >= _SCAN_LIMIT:
+                    break
+                scanned += 1
+                if job.future.cancelled():
+                    lane.remove(job)
+                    continue
+                if self._in_flight >= settings.SEND_MAX_IN_FLIGHT:
+                    return 0.05
+                # Keep per-chat order: once a chat's job is held back, later ones wait too
+                if job.chat_id in blocked_chats:
+                    continue
+                # Session down: park the job until its circuit closes
+                if waha_health.breaker(job.session).isOpen():
+                    blocked_chats.add(job.chat_id)
+                    next_wait = min(next_wait, _PARKED_RECHECK_SECONDS)
+                    continue
+
+                buckets = self._bucketsFor(job)
+                wait = max(bucket.waitTime(now) for bucket in buckets)
+                if wait > 0:
+                    blocked_chats.add(job.chat_id)
+                    next_wait = min(next_wait, wait)
+                    continue
+
+                for bucket in buckets:
+                    bucket.take(now)
+                lane.remove(job)
+                self._recordWait(job, now)
+                self._in_flight += 1
+                running = asyncio.create_task(self._run(job), context=job.context)
+                self._running.add(running)
+                running.add_done_callback(self._running.discard)
+
+        if not self.queueDepth():
+            return None
+        return 0 if next_wait == float("inf") else next_wait
+
+    async def _run(self, job: _SendJob) -> None:
+        tracing.recordSpan("send_queue", time.monotonic() - job.enqueued_at)
+        try:
+            result = await job.send()
+            if not job.future.done():
+                job.future.set_result(result)
+        except Exception as e:
+            self._failed += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+        finally:
+            self._in_flight -= 1
+            self._wakeup.set()
+
+    def _bucketsFor(self, job: _SendJob) -> list[TokenBucket]:
+        chat = self._chat_buckets.get(job.chat_id)
+        if chat is None:
+            chat = self._chat_buckets[job.chat_id] = TokenBucket(
+                settings.SEND_CHAT_RATE, settings.SEND_CHAT_BURST)
+        session = self._session_buckets.get(job.session)
+        if session is None:
+            session = self._session_buckets[job.session] = TokenBucket(
+                settings.SEND_SESSION_RATE, settings.SEND_SESSION_BURST)
+        if self._global_bucket is None:
+            self._global_bucket = TokenBucket(settings.SEND_GLOBAL_RATE, settings.SEND_GLOBAL_BURST)
+        self._pruneChatBuckets()
+        return [chat, session, self._global_bucket]
+
+    def _pruneChatBuckets(self) -> None:
+        """Drop idle, full chat buckets so the map doesn't grow forever."""
+        now = time.monotonic()
+        if len(self._chat_buckets) < 10000 or now - self._last_prune < 60:
+            return
+        self._last_prune = now
+        for chat_id, bucket in list(self._chat_buckets.items()):
+            bucket._refill(now)
+            if bucket.tokens >= bucket.capacity:
+                del self._chat_buckets[chat_id]
+
+    def _recordWait(self, job: _SendJob, now: float) -> None:
+        waited = now - job.enqueued_at
+        self._sent[job.priority] = self._sent.get(job.priority, 0) + 1
+        self._wait_total[job.priority] = self._wait_total.get(job.priority, 0.0) + waited
+        self._wait_max[job.priority] = max(self._wait_max.get(job.priority, 0.0), waited)
+        self._recent_waits.append(waited)
+        if waited > 5:
+            logger.warning(
+                f"[send-scheduler] {LANE_NAMES.get(job.priority)} send to {job.chat_id} "
+                f"waited {waited:.1f}s (queue depth {self.queueDepth()})")
+
+
+send_scheduler = SendScheduler()
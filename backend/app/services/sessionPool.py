@@ -0,0 +1,130 @@
+"""
+Session Pool - Spreads conversations over several WAHA sessions (numbers)
+Follows the number the customer writes to; consistent-hash placement otherwise.
+"""
+import bisect
+import hashlib
+import logging
+
+from app.config.settings import settings
+from app.services.wahaHealth import waha_health
+
+logger = logging.getLogger(__name__)
+
+# Virtual nodes per session on the hash ring (smooths the distribution)
+_VIRTUAL_NODES = 64
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+def _chatKey(chat_id: str) -> str:
+    """Same key for '593999', '593999@c.us' and '593999@s.whatsapp.net'."""
+    return chat_id.split("@")[0]
+
+
+class SessionPool:
+    """Consistent-hash ring of WAHA sessions plus the sticky chat → session map."""
+
+    def __init__(self):
+        self._ring: list[tuple[int, str]] = []
+        self._ring_sessions: tuple[str, ...] = ()
+        self._bindings: dict[str, str] = {}
+        self._rebalanced = 0
+        self._failovers = 0
+
+    @property
+    def sessions(self) -> list[str]:
+        return list(settings.WAHA_SESSIONS) or [settings.WAHA_SESSION]
+
+    def isHealthy(self, session: str) -> bool:
+        return not waha_health.breaker(session).isOpen()
+
+    def allDown(self) -> bool:
+        return not any(self.isHealthy(session) for session in self.sessions)
+
+    def ringSession(self, chat_id: str) -> str:
+        """Session owning a chat on the hash ring (skipping unhealthy ones)."""
+        ring = self._currentRing()
+        start = bisect.bisect(ring, (_hash(_chatKey(chat_id)), ""))
+        seen = set()
+        for offset in range(len(ring)):
+            session = ring[(start + offset) % len(ring)][1]
+            if session in seen:
+                continue
+            if self.isHealthy(session):
+                return session
+            seen.add(session)
+        # Every session is down: stay on the ring owner and let its breaker park traffic
+        return ring[start % len(ring)][1]
+
+    def assign(self, chat_id: str, stored: str | None = None, inbound: str | None = None) -> str:
+        """
+        Home session of a conversation: the session the customer just wrote
+        to if it is in the pool (replies come from the number they wrote to),
+        else its stored session if still in the pool, else the ring.
+        The result is cached so later sends for the chat use it.
+        """
+        sessions = self.sessions
+        if inbound in sessions:
+            session = inbound
+            if stored in sessions and stored != inbound:
+                logger.info(f"[sessions] {chat_id} wrote to {inbound}, moved from {stored}")
+        elif stored in sessions:
+            session = stored
+        else:
+            session = self.ringSession(chat_id)
+            if stored is not None:
+                self._rebalanced += 1
+                logger.warning(f"[sessions] {chat_id} moved from removed session {stored} to {session}")
+        self._bindings[_chatKey(chat_id)] = session
+        return session
+
+    def sessionFor(self, chat_id: str) -> str:
+        """
+        Session to use for an outbound call to a chat: its home session, or
+        the next healthy one on the ring while the home session is down.
+        """
+        session = self._bindings.get(_chatKey(chat_id))
+        if session is None or session not in self.sessions:
+            session = self.assign(chat_id, stored=session)
+        if self.isHealthy(session):
+            return session
+        fallback = self.ringSession(chat_id)
+        if fallback == session or not self.isHealthy(fallback):
+            return session  # every session is down: stay home, its breaker parks the traffic
+        self._failovers += 1
+        return fallback
+
+    def warm(self, bindings: dict[str, str]) -> None:
+        """Load stored chat → session assignments (e.g. at startup)."""
+        for chat_id, session in bindings.items():
+            self._bindings[_chatKey(chat_id)] = session
+
+    def snapshot(self) -> dict:
+        counts: dict[str, int] = {}
+        for session in self._bindings.values():
+            counts[session] = counts.get(session, 0) + 1
+        return {
+            "sessions": {
+                session: {"healthy": self.isHealthy(session), "conversations": counts.get(session, 0)}
+                for session in self.sessions
+            },
+            "rebalanced": self._rebalanced,
+            "failovers": self._failovers,
+        }
+
+    def _currentRing(self) -> list[tuple[int, str]]:
+        sessions = tuple(self.sessions)
+        if sessions != self._ring_sessions:
+            self._ring = sorted(
+                (_hash(f"{session}#{index}"), session)
+                for session in sessions
+                for index in range(_VIRTUAL_NODES)
+            )
+            self._ring_sessions = sessions
+        return self._ring
+
+
+session_pool = SessionPool()
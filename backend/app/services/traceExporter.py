@@ -0,0 +1,117 @@
+"""
+Trace Exporter - Ships finished trace spans off the event loop
+Writes daily JSONL files under TRACING_DIR or posts OTLP/JSON to a collector.
+"""
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime
+
+import httpx
+
+from app.config.settings import settings
+from app.utils import tracing
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "whatsapp-agents"
+# OTLP SpanKind / StatusCode values
+_OTLP_KINDS = {"internal": 1, "server": 2}
+_OTLP_STATUS = {"ok": 1, "error": 2}
+
+
+def _otlpValue(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def toOtlp(spans: list[dict]) -> dict:
+    """OTLP/JSON ExportTraceServiceRequest for a batch of finished spans."""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{
+                "scope": {"name": "app.utils.tracing"},
+                "spans": [
+                    {
+                        "traceId": span["traceId"],
+                        "spanId": span["spanId"],
+                        **({"parentSpanId": span["parentSpanId"]} if span["parentSpanId"] else {}),
+                        "name": span["name"],
+                        "kind": _OTLP_KINDS.get(span["kind"], 1),
+                        "startTimeUnixNano": str(span["startTimeUnixNano"]),
+                        "endTimeUnixNano": str(span["endTimeUnixNano"]),
+                        "attributes": [
+                            {"key": key, "value": _otlpValue(value)} for key, value in span["attributes"].items()
+                        ],
+                        "status": {"code": _OTLP_STATUS[span["status"]]},
+                    }
+                    for span in spans
+                ],
+            }],
+        }],
+    }
+
+
+class TraceExporter:
+    """Periodic exporter of finished spans (JSONL file or OTLP/HTTP)."""
+
+    def __init__(self):
+        self._client: httpx.Client | None = None
+        self._exported = 0
+        self._failed = 0
+
+    async def runFlusher(self) -> None:
+        while True:
+            await asyncio.sleep(settings.TRACING_FLUSH_SECONDS)
+            batch = tracing.takeFinished()
+            if batch:
+                await asyncio.to_thread(self._export, batch)
+
+    def flush(self) -> None:
+        """Export whatever is buffered (e.g. on shutdown)."""
+        batch = tracing.takeFinished()
+        if batch:
+            self._export(batch)
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": settings.TRACING_ENABLED,
+            "export": settings.TRACING_EXPORT,
+            "buffered": len(tracing.finished),
+            "exported": self._exported,
+            "failed": self._failed,
+            "dropped": tracing.dropped,
+        }
+
+    def _export(self, batch: list[dict]) -> None:
+        try:
+            if settings.TRACING_EXPORT == "otlp":
+                self._postOtlp(batch)
+            else:
+                self._writeFile(batch)
+            self._exported += len(batch)
+        except Exception as e:
+            self._failed += len(batch)
+            logger.error(f"Could not export {len(batch)} trace spans: {str(e)}")
+
+    def _writeFile(self, batch: list[dict]) -> None:
+        os.makedirs(settings.TRACING_DIR, exist_ok=True)
+        path = os.path.join(settings.TRACING_DIR, f"traces-{datetime.now().strftime('%Y%m%d')}.jsonl")
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(span, separators=(",", ":")) + "\n" for span in batch))
+
+    def _postOtlp(self, batch: list[dict]) -> None:
+        if self._client is None:
+            self._client = httpx.Client(timeout=10.0)
+        response = self._client.post(settings.TRACING_OTLP_ENDPOINT, json=toOtlp(batch))
+        response.raise_for_status()
+
+
+trace_exporter = TraceExporter()
@@ -0,0 +1,118 @@
+"""
+Traffic Recorder - Opt-in capture of inbound webhook payloads for replay
+PII is pseudonymised before anything touches the disk.
+"""
+import asyncio
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
+import secrets
+import time
+from datetime import datetime
+
+from app.config.settings import settings
+from app.utils.pii import DIGITS, EMAIL, NAME_KEYS, URL_KEYS
+
+logger = logging.getLogger(__name__)
+
+
+class TrafficRecorder:
+    """In-memory buffer of inbound payloads flushed to compressed JSONL."""
+
+    def __init__(self):
+        self._buffer: list[tuple[float, str, dict]] = []
+        self._secret = (settings.TRAFFIC_RECORDING_SECRET or secrets.token_hex(16)).encode()
+        self._recorded = 0
+        self._dropped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return settings.TRAFFIC_RECORDING_ENABLED
+
+    def record(self, endpoint: str, payload: dict) -> None:
+        """Queue a raw payload (pseudonymised later, when it is written)."""
+        if not self.enabled:
+            return
+        if len(self._buffer) >= settings.TRAFFIC_RECORDING_MAX_BUFFER:
+            self._dropped += 1
+            return
+        self._buffer.append((time.time(), endpoint, payload))
+
+    async def runFlusher(self) -> None:
+        while True:
+            await asyncio.sleep(settings.TRAFFIC_RECORDING_FLUSH_SECONDS)
+            batch = self._takeBatch()
+            if batch:
+                await asyncio.to_thread(self._write, batch)
+
+    def flush(self) -> None:
+        """Write whatever is buffered (e.g. on shutdown)."""
+        batch = self._takeBatch()
+        if batch:
+            self._write(batch)
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "buffered": len(self._buffer),
+            "recorded": self._recorded,
+            "dropped": self._dropped,
+        }
+
+    # ── Pseudonymisation ──────────────────────────────────────────────────────
+
+    def _digest(self, value: str) -> str:
+        return hmac.new(self._secret, value.encode(), hashlib.sha256).hexdigest()
+
+    def _pseudoDigits(self, match: re.Match) -> str:
+        digits = match.group(0)
+        # Same length, "999" prefix so a pseudonym never is a real LATAM number
+        mapped = str(int(self._digest(digits)[:15], 16)).rjust(len(digits), "0")
+        return ("999" + mapped)[:len(digits)]
+
+    def _scrubText(self, text: str) -> str:
+        text = EMAIL.sub(lambda match: f"user-{self._digest(match.group(0).lower())[:8]}@example.com", text)
+        return DIGITS.sub(self._pseudoDigits, text)
+
+    def pseudonymise(self, value, key: str | None = None):
+        if isinstance(value, dict):
+            return {k: self.pseudonymise(v, k) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self.pseudonymise(item, key) for item in value]
+        if isinstance(value, str):
+            if key in NAME_KEYS and value:
+                return f"user-{self._digest(value)[:8]}"
+            if key in URL_KEYS and value:
+                return "https://example.invalid/media"
+            return self._scrubText(value)
+        return value
+
+    # ── Writing ───────────────────────────────────────────────────────────────
+
+    def _takeBatch(self) -> list[tuple[float, str, dict]]:
+        batch, self._buffer = self._buffer, []
+        return batch
+
+    def _write(self, batch: list[tuple[float, str, dict]]) -> None:
+        lines = [
+            json.dumps({"t": round(at, 3), "endpoint": endpoint, "payload": self.pseudonymise(payload)},
+                       ensure_ascii=False, separators=(",", ":"))
+            for at, endpoint, payload in batch
+        ]
+        path = os.path.join(
+            settings.TRAFFIC_RECORDING_DIR, f"webhooks-{datetime.now().strftime('%Y%m%d')}.jsonl.gz")
+        try:
+            os.makedirs(settings.TRAFFIC_RECORDING_DIR, exist_ok=True)
+            # Each flush appends one gzip member; readers see a single stream
+            with gzip.open(path, "at", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+            self._recorded += len(lines)
+        except Exception as e:
+            logger.error(f"Could not write recorded traffic: {str(e)}")
+
+
+traffic_recorder = TrafficRecorder()
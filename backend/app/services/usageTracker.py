@@ -0,0 +1,211 @@
+"""
+AI Usage Tracker - Token/cost accounting and daily budget governor
+"""
+import asyncio
+import json
+import logging
+import os
+from collections import defaultdict
+from contextvars import ContextVar
+from datetime import date, datetime
+
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# USD per million tokens: (input, output)
+MODEL_PRICING = {
+    "claude-3-5-haiku-20241022": (0.80, 4.00),
+    "claude-3-haiku-20240307": (0.25, 1.25),
+    "claude-sonnet-4-20250514": (3.00, 15.00),
+}
+DEFAULT_PRICING = (0.80, 4.00)
+# Prompt-cache pricing as a multiple of the input price
+CACHE_READ_MULTIPLIER = 0.1
+CACHE_WRITE_MULTIPLIER = 1.25
+
+# Conversation the current request belongs to (set by the webhook handler)
+current_conversation: ContextVar[str | None] = ContextVar("current_conversation", default=None)
+
+
+def _emptyTotals() -> dict:
+    return {
+        "calls": 0,
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "cache_read_tokens": 0,
+        "cache_write_tokens": 0,
+        "cost_usd": 0.0,
+        "latency_s": 0.0,
+    }
+
+
+def estimateCost(
+    model: str,
+    input_tokens: int,
+    output_tokens: int,
+    cache_read_tokens: int = 0,
+    cache_write_tokens: int = 0
+) -> float:
+    """
+    Estimate the USD cost of a call from its token counts.
+    `input_tokens` are the uncached input tokens, as reported by the API.
+    """
+    input_price, output_price = MODEL_PRICING.get(model, DEFAULT_PRICING)
+    return (
+        input_tokens * input_price
+        + cache_read_tokens * input_price * CACHE_READ_MULTIPLIER
+        + cache_write_tokens * input_price * CACHE_WRITE_MULTIPLIER
+        + output_tokens * output_price
+    ) / 1_000_000
+
+
+class UsageTracker:
+    """
+    In-memory counters of AI usage per day, per task and per conversation.
+    Counters are cheap dict updates on the hot path; a background loop
+    appends a snapshot to a JSONL file and resets the per-interval counters.
+    """
+
+    def __init__(self):
+        self._day = date.today()
+        self._daily = _emptyTotals()
+        self._degraded_calls = 0
+        self._by_task: dict[str, dict] = defaultdict(_emptyTotals)
+        self._by_model: dict[str, dict] = defaultdict(_emptyTotals)
+        self._by_conversation: dict[str, dict] = defaultdict(_emptyTotals)
+
+    def record(
+        self,
+        task: str,
+        model: str,
+        input_tokens: int,
+        output_tokens: int,
+        latency: float,
+        conversation: str | list[str | None] | None = None,
+        cache_read_tokens: int = 0,
+        cache_write_tokens: int = 0
+    ) -> None:
+        """
+        Record one AI call. `conversation` defaults to the current request's
+        conversation; a list splits the call evenly (batched requests).
+        """
+        self._rollDay()
+        cost = estimateCost(model, input_tokens, output_tokens, cache_read_tokens, cache_write_tokens)
+
+        for totals in (self._daily, self._by_task[task], self._by_model[model]):
+            self._add(totals, 1, input_tokens, output_tokens, cost, latency)
+            totals["cache_read_tokens"] += cache_read_tokens
+            totals["cache_write_tokens"] += cache_write_tokens
+
+        if conversation is None:
+            conversation = current_conversation.get()
+        conversations = conversation if isinstance(conversation, list) else [conversation]
+        conversations = [c for c in conversations if c]
+        share = 1 / len(conversations) if conversations else 0
+        for phone in conversations:
+            self._add(
+                self._by_conversation[phone], share,
+                input_tokens * share, output_tokens * share, cost * share, latency * share)
+
+    def recordDegraded(self, task: str) -> None:
+        """Count a call that was answered locally because of the budget."""
+        self._rollDay()
+        self._degraded_calls += 1
+        logger.info(f"AI budget governor: answered {task} locally")
+
+    def todaySpend(self) -> float:
+        self._rollDay()
+        return self._daily["cost_usd"]
+
+    def shouldDegrade(self) -> bool:
+        """True when today's spend is close enough to the budget to stop calling the AI."""
+        budget = settings.AI_DAILY_BUDGET_USD
+        if budget <= 0:
+            return False
+        return self.todaySpend() >= budget * settings.AI_BUDGET_DEGRADE_AT
+
+    def snapshot(self) -> dict:
+        """Current counters, for the metrics endpoint."""
+        self._rollDay()
+        budget = settings.AI_DAILY_BUDGET_USD
+        return {
+            "day": self._day.isoformat(),
+            "budget_usd": budget,
+            "spent_usd": round(self._daily["cost_usd"], 6),
+            "budget_used": round(self._daily["cost_usd"] / budget, 4) if budget > 0 else None,
+            "degraded": self.shouldDegrade(),
+            "degraded_calls": self._degraded_calls,
+            "cache_hit_ratio": self._cacheHitRatio(self._daily),
+            "daily": dict(self._daily),
+            "by_task": {k: dict(v) for k, v in self._by_task.items()},
+            "by_model": {k: dict(v) for k, v in self._by_model.items()},
+            "conversations": len(self._by_conversation),
+        }
+
+    def flush(self) -> None:
+        """Append the interval counters to the usage log and reset them."""
+        entry = self._takeInterval()
+        if entry:
+            self._writeEntry(entry)
+
+    async def runFlusher(self) -> None:
+        """Background loop that flushes counters every AI_USAGE_FLUSH_SECONDS."""
+        while True:
+            await asyncio.sleep(settings.AI_USAGE_FLUSH_SECONDS)
+            # Counters are swapped on the event loop; only the file write runs in a thread
+            entry = self._takeInterval()
+            if entry:
+                await asyncio.to_thread(self._writeEntry, entry)
+
+    def _takeInterval(self) -> dict | None:
+        if not self._by_task:
+            return None
+        entry = {
+            "flushed_at": datetime.now().isoformat(),
+            "day": self._day.isoformat(),
+            "daily": dict(self._daily),
+            "by_task": dict(self._by_task),
+            "by_model": dict(self._by_model),
+            "by_conversation": dict(self._by_conversation),
+        }
+        self._by_task = defaultdict(_emptyTotals)
+        self._by_model = defaultdict(_emptyTotals)
+        self._by_conversation = defaultdict(_emptyTotals)
+        return entry
+
+    def _writeEntry(self, entry: dict) -> None:
+        try:
+            directory = os.path.dirname(settings.AI_USAGE_LOG_PATH)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(settings.AI_USAGE_LOG_PATH, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, default=str) + "\n")
+        except OSError as e:
+            logger.error(f"Could not write AI usage log: {str(e)}")
+
+    @staticmethod
+    def _cacheHitRatio(totals: dict) -> float | None:
+        """Share of input tokens served from the prompt cache."""
+        total_input = totals["input_tokens"] + totals["cache_read_tokens"] + totals["cache_write_tokens"]
+        return round(totals["cache_read_tokens"] / total_input, 4) if total_input else None
+
+    def _rollDay(self) -> None:
+        today = date.today()
+        if today != self._day:
+            self.flush()
+            self._day = today
+            self._daily = _emptyTotals()
+            self._degraded_calls = 0
+
+    @staticmethod
+    def _add(totals: dict, calls: float, input_tokens: float, output_tokens: float,
+             cost: float, latency: float) -> None:
+        totals["calls"] += calls
+        totals["input_tokens"] += input_tokens
+        totals["output_tokens"] += output_tokens
+        totals["cost_usd"] += cost
+        totals["latency_s"] += latency
+
+
+usage_tracker = UsageTracker()
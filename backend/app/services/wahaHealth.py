@@ -0,0 +1,211 @@
+"""
+WAHA Health - Circuit breaker and session-health gating for WAHA calls
+Fed by request outcomes, session.status webhooks and periodic probes.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling WAHA while the session's circuit is open."""
+
+    def __init__(self, session: str, reason: str | None = None):
+        super().__init__(f"WAHA session '{session}' unavailable ({reason or 'circuit open'})")
+        self.session = session
+        self.reason = reason
+
+
+class CircuitBreaker:
+    """
+    Opens on a high error rate or a non-WORKING session status; after the
+    cooldown one trial request (half-open) closes or re-opens it.
+    """
+
+    def __init__(self, session: str):
+        self.session = session
+        self.state = CLOSED
+        self.reason: str | None = None
+        self.session_status: str | None = None
+        self.opened_at: float | None = None
+        self._outcomes: deque[tuple[float, bool]] = deque()
+        self._trial_in_flight = False
+        self._closed = asyncio.Event()
+        self._closed.set()
+        self._transitions = 0
+
+    # ── Gating ────────────────────────────────────────────────────────────────
+
+    def isOpen(self) -> bool:
+        """True while requests must not be attempted (half-open counts as available)."""
+        if self.state == OPEN and self._cooldownOver():
+            self.state = HALF_OPEN
+            self._trial_in_flight = False
+        return self.state == OPEN
+
+    def allowRequest(self) -> bool:
+        """Whether a request may go out now; claims the trial slot when half-open."""
+        if self.isOpen():
+            return False
+        if self.state == HALF_OPEN:
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+        return True
+
+    def retryAfter(self) -> float:
+        """Seconds until the cooldown ends (inf while a session status holds it open)."""
+        if self.state != OPEN or self.opened_at is None:
+            return 0.0
+        return max(settings.WAHA_BREAKER_COOLDOWN_SECONDS - (time.monotonic() - self.opened_at), 0.0)
+
+    async def waitClosed(self, timeout: float | None = None) -> bool:
+        """Wait until the circuit closes; returns False on timeout."""
+        try:
+            await asyncio.wait_for(self._closed.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    # ── Signals ───────────────────────────────────────────────────────────────
+
+    def recordSuccess(self) -> None:
+        self._record(True)
+        if self.state == HALF_OPEN:
+            self.close("trial request succeeded")
+
+    def recordFailure(self, error: str) -> None:
+        self._record(False)
+        if self.state == HALF_OPEN:
+            self.open(f"trial request failed: {error}")
+            return
+        if self.state == CLOSED and self._tripped():
+            self.open(f"error rate {self._errorRate():.0%}: {error}")
+
+    def onSessionStatus(self, status: str) -> None:
+        self.session_status = status
+        if status == "WORKING":
+            if self.state != CLOSED:
+                self.close("session WORKING")
+        elif self.state != OPEN or self.reason != f"session {status}":
+            self.open(f"session {status}", by_status=True)
+
+    def open(self, reason: str, by_status: bool = False) -> None:
+        if self.state != OPEN:
+            self._transitions += 1
+            logger.error(f"[waha-breaker] {self.session}: circuit OPEN ({reason})")
+        self.state = OPEN
+        self.reason = reason
+        # Status-driven openings wait for WORKING instead of a timed trial
+        self.opened_at = float("inf") if by_status else time.monotonic()
+        self._trial_in_flight = False
+        self._closed.clear()
+
+    def close(self, reason: str) -> None:
+        if self.state != CLOSED:
+            self._transitions += 1
+            logger.warning(f"[waha-breaker] {self.session}: circuit CLOSED ({reason})")
+        self.state = CLOSED
+        self.reason = None
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._outcomes.clear()
+        self._closed.set()
+
+    def snapshot(self) -> dict:
+        self._prune(time.monotonic())
+        return {
+            "state": HALF_OPEN if self.state == OPEN and self._cooldownOver() else self.state,
+            "reason": self.reason,
+            "session_status": self.session_status,
+            "calls_in_window": len(self._outcomes),
+            "error_rate": round(self._errorRate(), 3),
+            "transitions": self._transitions,
+        }
+
+    # ── Internals ─────────────────────────────────────────────────────────────
+
+    def _cooldownOver(self) -> bool:
+        return (
+            self.opened_at is not None
+            and time.monotonic() - self.opened_at >= settings.WAHA_BREAKER_COOLDOWN_SECONDS
+        )
+
+    def _record(self, ok: bool) -> None:
+        now = time.monotonic()
+        self._outcomes.append((now, ok))
+        self._prune(now)
+
+    def _prune(self, now: float) -> None:
+        horizon = now - settings.WAHA_BREAKER_WINDOW_SECONDS
+        while self._outcomes and self._outcomes[0][0] < horizon:
+            self._outcomes.popleft()
+
+    def _errorRate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return sum(1 for _, ok in self._outcomes if not ok) / len(self._outcomes)
+
+    def _tripped(self) -> bool:
+        return (
+            len(self._outcomes) >= settings.WAHA_BREAKER_MIN_CALLS
+            and self._errorRate() >= settings.WAHA_BREAKER_ERROR_RATE
+        )
+
+
+class WahaHealth:
+    """Breakers per WAHA session plus the background status prober."""
+
+    def __init__(self):
+        self._breakers: dict[str, CircuitBreaker] = {}
+
+    def breaker(self, session: str | None = None) -> CircuitBreaker:
+        session = session or settings.WAHA_SESSION
+        breaker = self._breakers.get(session)
+        if breaker is None:
+            breaker = self._breakers[session] = CircuitBreaker(session)
+        return breaker
+
+    def onSessionStatus(self, session: str, status: str) -> None:
+        """Feed a `session.status` webhook event."""
+        self.breaker(session).onSessionStatus(status)
+
+    async def runProber(self) -> None:
+        """Probe every pool session periodically; faster while a circuit is open."""
+        from app.services.evolutionApi import EvolutionApiService
+        from app.services.sessionPool import session_pool
+
+        while True:
+            sessions = session_pool.sessions
+            degraded = any(self.breaker(session).state != CLOSED for session in sessions)
+            await asyncio.sleep(
+                settings.WAHA_HEALTH_PROBE_OPEN_SECONDS if degraded else settings.WAHA_HEALTH_PROBE_SECONDS)
+            await asyncio.gather(*(
+                self._probe(EvolutionApiService(session=session), self.breaker(session))
+                for session in sessions
+            ))
+
+    @staticmethod
+    async def _probe(service, breaker: CircuitBreaker) -> None:
+        try:
+            status = await service.getInstanceStatus(probe=True)
+            breaker.onSessionStatus(status.get("status", "UNKNOWN"))
+        except Exception as e:
+            if breaker.state == CLOSED:
+                breaker.recordFailure(f"probe: {str(e)}")
+            logger.warning(f"[waha-breaker] status probe of {breaker.session} failed: {str(e)}")
+
+    def snapshot(self) -> dict:
+        return {session: breaker.snapshot() for session, breaker in self._breakers.items()}
+
+
+waha_health = WahaHealth()
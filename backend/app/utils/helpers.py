@@ -2,7 +2,7 @@
 Helper utilities
 """
 import re
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
 
 
 def parseNameAndCountry(message: str) -> Tuple[Optional[str], Optional[str]]:
@@ -162,3 +162,23 @@ def getCountryFlag(country: str) -> str:
         "Uruguay": "🇺🇾",
     }
     return flags.get(country, "🌍")
+
+
+_SECTION_SEPARATOR = re.compile(r"^\s*━{3,}\s*$", re.MULTILINE)
+
+
+def splitMessageSections(message: str, min_chars: int = 0) -> List[str]:
+    """
+    Split a long bot message into separate WhatsApp messages
+
+    Args:
+        message: Message text, with sections separated by ━━━ lines
+        min_chars: Messages shorter than this are not split
+
+    Returns:
+        List of non-empty sections (the separator lines are dropped)
+    """
+    if len(message) < min_chars or not _SECTION_SEPARATOR.search(message):
+        return [message]
+    sections = [section.strip() for section in _SECTION_SEPARATOR.split(message)]
+    return [section for section in sections if section] or [message]
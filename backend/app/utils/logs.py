@@ -0,0 +1,178 @@
+"""
+Logs - Structured, sampled logging with I/O off the event loop
+Use %-style arguments, a category and redacted() on hot paths.
+"""
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+from datetime import datetime, timezone
+
+from app.config.settings import settings
+from app.utils import tracing
+from app.utils.pii import DIGITS, EMAIL, NAME_KEYS, URL_KEYS
+
+# Binary/base64 blobs are never worth logging
+_BLOB_KEYS = {"base64", "data", "jpegThumbnail", "thumbnail"}
+
+# Attributes every LogRecord has; anything else came in through `extra`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+# Arguments that can be formatted later, on the listener thread
+_DEFERRABLE = (str, int, float, bool, type(None))
+
+_listener: logging.handlers.QueueListener | None = None
+_queue_handler: "_SampledQueueHandler | None" = None
+
+
+def _maskDigits(match: re.Match) -> str:
+    digits = match.group(0)
+    return digits[:3] + "*" * (len(digits) - 5) + digits[-2:]
+
+
+def _redactText(text: str) -> str:
+    text = EMAIL.sub(lambda match: f"***@{match.group(1)}", text)
+    return DIGITS.sub(_maskDigits, text)
+
+
+def _redact(value, key: str | None = None):
+    if isinstance(value, dict):
+        return {k: _redact(v, k) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_redact(item, key) for item in value]
+    if isinstance(value, str):
+        if key in NAME_KEYS and value:
+            return "***"
+        if key in URL_KEYS and value:
+            return "<url>"
+        if key in _BLOB_KEYS and len(value) > 64:
+            return f"<{len(value)} chars>"
+        return _redactText(value)
+    return value
+
+
+class redacted:
+    """Lazily rendered, redacted and truncated log argument."""
+
+    __slots__ = ("value", "limit")
+
+    def __init__(self, value, limit: int | None = None):
+        self.value = value
+        self.limit = limit
+
+    def __str__(self) -> str:
+        value = _redact(self.value) if settings.LOG_REDACT_PAYLOADS else self.value
+        text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, default=str)
+        limit = self.limit or settings.LOG_PAYLOAD_MAX_CHARS
+        if len(text) > limit:
+            return f"{text[:limit]}…(+{len(text) - limit} chars)"
+        return text
+
+    __repr__ = __str__
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, trace ids and extras."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and value is not None:
+                entry[key] = value if isinstance(value, (str, int, float, bool)) else str(value)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _SampledQueueHandler(logging.handlers.QueueHandler):
+    """
+    Drops sampled-out records before they are queued and hands the rest to
+    the listener with as little work as possible on the calling thread.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self.sampled_out = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        category = getattr(record, "category", None)
+        if category is not None and record.levelno < logging.ERROR:
+            rate = settings.LOG_SAMPLE_RATES.get(category, 1.0)
+            if rate < 1.0 and random.random() >= rate:
+                self.sampled_out += 1
+                return False
+        return super().filter(record)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        args = record.args
+        # Immutable and lazy arguments are formatted on the listener thread;
+        # anything else now, before the caller can mutate it
+        if args and not all(isinstance(arg, (*_DEFERRABLE, redacted)) for arg in (
+                args.values() if isinstance(args, dict) else args)):
+            record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        ids = tracing.currentIds()
+        if ids:
+            record.trace_id, record.span_id = ids
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configureLogging() -> None:
+    """Send root logging through the queue listener (idempotent)."""
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+    output = logging.StreamHandler(sys.stdout)
+    if settings.LOG_FORMAT == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    log_queue: queue.Queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    _queue_handler = _SampledQueueHandler(log_queue)
+    root = logging.getLogger()
+    root.handlers = [_queue_handler]
+    root.setLevel(settings.LOG_LEVEL.upper())
+    if root.level > logging.DEBUG:
+        # One line per outbound request at INFO: only with LOG_LEVEL=DEBUG
+        for noisy in ("httpx", "httpcore", "anthropic"):
+            logging.getLogger(noisy).setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+
+
+def stopLogging() -> None:
+    """Write out queued records (on shutdown)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+        logging.getLogger().handlers = [logging.StreamHandler(sys.stdout)]
+
+
+def snapshot() -> dict:
+    handler = _queue_handler
+    return {
+        "queued": handler.queue.qsize() if handler else 0,
+        "dropped": handler.dropped if handler else 0,
+        "sampled_out": handler.sampled_out if handler else 0,
+    }
@@ -0,0 +1,225 @@
+"""
+Metrics - In-process latency histograms and a Prometheus text exposition
+"""
+import asyncio
+import bisect
+import time
+from contextvars import ContextVar
+
+from app.utils import tracing
+
+# Agent handling the current message; labels every span observed under it
+current_agent: ContextVar[str] = ContextVar("current_agent", default="none")
+
+# Innermost open span per task, readable from the profiler thread (context
+# variables are not). Only maintained while task_tagging is on.
+task_tagging = False
+task_steps: dict[asyncio.Task, tuple[str, str]] = {}
+
+# Seconds; from fast in-memory steps up to slow AI calls and WAHA timeouts
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+# How late the event loop runs a timer: anything over a few ms is blocking code
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Planned reading/typing delays before a reply goes out
+DELAY_BUCKETS = (1.0, 2.0, 4.0, 6.0, 8.0, 12.0, 16.0, 22.0, 30.0, 45.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labelText(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """Fixed-bucket histogram with one series per label combination."""
+
+    def __init__(self, name: str, help_text: str, label_names: tuple[str, ...], buckets: tuple[float, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        # label values -> [per-bucket counts (+inf last), sum]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, *label_values) -> None:
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _labelText(self.label_names, label_values, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            cumulative += counts[-1]
+            labels = _labelText(self.label_names, label_values, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _labelText(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {total:.6f}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+    def quantile(self, q: float, *label_values) -> float | None:
+        """Bucket-interpolated quantile estimate (as Prometheus' histogram_quantile)."""
+        series = self._series.get(label_values)
+        if series is None:
+            return None
+        counts = series[0]
+        total = sum(counts)
+        if total == 0:
+            return None
+        rank = q * total
+        cumulative = 0
+        for index, count in enumerate(counts):
+            if cumulative + count >= rank and count:
+                if index == len(self.buckets):
+                    return self.buckets[-1]  # beyond the last bound: report the bound
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def snapshot(self) -> list[dict]:
+        rows = []
+        for label_values, (counts, total) in sorted(self._series.items()):
+            count = sum(counts)
+            rows.append({
+                **dict(zip(self.label_names, label_values)),
+                "count": count,
+                "mean_s": round(total / count, 4) if count else None,
+                **{
+                    f"p{int(q * 100)}_s": round(value, 4) if value is not None else None
+                    for q in (0.5, 0.95, 0.99)
+                    for value in (self.quantile(q, *label_values),)
+                },
+            })
+        return rows
+
+
+class Counter:
+    """Monotonic counter with one series per label combination."""
+
+    def __init__(self, name: str, help_text: str, label_names: tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._series: dict[tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1) -> None:
+        self._series[label_values] = self._series.get(label_values, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self._series.items()):
+            lines.append(f"{self.name}{_labelText(self.label_names, label_values)} {value:g}")
+        return lines
+
+    def snapshot(self) -> list[dict]:
+        return [
+            {**dict(zip(self.label_names, label_values)), "value": value}
+            for label_values, value in sorted(self._series.items())
+        ]
+
+
+stage_seconds = Histogram(
+    "whatsapp_stage_seconds",
+    "Time spent per processing step, by the agent handling the message",
+    ("agent", "step"),
+    LATENCY_BUCKETS,
+)
+synthetic_delay_seconds = Histogram(
+    "whatsapp_synthetic_delay_seconds",
+    "Planned human-like delay between a message arriving and the reply going out",
+    ("agent",),
+    DELAY_BUCKETS,
+)
+messages_total = Counter(
+    "whatsapp_messages_total",
+    "Inbound messages dispatched to an agent",
+    ("agent",),
+)
+
+loop_lag_seconds = Histogram(
+    "whatsapp_event_loop_lag_seconds",
+    "Delay between when a loop timer was due and when it ran",
+    (),
+    LAG_BUCKETS,
+)
+loop_stalls_total = Counter(
+    "whatsapp_event_loop_stalls_total",
+    "Times the event loop was blocked beyond LOOP_BLOCKING_THRESHOLD_MS (watchdog on)",
+    (),
+)
+
+_REGISTRY = (stage_seconds, synthetic_delay_seconds, messages_total, loop_lag_seconds, loop_stalls_total)
+
+
+class span:
+    """Time a block into whatsapp_stage_seconds{agent, step}."""
+
+    __slots__ = ("step", "agent", "started", "task", "outer", "traced")
+
+    def __init__(self, step: str, agent: str | None = None):
+        self.step = step
+        self.agent = agent
+        self.task = None
+
+    def __enter__(self) -> "span":
+        if task_tagging:
+            self._tag()
+        self.traced = tracing.startSpan(self.step, {"agent": self.agent or current_agent.get()})
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *exc) -> None:
+        stage_seconds.observe(time.perf_counter() - self.started, self.agent or current_agent.get(), self.step)
+        if self.traced is not None:
+            tracing.endSpan(self.traced, error=exc_type is not None)
+        if self.task is not None:
+            if self.outer is None or not task_tagging:
+                task_steps.pop(self.task, None)
+            else:
+                task_steps[self.task] = self.outer
+
+    def _tag(self) -> None:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:  # no loop in this thread (e.g. inside asyncio.to_thread)
+            return
+        if task is not None:
+            self.task = task
+            self.outer = task_steps.get(task)
+            task_steps[task] = (self.agent or current_agent.get(), self.step)
+
+
+def observeStage(step: str, seconds: float, agent: str | None = None) -> None:
+    """Record a duration measured elsewhere (e.g. across callbacks)."""
+    agent = agent or current_agent.get()
+    stage_seconds.observe(seconds, agent, step)
+    tracing.recordSpan(step, seconds, {"agent": agent})
+
+
+def render() -> str:
+    lines = []
+    for metric in _REGISTRY:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+def snapshot() -> dict:
+    return {metric.name: metric.snapshot() for metric in _REGISTRY}
@@ -0,0 +1,12 @@
+"""
+PII - Patterns and payload keys that identify a person
+"""
+import re
+
+# Phone numbers in chat ids and text, message ids, account numbers
+DIGITS = re.compile(r"\d{7,}")
+# Addresses (group 1: the domain), but not WhatsApp ids (593...@c.us, ...@s.whatsapp.net, ...@g.us)
+EMAIL = re.compile(r"[\w.+-]+@((?!(?:c|g)\.us|s\.whatsapp\.net)[\w-]+\.[\w.]+)")
+# Keys whose values are names of people; replaced wholesale
+NAME_KEYS = {"pushName", "notifyName", "verifiedBizName", "name", "_name"}
+URL_KEYS = {"mediaUrl", "url", "directPath"}
@@ -0,0 +1,169 @@
+"""
+Tracing - Lightweight trace/span ids across a conversation turn
+Spans are exported by app/services/traceExporter.py.
+"""
+import random
+import re
+import time
+from contextvars import ContextVar
+
+from app.config.settings import settings
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+# Span that new spans become children of (None: not tracing)
+_current: ContextVar["TraceSpan | None"] = ContextVar("trace_span", default=None)
+
+# Finished spans waiting for the exporter
+finished: list[dict] = []
+dropped = 0
+
+
+class TraceSpan:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start_ns", "attributes")
+
+    def __init__(self, trace_id: str, parent_id: str | None, name: str, kind: str = "internal",
+                 attributes: dict | None = None):
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.attributes = attributes or {}
+
+    def finish(self, error: bool = False, end_ns: int | None = None) -> None:
+        global dropped
+        if len(finished) >= settings.TRACING_MAX_BUFFER:
+            dropped += 1
+            return
+        finished.append({
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": end_ns or time.time_ns(),
+            "attributes": self.attributes,
+            "status": "error" if error else "ok",
+        })
+
+
+def _parseTraceparent(value: str | None) -> tuple[str, str, bool] | None:
+    match = _TRACEPARENT.match(value.strip().lower()) if value else None
+    if not match:
+        return None
+    trace_id, parent_id, flags = match.groups()
+    return trace_id, parent_id, bool(int(flags, 16) & 1)
+
+
+class trace:
+    """
+    Start a trace, or continue the one in `traceparent` (W3C header or a
+    value saved by `traceparent()`), and make it current for the block.
+    """
+
+    __slots__ = ("name", "parent", "attributes", "span", "token")
+
+    def __init__(self, name: str, traceparent: str | None = None, **attributes):
+        self.name = name
+        self.parent = traceparent
+        self.attributes = attributes
+        self.span = None
+
+    def __enter__(self) -> "trace":
+        if not settings.TRACING_ENABLED:
+            return self
+        parent = _parseTraceparent(self.parent)
+        if parent:
+            trace_id, parent_id, sampled = parent
+        else:
+            trace_id, parent_id = f"{random.getrandbits(128):032x}", None
+            sampled = random.random() < settings.TRACING_SAMPLE_RATE
+        if sampled:
+            self.span = TraceSpan(trace_id, parent_id, self.name, "server", self.attributes)
+            self.token = _current.set(self.span)
+        return self
+
+    def __exit__(self, exc_type, *exc) -> None:
+        if self.span is not None:
+            self.span.finish(error=exc_type is not None or self.span.attributes.get("http.status_code", 0) >= 500)
+            _current.reset(self.token)
+
+
+def startSpan(name: str, attributes: dict) -> tuple[TraceSpan, object] | None:
+    """Child of the current span, made current; None when not tracing."""
+    parent = _current.get()
+    if parent is None:
+        return None
+    child = TraceSpan(parent.trace_id, parent.span_id, name, attributes=attributes)
+    return child, _current.set(child)
+
+
+def endSpan(started: tuple[TraceSpan, object], error: bool = False) -> None:
+    child, token = started
+    child.finish(error)
+    try:
+        _current.reset(token)
+    except ValueError:
+        # Closed from another context (e.g. an async generator resumed elsewhere)
+        pass
+
+
+def recordSpan(name: str, seconds: float, attributes: dict | None = None) -> None:
+    """Child span that ended just now, for durations measured across callbacks."""
+    parent = _current.get()
+    if parent is None:
+        return
+    end_ns = time.time_ns()
+    child = TraceSpan(parent.trace_id, parent.span_id, name, attributes=attributes)
+    child.start_ns = end_ns - int(seconds * 1e9)
+    child.finish(end_ns=end_ns)
+
+
+def setAttribute(key: str, value) -> None:
+    span = _current.get()
+    if span is not None:
+        span.attributes[key] = value
+
+
+def traceparent() -> str | None:
+    """W3C traceparent of the current span, to continue the trace elsewhere."""
+    span = _current.get()
+    return f"00-{span.trace_id}-{span.span_id}-01" if span is not None else None
+
+
+def currentIds() -> tuple[str, str] | None:
+    span = _current.get()
+    return (span.trace_id, span.span_id) if span is not None else None
+
+
+def takeFinished() -> list[dict]:
+    global finished
+    batch, finished = finished, []
+    return batch
+
+
+class TracingMiddleware:
+    """Pure ASGI middleware: one trace per webhook request (honours `traceparent`)."""
+
+    def __init__(self, app, path_prefix: str = "/webhooks/"):
+        self.app = app
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or not settings.TRACING_ENABLED
+                or not scope["path"].startswith(self.path_prefix)):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or ())
+        parent = headers.get(b"traceparent", b"").decode("latin-1") or None
+        with trace(f"{scope['method']} {scope['path']}", parent) as root:
+            async def sendWithStatus(message):
+                if message["type"] == "http.response.start" and root.span is not None:
+                    root.span.attributes["http.status_code"] = message["status"]
+                await send(message)
+
+            await self.app(scope, receive, sendWithStatus)
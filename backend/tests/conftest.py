@@ -0,0 +1,4 @@
+import os
+
+# Before any app import: the database module opens DATABASE_URL at import time
+os.environ.setdefault("DATABASE_URL", "sqlite://")
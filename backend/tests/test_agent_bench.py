@@ -0,0 +1,51 @@
+"""
+Agent turns and their regression gates, with the scenarios, stubs and
+baseline of tools/agentBench
+"""
+import asyncio
+import json
+import statistics
+
+import pytest
+
+from tools.agentBench import (
+    DEFAULT_BASELINE,
+    SCENARIOS,
+    Scenario,
+    StubAiService,
+    compare,
+    installStubs,
+    measureAllocations,
+)
+
+BASELINE = json.loads(DEFAULT_BASELINE.read_text())["results"]
+
+
+@pytest.fixture
+def stubs():
+    with installStubs():
+        yield
+
+
+async def reply(scenario: Scenario):
+    result = await scenario.run(scenario.makeState())
+    if hasattr(result, "__aiter__"):
+        return "".join([chunk async for chunk in result])
+    return result
+
+
+@pytest.mark.parametrize("scenario", SCENARIOS, ids=lambda scenario: scenario.name)
+def test_turn_replies_with_the_baseline_ai_calls(stubs, scenario):
+    calls = StubAiService.calls
+
+    assert asyncio.run(reply(scenario))
+    assert StubAiService.calls - calls == BASELINE[scenario.name]["ai_calls"]
+
+
+@pytest.mark.parametrize("scenario", SCENARIOS, ids=lambda scenario: scenario.name)
+def test_allocations_per_turn_within_the_baseline(stubs, scenario):
+    allocations = asyncio.run(measureAllocations(scenario, 50))
+    result = {"alloc_kb": round(statistics.median(allocations) / 1024, 2), "score": 0}
+
+    assert compare({scenario.name: result}, BASELINE, time_threshold=0, alloc_threshold=0.10) == []
+
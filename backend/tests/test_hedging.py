@@ -0,0 +1,144 @@
+"""
+Hedged AI requests and latency-driven demotion, against tools/anthropicStub
+(its per-model latency injection decides who wins).
+"""
+import asyncio
+import socket
+import threading
+import time
+
+import pytest
+import uvicorn
+
+from app.config.settings import settings
+from app.services import openaiService
+from app.services.modelRouting import ModelRouter
+from tools.anthropicStub import DEFAULT_CONFIG, StubState, createApp
+
+PRIMARY = "primary-model"
+FAST = "fast-model"
+
+
+@pytest.fixture(scope="module")
+def stub_server():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    state = StubState()
+    server = uvicorn.Server(uvicorn.Config(createApp(state), host="127.0.0.1", port=port, log_level="critical"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.02)
+    yield state, f"http://127.0.0.1:{port}"
+    server.should_exit = True
+    thread.join(timeout=5)
+
+
+@pytest.fixture
+def stub(stub_server, monkeypatch) -> StubState:
+    state, url = stub_server
+    state.reset()
+    state.config.update(DEFAULT_CONFIG, model_latency_ms={}, model_error_rate={})
+    monkeypatch.setattr(settings, "ANTHROPIC_BASE_URL", url)
+    monkeypatch.setattr(settings, "ANTHROPIC_API_KEY", "test")
+    monkeypatch.setattr(openaiService, "_client", None)
+    return state
+
+
+@pytest.fixture
+def router(monkeypatch) -> ModelRouter:
+    for name, value in {
+        "AI_MODEL": PRIMARY,
+        "AI_FAST_MODEL": FAST,
+        "AI_HEDGING_ENABLED": True,
+        "AI_HEDGE_MIN_DELAY_MS": 100,
+        "AI_BATCH_ENABLED": False,
+        "AI_ROUTES": {"intent": {"timeout": 1.0}},
+        "AI_LATENCY_MIN_SAMPLES": 3,
+        "AI_DEMOTION_PROBE_RATE": 0.0,
+    }.items():
+        monkeypatch.setattr(settings, name, value)
+    fresh = ModelRouter()
+    monkeypatch.setattr(openaiService, "model_router", fresh)
+    return fresh
+
+
+def modelStats(router: ModelRouter, model: str) -> dict | None:
+    return router.snapshot()["intent"]["models"].get(model)
+
+
+def classify() -> str:
+    return asyncio.run(openaiService.OpenAiService().classifyIntent("ok y eso q es", "Luis"))
+
+
+def test_primary_answers_before_the_hedge_delay(stub, router):
+    stub.config["model_latency_ms"] = {PRIMARY: 0, FAST: 0}
+
+    assert classify() in ("purchase", "info", "objection", "unclear")
+
+    assert stub.total_requests == 1
+    assert modelStats(router, PRIMARY)["samples"] == 1
+    assert modelStats(router, FAST) is None
+
+
+def test_hedge_wins_and_the_cancelled_primary_is_not_a_failure(stub, router):
+    # Hedge fires after max(100 ms, timeout / 4) = 250 ms
+    stub.config["model_latency_ms"] = {PRIMARY: 800, FAST: 0}
+
+    classify()
+
+    assert stub.total_requests == 2
+    fast = modelStats(router, FAST)
+    assert fast["samples"] == 1 and fast["error_rate"] == 0
+    primary = modelStats(router, PRIMARY)
+    assert primary["samples"] == 1
+    assert primary["error_rate"] == 0
+    # Recorded as a lower bound of its latency: at least the hedge delay
+    assert primary["p95"] >= 0.25
+
+
+def test_primary_failing_fast_fires_the_hedge_right_away(stub, router):
+    stub.config["model_latency_ms"] = {PRIMARY: 0, FAST: 0}
+    stub.config["model_error_rate"] = {PRIMARY: 1.0}
+
+    started = time.monotonic()
+    classify()
+
+    assert time.monotonic() - started < 0.25  # did not wait for the hedge delay
+    assert stub.total_requests == 2
+    assert modelStats(router, PRIMARY)["error_rate"] == 1
+    fast = modelStats(router, FAST)
+    assert fast["samples"] == 1 and fast["error_rate"] == 0
+
+
+def test_caller_cancellation_cancels_pending_attempts(stub, router):
+    stub.config["model_latency_ms"] = {PRIMARY: 5000, FAST: 5000}
+
+    async def cancelWhileWaiting():
+        call = asyncio.create_task(openaiService.OpenAiService().classifyIntent("hola", "Luis"))
+        await asyncio.sleep(0.05)
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+        await asyncio.sleep(0)
+        return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    assert asyncio.run(cancelWhileWaiting()) == []
+    assert stub.total_requests == 1
+
+
+def test_slow_primary_is_demoted_to_the_fast_tier(stub, router, monkeypatch):
+    monkeypatch.setattr(settings, "AI_HEDGING_ENABLED", False)
+    # p95 above AI_DEMOTE_P95_RATIO (0.8) of the 1 s timeout
+    stub.config["model_latency_ms"] = {PRIMARY: 850, FAST: 0}
+
+    for _ in range(settings.AI_LATENCY_MIN_SAMPLES):
+        classify()
+
+    assert router.tierFor("intent") == "fast"
+    assert router.route("intent").model == FAST
+    total = stub.total_requests
+    classify()
+    assert stub.total_requests == total + 1
+    assert modelStats(router, FAST)["samples"] == 1
@@ -0,0 +1,71 @@
+"""
+Owner notifications: digests and urgent events go to the outbox, never inline
+"""
+import asyncio
+
+import pytest
+
+from app.config.settings import settings
+from app.database.db import OutboxMessageDB, SessionLocal
+from app.services.evolutionApi import EvolutionApiService
+from app.services.notificationDigest import NotificationDigest
+from app.services.notificationService import NotificationService
+from app.services.sendScheduler import PRIORITY_CRITICAL, PRIORITY_HIGH
+
+
+@pytest.fixture
+def outbox(monkeypatch):
+    """Empty outbox; a WAHA send (as with the circuit open) would hang the test."""
+    async def hang(*args, **kwargs):
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(EvolutionApiService, "sendTextMessage", hang)
+    monkeypatch.setattr(settings, "OWNER_WHATSAPP", "593990000000")
+    db = SessionLocal()
+    try:
+        db.query(OutboxMessageDB).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+def queued() -> list[OutboxMessageDB]:
+    db = SessionLocal()
+    try:
+        return db.query(OutboxMessageDB).order_by(OutboxMessageDB.id).all()
+    finally:
+        db.close()
+
+
+def test_payment_pending_is_queued_right_away_on_the_critical_lane(outbox, monkeypatch):
+    digest = NotificationDigest()
+    monkeypatch.setattr("app.services.notificationService.notification_digest", digest)
+
+    async def notify():
+        await NotificationService().notifyPaymentPending("Luis", "Ecuador", "593990000001", 25)
+        return digest.snapshot()
+
+    snapshot = asyncio.run(asyncio.wait_for(notify(), timeout=2))
+
+    assert snapshot["buffered"] == 0 and snapshot["urgent"] == 1
+    [row] = queued()
+    assert row.chat_id == "593990000000@s.whatsapp.net"
+    assert row.priority == PRIORITY_CRITICAL
+    assert "Pago Pendiente" in row.text
+
+
+def test_full_buffer_flushes_one_digest_to_the_outbox(outbox, monkeypatch):
+    monkeypatch.setattr(settings, "NOTIFY_DIGEST_MAX_EVENTS", 3)
+    digest = NotificationDigest()
+    monkeypatch.setattr("app.services.notificationService.notification_digest", digest)
+
+    async def notify():
+        for index in range(3):
+            await NotificationService().notifyNewLead(f"Lead {index}", "Perú", f"51990000{index}")
+
+    asyncio.run(asyncio.wait_for(notify(), timeout=2))
+
+    [row] = queued()
+    assert row.priority == PRIORITY_HIGH
+    assert "3 nuevos leads" in row.text
+    assert digest.snapshot()["messages_saved"] == 2
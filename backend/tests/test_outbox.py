@@ -0,0 +1,147 @@
+"""
+Durable outbox: idempotent enqueue, retries, dead letters and open circuits
+"""
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.config.settings import settings
+from app.database.db import (
+    ConversationStateDB,
+    OutboxMessageDB,
+    SessionLocal,
+    enqueue_outbox_messages,
+    load_due_outbox_messages,
+)
+from app.models.conversation import ConversationState
+from app.services.evolutionApi import EvolutionApiService
+from app.services.outboxWorker import OutboxWorker
+from app.services.wahaHealth import CircuitOpenError, waha_health
+
+CHAT = "593990000001@c.us"
+
+
+@pytest.fixture(autouse=True)
+def empty_db():
+    db = SessionLocal()
+    try:
+        db.query(OutboxMessageDB).delete()
+        db.query(ConversationStateDB).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def send(monkeypatch) -> list:
+    """Outcome of the WAHA send: set `send[0]` to an exception to make it fail."""
+    outcome: list = [None]
+
+    async def sendTextMessage(self, chat_id, text, priority=None):
+        if outcome[0] is not None:
+            raise outcome[0]
+        return {"id": "sent"}
+
+    monkeypatch.setattr(EvolutionApiService, "sendTextMessage", sendTextMessage)
+    return outcome
+
+
+def message(key: str, text: str = "hola") -> dict:
+    return {"idempotency_key": key, "chat_id": CHAT, "text": text, "priority": 2, "deliver_at": time.time()}
+
+
+def row() -> OutboxMessageDB:
+    db = SessionLocal()
+    try:
+        return db.query(OutboxMessageDB).one()
+    finally:
+        db.close()
+
+
+def deliverOnce(worker: OutboxWorker) -> bool:
+    """Deliver the one due message; returns whether the worker woke itself up."""
+    async def deliver():
+        worker._wakeup = asyncio.Event()
+        [due] = await load_due_outbox_messages(time.time(), 10)
+        await worker._deliver(due)
+        return worker._wakeup.is_set()
+
+    return asyncio.run(deliver())
+
+
+def test_redelivered_reply_writes_neither_messages_nor_state():
+    state = ConversationState(phone_number=CHAT, current_agent="consultant")
+    assert asyncio.run(enqueue_outbox_messages([message("reply:m1:0")], state=state)) == 1
+
+    state.current_agent = "router"
+    assert asyncio.run(enqueue_outbox_messages(
+        [message("reply:m1:0", "otra"), message("reply:m1:1")], state=state)) == 0
+
+    db = SessionLocal()
+    try:
+        assert db.query(OutboxMessageDB).count() == 1
+        stored = db.query(ConversationStateDB).one()
+        assert stored.current_agent == "consultant"
+        assert stored.message_count == 1
+    finally:
+        db.close()
+
+
+def test_delivered_message_is_marked_sent(send):
+    asyncio.run(enqueue_outbox_messages([message("k")]))
+
+    deliverOnce(OutboxWorker())
+
+    assert row().status == "sent"
+
+
+def test_server_error_is_retried_with_backoff(send):
+    send[0] = httpx.HTTPStatusError(
+        "503", request=httpx.Request("POST", "http://waha"), response=httpx.Response(503))
+    asyncio.run(enqueue_outbox_messages([message("k")]))
+
+    deliverOnce(OutboxWorker())
+
+    failed = row()
+    assert failed.status == "pending" and failed.attempts == 1
+    assert failed.next_attempt_at > time.time()
+    assert "503" in failed.last_error
+
+
+def test_client_error_is_dead_lettered_at_once(send):
+    send[0] = httpx.HTTPStatusError(
+        "400", request=httpx.Request("POST", "http://waha"), response=httpx.Response(400))
+    asyncio.run(enqueue_outbox_messages([message("k")]))
+
+    deliverOnce(OutboxWorker())
+
+    assert row().status == "dead"
+
+
+def test_last_attempt_is_dead_lettered(send, monkeypatch):
+    monkeypatch.setattr(settings, "OUTBOX_MAX_ATTEMPTS", 1)
+    send[0] = httpx.ConnectError("refused")
+    asyncio.run(enqueue_outbox_messages([message("k")]))
+
+    worker = OutboxWorker()
+    deliverOnce(worker)
+
+    assert row().status == "dead" and row().attempts == 1
+    assert worker.snapshot()["dead_lettered"] == 1
+
+
+def test_open_circuit_is_not_an_attempt_and_waits_for_the_cooldown(send):
+    breaker = waha_health.breaker("outbox-test")
+    breaker.open("test")
+    send[0] = CircuitOpenError("outbox-test")
+    asyncio.run(enqueue_outbox_messages([message("k")]))
+
+    woken = deliverOnce(OutboxWorker())
+
+    parked = row()
+    assert parked.status == "pending" and parked.attempts == 0
+    assert parked.next_attempt_at >= time.time() + settings.WAHA_BREAKER_COOLDOWN_SECONDS - 1
+    assert not woken
+    breaker.close("test")
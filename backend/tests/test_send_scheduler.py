@@ -0,0 +1,27 @@
+"""
+Send scheduler priority lanes
+"""
+import asyncio
+
+from app.services.sendScheduler import PRIORITY_CRITICAL, PRIORITY_LOW, PRIORITY_NORMAL, SendScheduler
+
+
+def test_higher_lanes_are_dispatched_first():
+    order = []
+
+    def sendFor(label: str):
+        async def send():
+            order.append(label)
+        return send
+
+    async def submitAll():
+        scheduler = SendScheduler()
+        await asyncio.gather(
+            scheduler.submit("1@c.us", sendFor("low"), PRIORITY_LOW),
+            scheduler.submit("2@c.us", sendFor("normal"), PRIORITY_NORMAL),
+            scheduler.submit("3@c.us", sendFor("critical"), PRIORITY_CRITICAL),
+        )
+
+    asyncio.run(submitAll())
+
+    assert order == ["critical", "normal", "low"]
@@ -0,0 +1,34 @@
+"""
+Conversation → WAHA session assignment
+"""
+import pytest
+
+from app.config.settings import settings
+from app.services.sessionPool import SessionPool
+
+CHAT = "593990000001@c.us"
+
+
+@pytest.fixture
+def pool(monkeypatch) -> SessionPool:
+    monkeypatch.setattr(settings, "WAHA_SESSIONS", ["a", "b", "c"])
+    return SessionPool()
+
+
+def test_inbound_session_wins_over_the_stored_one(pool):
+    assert pool.assign(CHAT, stored="a", inbound="b") == "b"
+    assert pool.sessionFor(CHAT) == "b"
+
+
+def test_stored_session_is_kept_without_an_inbound_one(pool):
+    assert pool.assign(CHAT, stored="c") == "c"
+    assert pool.assign(CHAT, stored="c", inbound="not-in-pool") == "c"
+
+
+def test_new_chat_without_inbound_goes_to_the_ring(pool):
+    assert pool.assign(CHAT) == pool.ringSession(CHAT)
+
+
+def test_removed_stored_session_is_replaced_from_the_ring(pool):
+    assert pool.assign(CHAT, stored="gone") == pool.ringSession(CHAT)
+    assert pool.snapshot()["rebalanced"] == 1
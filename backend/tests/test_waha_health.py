@@ -0,0 +1,68 @@
+"""
+WAHA circuit breaker
+"""
+import time
+
+import pytest
+
+from app.config.settings import settings
+from app.services.wahaHealth import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+@pytest.fixture
+def breaker(monkeypatch) -> CircuitBreaker:
+    monkeypatch.setattr(settings, "WAHA_BREAKER_MIN_CALLS", 4)
+    monkeypatch.setattr(settings, "WAHA_BREAKER_ERROR_RATE", 0.5)
+    monkeypatch.setattr(settings, "WAHA_BREAKER_COOLDOWN_SECONDS", 15.0)
+    return CircuitBreaker("test")
+
+
+def coolDown(breaker: CircuitBreaker) -> None:
+    breaker.opened_at = time.monotonic() - settings.WAHA_BREAKER_COOLDOWN_SECONDS
+
+
+def test_opens_at_the_error_rate_once_there_are_enough_calls(breaker):
+    breaker.recordFailure("503")
+    breaker.recordFailure("503")
+    breaker.recordSuccess()
+    assert breaker.state == CLOSED  # 3 calls, under WAHA_BREAKER_MIN_CALLS
+
+    breaker.recordSuccess()
+    breaker.recordFailure("503")
+
+    assert breaker.state == OPEN
+    assert not breaker.allowRequest()
+    assert 14 < breaker.retryAfter() <= 15
+
+
+def test_half_open_lets_a_single_trial_through(breaker):
+    breaker.open("test")
+    coolDown(breaker)
+
+    assert breaker.retryAfter() == 0
+    assert breaker.allowRequest()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allowRequest()  # the trial is still in flight
+
+
+def test_trial_outcome_closes_or_reopens(breaker):
+    breaker.open("test")
+    coolDown(breaker)
+    breaker.allowRequest()
+    breaker.recordFailure("timeout")
+    assert breaker.state == OPEN
+
+    coolDown(breaker)
+    breaker.allowRequest()
+    breaker.recordSuccess()
+    assert breaker.state == CLOSED and breaker.allowRequest()
+
+
+def test_session_status_holds_it_open_until_working(breaker):
+    breaker.onSessionStatus("SCAN_QR_CODE")
+    assert breaker.state == OPEN
+    assert breaker.retryAfter() == float("inf")
+    assert not breaker.allowRequest()
+
+    breaker.onSessionStatus("WORKING")
+    assert breaker.state == CLOSED
@@ -0,0 +1 @@
+"""Development tools: local service stand-ins, benchmarks and replay utilities"""
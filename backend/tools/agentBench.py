@@ -0,0 +1,346 @@
+"""
+Agent Bench - Per-agent micro-benchmarks gated against a stored baseline
+AI, notifications and sends are stubbed; times are scored against a calibration loop.
+
+Usage (from backend/):
+    python -m tools.agentBench                      # compare with the baseline
+    python -m tools.agentBench --save               # record a new baseline
+    python -m tools.agentBench -k router --rounds 5000 --time-threshold 0.15
+"""
+import os
+
+# Before any app import: the app opens DATABASE_URL at import time
+os.environ["DATABASE_URL"] = "sqlite://"
+
+import argparse  # noqa: E402
+import asyncio  # noqa: E402
+import contextlib  # noqa: E402
+import json  # noqa: E402
+import platform  # noqa: E402
+import re  # noqa: E402
+import statistics  # noqa: E402
+import sys  # noqa: E402
+import time  # noqa: E402
+import tracemalloc  # noqa: E402
+from dataclasses import dataclass, field  # noqa: E402
+from datetime import datetime  # noqa: E402
+from pathlib import Path  # noqa: E402
+from typing import Awaitable, Callable  # noqa: E402
+from unittest import mock  # noqa: E402
+
+from app.agents.closer import CloserAgent  # noqa: E402
+from app.agents.consultant import ConsultantAgent  # noqa: E402
+from app.agents.greeter import GreeterAgent  # noqa: E402
+from app.agents.router import RouterAgent  # noqa: E402
+from app.agents.upsell import UpsellAgent  # noqa: E402
+from app.agents.verifier import VerifierAgent  # noqa: E402
+from app.api.webhooks import process_message  # noqa: E402
+from app.models.conversation import ConversationState  # noqa: E402
+from app.utils.helpers import parseNameAndCountry  # noqa: E402
+
+DEFAULT_BASELINE = Path(__file__).parent / "data" / "agentBenchBaseline.json"
+SENDER = "593990000001@c.us"
+# Allocation changes smaller than this are noise (interning, dict resizes)
+ALLOC_NOISE_KB = 0.5
+_CALIBRATION_RE = re.compile(r"\b(comprar|curso|precio|ecuador)\b")
+
+
+# ── Stubs ─────────────────────────────────────────────────────────────────────
+
+class StubAiService:
+    """Instant, deterministic answers for the OpenAiService calls agents make."""
+
+    calls = 0
+
+    async def parseNameAndCountry(self, message: str) -> tuple[str | None, str | None]:
+        StubAiService.calls += 1
+        return parseNameAndCountry(message)
+
+    async def classifyUserLevel(self, message: str, user_name: str) -> str:
+        StubAiService.calls += 1
+        return "intermediate"
+
+    async def classifyIntent(self, message: str, user_name: str, context: str = "") -> str:
+        StubAiService.calls += 1
+        return "info"
+
+    async def classifyUpsellIntent(self, message: str, user_name: str) -> str:
+        StubAiService.calls += 1
+        return "info"
+
+    async def streamObjection(self, message: str, user_name: str | None):
+        StubAiService.calls += 1
+        for chunk in ("Entiendo tu duda. ", "Cuéntame más ", "y lo vemos juntos."):
+            yield chunk
+
+
+class StubNotificationService:
+    async def notify(self, event_type: str, message: str, summary: str, urgent: bool = False) -> bool:
+        return True
+
+
+async def stubSendTextWithHumanBehavior(self, phone_number: str, message: str, **kwargs) -> dict:
+    return {"status": "scheduled", "parts": 1}
+
+
+def installStubs() -> contextlib.ExitStack:
+    stack = contextlib.ExitStack()
+    for module in ("greeter", "consultant", "router", "upsell"):
+        stack.enter_context(mock.patch(f"app.agents.{module}.OpenAiService", StubAiService))
+    stack.enter_context(mock.patch("app.agents.verifier.NotificationService", StubNotificationService))
+    stack.enter_context(mock.patch(
+        "app.services.evolutionApi.EvolutionApiService.sendTextWithHumanBehavior", stubSendTextWithHumanBehavior))
+    return stack
+
+
+# ── Scenarios ─────────────────────────────────────────────────────────────────
+
+@dataclass
+class Scenario:
+    name: str
+    run: Callable[[ConversationState], Awaitable]
+    state: dict = field(default_factory=dict)
+
+    def makeState(self) -> ConversationState:
+        return ConversationState(phone_number=SENDER, **self.state)
+
+
+def dispatch(message_type: str, content: str | dict) -> Callable[[ConversationState], Awaitable]:
+    return lambda state: process_message(SENDER, message_type, content, state)
+
+
+NAMED = {"user_name": "Luis", "user_country": "Ecuador", "user_level": "beginner"}
+AT_CONSULTANT = {**NAMED, "current_agent": "consultant", "consultant_step": "asked_level"}
+AT_ROUTER = {**NAMED, "current_agent": "router"}
+AT_CLOSER = {**NAMED, "current_agent": "closer", "closer_step": "waiting_proof", "waiting_for_payment_proof": True}
+AT_UPSELL = {**NAMED, "current_agent": "upsell", "payment_confirmed": True, "product_delivered": True}
+PROOF = {"url": "https://example.invalid/proof.jpg"}
+
+SCENARIOS = [
+    Scenario("greeter.process:name_in_first_message", lambda s: GreeterAgent().process(SENDER, "Luis, Ecuador", s)),
+    Scenario("greeter.process:hook", lambda s: GreeterAgent().process(SENDER, "hola", s)),
+    Scenario("greeter.process:reply_after_hook",
+             lambda s: GreeterAgent().process(SENDER, "soy María de Perú", s), {"greeter_step": "asked_name"}),
+    Scenario("consultant.start", lambda s: ConsultantAgent().start(SENDER, s), NAMED),
+    Scenario("consultant.process:local", lambda s: ConsultantAgent().process(SENDER, "soy novato", s), AT_CONSULTANT),
+    Scenario("consultant.process:ai_fallback",
+             lambda s: ConsultantAgent().process(SENDER, "mmm más o menos jaja", s), AT_CONSULTANT),
+    Scenario("router.process:purchase", lambda s: RouterAgent().process(SENDER, "quiero comprar", s), AT_ROUTER),
+    Scenario("router.process:info", lambda s: RouterAgent().process(SENDER, "más info porfa", s), AT_ROUTER),
+    Scenario("router.process:objection", lambda s: RouterAgent().process(SENDER, "está caro", s), AT_ROUTER),
+    Scenario("router.process:ai_fallback", lambda s: RouterAgent().process(SENDER, "ok y eso q es", s), AT_ROUTER),
+    Scenario("closer.start", lambda s: CloserAgent().start(SENDER, s), AT_ROUTER),
+    Scenario("closer.process:confirm", lambda s: CloserAgent().process(SENDER, "listo, ya transfiero", s), AT_CLOSER),
+    Scenario("verifier.handlePaymentProof", lambda s: VerifierAgent().handlePaymentProof(SENDER, PROOF, s), AT_CLOSER),
+    Scenario("verifier.confirmPaymentAndDeliverProduct",
+             lambda s: VerifierAgent().confirmPaymentAndDeliverProduct(SENDER, "Luis", s), AT_CLOSER),
+    Scenario("upsell.process:accept", lambda s: UpsellAgent().process(SENDER, "sí, lo quiero", s), AT_UPSELL),
+    Scenario("upsell.process:reject", lambda s: UpsellAgent().process(SENDER, "no gracias", s), AT_UPSELL),
+    Scenario("upsell.process:ai_fallback", lambda s: UpsellAgent().process(SENDER, "hmm tal vez", s), AT_UPSELL),
+    Scenario("process_message:greeter", dispatch("text", "Luis, Ecuador")),
+    Scenario("process_message:consultant", dispatch("text", "soy novato"), AT_CONSULTANT),
+    Scenario("process_message:router", dispatch("text", "quiero comprar"), AT_ROUTER),
+    Scenario("process_message:closer", dispatch("text", "listo"), AT_CLOSER),
+    Scenario("process_message:upsell", dispatch("text", "no gracias"), AT_UPSELL),
+    Scenario("process_message:image", dispatch("image", PROOF), AT_CLOSER),
+]
+
+
+# ── Measurement ───────────────────────────────────────────────────────────────
+
+async def runTurn(scenario: Scenario, state: ConversationState) -> None:
+    result = await scenario.run(state)
+    if hasattr(result, "__aiter__"):
+        async for _ in result:
+            pass
+
+
+def calibrate(samples: int = 21) -> int:
+    """
+    Median ns of a fixed pure-Python workload (string, dict and regex work,
+    like an agent turn), timed next to every block: scores are block medians
+    divided by it, which cancels the machine's speed and its slow spells.
+    """
+    times = []
+    for _ in range(samples):
+        started = time.perf_counter_ns()
+        fields = {}
+        for i in range(200):
+            text = f"Hola soy Luis {i} de Ecuador, quiero comprar el curso".lower()
+            fields[text[:12] + str(i)] = _CALIBRATION_RE.findall(text)
+        sorted(fields.items())
+        times.append(time.perf_counter_ns() - started)
+    return statistics.median(times)
+
+
+async def timeBlock(scenario: Scenario, rounds: int) -> list[int]:
+    times = []
+    for _ in range(rounds):
+        state = scenario.makeState()
+        started = time.perf_counter_ns()
+        await runTurn(scenario, state)
+        times.append(time.perf_counter_ns() - started)
+    return times
+
+
+async def measureAllocations(scenario: Scenario, rounds: int) -> list[int]:
+    """Peak bytes allocated per turn (a separate pass: tracemalloc slows everything down)."""
+    allocations = []
+    tracemalloc.start()
+    try:
+        for _ in range(rounds):
+            state = scenario.makeState()
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            await runTurn(scenario, state)
+            allocations.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+    return allocations
+
+
+async def runAll(scenarios: list[Scenario], args: argparse.Namespace) -> dict:
+    for scenario in scenarios:
+        for _ in range(args.warmup):
+            await runTurn(scenario, scenario.makeState())
+
+    # Blocks are interleaved across scenarios so a slow spell on the machine
+    # (other processes, CPU frequency changes) hits one block of each
+    # scenario rather than all blocks of one
+    times = {scenario.name: [] for scenario in scenarios}
+    block_medians = {scenario.name: [] for scenario in scenarios}
+    block_scores = {scenario.name: [] for scenario in scenarios}
+    ai_calls = {}
+    for _ in range(args.repeat):
+        for scenario in scenarios:
+            calls_before = StubAiService.calls
+            reference = calibrate()
+            block = await timeBlock(scenario, max(1, args.rounds // args.repeat))
+            reference = min(reference, calibrate())
+            ai_calls[scenario.name] = (StubAiService.calls - calls_before) / len(block)
+            times[scenario.name].extend(block)
+            block_medians[scenario.name].append(statistics.median(block))
+            block_scores[scenario.name].append(statistics.median(block) / reference)
+
+    results = {}
+    for scenario in scenarios:
+        allocations = await measureAllocations(scenario, args.alloc_rounds)
+        samples = sorted(times[scenario.name])
+        results[scenario.name] = {
+            "min_us": round(samples[0] / 1000, 2),
+            # Best block median, as timeit does: noise only ever slows a block down
+            "median_us": round(min(block_medians[scenario.name]) / 1000, 2),
+            # Per-turn time in calibration units (median over the blocks):
+            # what the time gate compares
+            "score": round(statistics.median(block_scores[scenario.name]), 4),
+            "p95_us": round(samples[int(0.95 * (len(samples) - 1))] / 1000, 2),
+            "alloc_kb": round(statistics.median(allocations) / 1024, 2),
+            "ai_calls": round(ai_calls[scenario.name], 2),
+        }
+    return results
+
+
+# ── Baseline comparison ───────────────────────────────────────────────────────
+
+def compare(results: dict, baseline: dict, time_threshold: float,
+            alloc_threshold: float) -> list[tuple[str, str]]:
+    """(scenario, reason) for every scenario that regressed beyond the thresholds."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if time_threshold > 0 and base["score"]:
+            change = result["score"] / base["score"] - 1
+            if change > time_threshold:
+                regressions.append((name, f"median {base['median_us']} → {result['median_us']} µs, "
+                                          f"{change:+.0%} relative to the calibration workload"))
+        grown_kb = result["alloc_kb"] - base["alloc_kb"]
+        if alloc_threshold > 0 and grown_kb > ALLOC_NOISE_KB and grown_kb > base["alloc_kb"] * alloc_threshold:
+            regressions.append((name, f"allocations {base['alloc_kb']} → {result['alloc_kb']} KB/turn"))
+    return regressions
+
+
+def measure(scenarios: list[Scenario], args: argparse.Namespace, baseline: dict) -> dict:
+    """Results of a run, with regressed scenarios re-measured up to args.retries times."""
+    with installStubs():
+        results = asyncio.run(runAll(scenarios, args))
+        # A real regression shows up again; a slow spell on the machine does not
+        for _ in range(args.retries if baseline else 0):
+            flagged = {name for name, _ in compare(results, baseline, args.time_threshold, args.alloc_threshold)}
+            if not flagged:
+                break
+            print(f"Re-measuring {len(flagged)} scenario(s) that look slower: {', '.join(sorted(flagged))}")
+            retried = asyncio.run(runAll([s for s in scenarios if s.name in flagged], args))
+            for name, result in retried.items():
+                if result["score"] < results[name]["score"]:
+                    results[name] = result
+    return results
+
+
+def printReport(results: dict, baseline: dict) -> None:
+    header = f"{'scenario':<44}{'min µs':>9}{'median µs':>11}{'p95 µs':>9}{'KB/turn':>9}{'AI':>5}"
+    if baseline:
+        header += f"{'vs base':>10}{'KB base':>9}"
+    print(header)
+    for name, result in results.items():
+        line = (f"{name:<44}{result['min_us']:>9}{result['median_us']:>11}{result['p95_us']:>9}"
+                f"{result['alloc_kb']:>9}{result['ai_calls']:>5g}")
+        base = baseline.get(name)
+        if base:
+            change = result["score"] / base["score"] - 1 if base["score"] else 0
+            line += f"{change:>+10.0%}{base['alloc_kb']:>9}"
+        print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Per-agent micro-benchmarks with regression gates")
+    parser.add_argument("-k", dest="filter", help="only scenarios whose name contains this")
+    parser.add_argument("--rounds", type=int, default=1000, help="timed turns per scenario")
+    parser.add_argument("--repeat", type=int, default=5, help="blocks the rounds are split into")
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--alloc-rounds", type=int, default=50, help="turns measured under tracemalloc")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--time-threshold", type=float, default=0.25,
+                        help="fail when time per turn grows by more than this fraction (0 = no time gate)")
+    parser.add_argument("--alloc-threshold", type=float, default=0.10,
+                        help="fail when allocations per turn grow by more than this fraction (0 = off)")
+    parser.add_argument("--retries", type=int, default=2,
+                        help="re-measure regressed scenarios this many times before failing")
+    args = parser.parse_args()
+
+    scenarios = [s for s in SCENARIOS if not args.filter or args.filter in s.name]
+    baseline = {}
+    if args.baseline.exists() and not args.save:
+        baseline = json.loads(args.baseline.read_text())["results"]
+
+    results = measure(scenarios, args, baseline)
+    printReport(results, baseline)
+
+    if args.save:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps({
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": f"{platform.system()} {platform.machine()}",
+            "rounds": args.rounds,
+            "results": results,
+        }, indent=2, ensure_ascii=False) + "\n")
+        print(f"\nBaseline written to {args.baseline}")
+        return
+
+    if not baseline:
+        print(f"\nNo baseline at {args.baseline}; record one with --save")
+        return
+    regressions = compare(results, baseline, args.time_threshold, args.alloc_threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s):")
+        for name, reason in regressions:
+            print(f"  {name}: {reason}")
+        sys.exit(1)
+    print("\nNo regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
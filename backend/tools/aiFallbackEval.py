@@ -0,0 +1,161 @@
+"""
+AI Fallback Eval - Hit rate and accuracy of the agents' local matchers
+Runs over tools/data/classifierCorpus.jsonl; "unclear" messages should reach the AI.
+
+Usage (from backend/):
+    python -m tools.aiFallbackEval
+    python -m tools.aiFallbackEval -c router --misses
+    python -m tools.aiFallbackEval --min-accuracy 0.9 --min-hit-rate 0.7
+"""
+import os
+
+# Before any app import: the agents import the database module
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import argparse  # noqa: E402
+import json  # noqa: E402
+import sys  # noqa: E402
+import time  # noqa: E402
+from collections import Counter  # noqa: E402
+from pathlib import Path  # noqa: E402
+
+from app.agents.consultant import ConsultantAgent  # noqa: E402
+from app.agents.router import RouterAgent  # noqa: E402
+from app.agents.upsell import UpsellAgent  # noqa: E402
+from app.config.settings import settings  # noqa: E402
+
+DEFAULT_CORPUS = Path(__file__).parent / "data" / "classifierCorpus.jsonl"
+FALLBACK = "AI"
+
+# classifier -> (local matcher, AI task name in the usage log, labels)
+CLASSIFIERS = {
+    "router": (RouterAgent()._classifyIntentLocally, "intent", ["purchase", "info", "objection", "unclear"]),
+    "consultant": (ConsultantAgent()._classifyLevelLocally, "level", ["beginner", "intermediate", "advanced"]),
+    "upsell": (UpsellAgent()._classifyUpsellLocally, "upsell", ["accept", "info", "reject", "unclear"]),
+}
+
+
+def loadCorpus(path: Path) -> dict[str, list[dict]]:
+    corpus: dict[str, list[dict]] = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                corpus.setdefault(item["classifier"], []).append(item)
+    return corpus
+
+
+def loadAiLatencies(path: str) -> dict[str, float]:
+    """Mean seconds per AI call by task, from the last line of the usage log."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            lines = [line for line in f if line.strip()]
+    except OSError:
+        return {}
+    if not lines:
+        return {}
+    by_task = json.loads(lines[-1]).get("by_task", {})
+    return {task: usage["latency_s"] / usage["calls"] for task, usage in by_task.items() if usage.get("calls")}
+
+
+def evaluate(name: str, items: list[dict]) -> dict:
+    classify = CLASSIFIERS[name][0]
+    confusion: Counter = Counter()
+    misses = []
+    started = time.perf_counter()
+    for item in items:
+        predicted = classify(item["text"]) or FALLBACK
+        confusion[item["label"], predicted] += 1
+        if predicted != item["label"] and not (predicted == FALLBACK and item["label"] == "unclear"):
+            misses.append((item["label"], predicted, item["text"]))
+    elapsed = time.perf_counter() - started
+
+    hits = sum(count for (_, predicted), count in confusion.items() if predicted != FALLBACK)
+    correct = sum(count for (label, predicted), count in confusion.items() if label == predicted)
+    return {
+        "messages": len(items),
+        "hits": hits,
+        "hit_rate": hits / len(items),
+        "accuracy": correct / hits if hits else 0.0,
+        "local_us": elapsed / len(items) * 1e6,
+        "confusion": confusion,
+        "misses": misses,
+    }
+
+
+def printConfusion(labels: list[str], confusion: Counter) -> None:
+    columns = [*labels, FALLBACK]
+    width = max(len(label) for label in columns) + 2
+    print(f"    {'label / local':<16}" + "".join(f"{column:>{width}}" for column in columns))
+    for label in labels:
+        print(f"    {label:<16}" + "".join(f"{confusion[label, column]:>{width}}" for column in columns))
+
+
+def parseTurns(values: list[str]) -> dict[str, float]:
+    turns = {name: 1.0 for name in CLASSIFIERS}
+    for value in values:
+        name, _, count = value.partition("=")
+        if name not in CLASSIFIERS or not count:
+            raise SystemExit(f"--turns expects classifier=count with one of {', '.join(CLASSIFIERS)}")
+        turns[name] = float(count)
+    return turns
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local-classifier hit rate and accuracy over a labelled corpus")
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS)
+    parser.add_argument("-c", "--classifier", choices=list(CLASSIFIERS), action="append",
+                        help="only this classifier (repeatable)")
+    parser.add_argument("--turns", action="append", default=[], metavar="CLASSIFIER=N",
+                        help="times a conversation reaches the classifier (default 1 each)")
+    parser.add_argument("--usage-log", default=settings.AI_USAGE_LOG_PATH,
+                        help="AI usage log to take per-task latencies from")
+    parser.add_argument("--ai-latency-ms", type=float, default=900.0,
+                        help="AI call latency when the usage log has none for the task")
+    parser.add_argument("--misses", action="store_true", help="list wrong local answers and needless fallbacks")
+    parser.add_argument("--min-hit-rate", type=float, default=0.0, help="exit 1 below this hit rate")
+    parser.add_argument("--min-accuracy", type=float, default=0.0, help="exit 1 below this local accuracy")
+    args = parser.parse_args()
+
+    corpus = loadCorpus(args.corpus)
+    turns = parseTurns(args.turns)
+    latencies = loadAiLatencies(args.usage_log)
+    failures = []
+
+    for name in args.classifier or list(CLASSIFIERS):
+        items = corpus.get(name)
+        if not items:
+            print(f"\n{name}: no messages in {args.corpus}")
+            continue
+        _, task, labels = CLASSIFIERS[name]
+        result = evaluate(name, items)
+        latency = latencies.get(task, args.ai_latency_ms / 1000)
+        per_1k = 1000 * turns[name]
+        ai_calls = per_1k * (1 - result["hit_rate"])
+        saved_s = per_1k * result["hit_rate"] * latency
+
+        print(f"\n{name} ({task}): {result['messages']} messages, {result['local_us']:.1f} µs per local check")
+        print(f"  hit rate   {result['hit_rate']:.1%}  ({result['hits']} answered locally)")
+        print(f"  accuracy   {result['accuracy']:.1%}  of local answers")
+        print(f"  per 1,000 conversations ({turns[name]:g} turn(s) each): {ai_calls:.0f} AI calls, "
+              f"{saved_s / 60:.1f} min of AI latency saved (at {latency * 1000:.0f} ms per call)")
+        printConfusion(labels, result["confusion"])
+        if args.misses and result["misses"]:
+            print("  misses (label → local: message)")
+            for label, predicted, text in result["misses"]:
+                print(f"    {label} → {predicted}: {text}")
+
+        if result["hit_rate"] < args.min_hit_rate:
+            failures.append(f"{name}: hit rate {result['hit_rate']:.1%} < {args.min_hit_rate:.1%}")
+        if result["accuracy"] < args.min_accuracy:
+            failures.append(f"{name}: accuracy {result['accuracy']:.1%} < {args.min_accuracy:.1%}")
+
+    if failures:
+        print("\nBelow the minimums:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
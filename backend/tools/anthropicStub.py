@@ -0,0 +1,221 @@
+"""
+Anthropic Stub - Local stand-in for the Anthropic Messages API
+Records requests, simulates prompt caching and injects latency and errors.
+
+Usage (from backend/):
+    python -m tools.anthropicStub --port 8090
+    ANTHROPIC_BASE_URL=http://localhost:8090 uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import uuid
+from collections import deque
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+DEFAULT_CONFIG = {
+    # Base response latency and uniform jitter, in milliseconds
+    "latency_ms": 0,
+    "jitter_ms": 0,
+    # Per-model latency override, e.g. {"claude-3-5-haiku-20241022": 1500}
+    "model_latency_ms": {},
+    # Delay between streamed text chunks
+    "stream_chunk_ms": 20,
+    # Fraction of requests answered with a 529 overloaded error
+    "error_rate": 0.0,
+    # Per-model error rate override, e.g. {"claude-sonnet-4-20250514": 1.0}
+    "model_error_rate": {},
+    # Prefixes shorter than this are not cached (the real API has a minimum)
+    "min_cacheable_tokens": 0,
+}
+
+
+class StubState:
+    """Recorded requests, simulated prompt cache and runtime config."""
+
+    def __init__(self, max_requests: int = 10000):
+        self.requests: deque = deque(maxlen=max_requests)
+        self.cache: set[str] = set()
+        self.config = json.loads(json.dumps(DEFAULT_CONFIG))
+        self.total_requests = 0
+
+    def reset(self) -> None:
+        self.requests.clear()
+        self.cache.clear()
+        self.total_requests = 0
+
+
+def _estimateTokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _blocksText(content) -> str:
+    if isinstance(content, str):
+        return content
+    return "\n".join(block.get("text", "") for block in content or [] if isinstance(block, dict))
+
+
+def _cacheablePrefix(system) -> str:
+    """Text of the system blocks up to and including the last cache breakpoint."""
+    if not isinstance(system, list):
+        return ""
+    last = -1
+    for index, block in enumerate(system):
+        if isinstance(block, dict) and block.get("cache_control"):
+            last = index
+    return _blocksText(system[:last + 1]) if last >= 0 else ""
+
+
+def _labelsAfter(marker: str, text: str) -> list[str]:
+    match = re.search(re.escape(marker) + r"\s*([^\n]+)", text)
+    if not match:
+        return []
+    return [label for label in re.split(r",\s*|\s+o\s+", match.group(1).strip()) if label]
+
+
+def answerFor(system_text: str, user_text: str) -> str:
+    """Deterministic reply shaped like what the app expects for each prompt."""
+    if user_text.startswith("Mensajes:"):
+        labels = _labelsAfter("Usa SOLO:", system_text) or ["unclear"]
+        count = len(re.findall(r"^\d+\.", user_text, flags=re.MULTILINE))
+        return "\n".join(f"{index}. {labels[0]}" for index in range(1, count + 1))
+    if "JSON" in system_text:
+        return '{"name": "Cliente", "country": "Ecuador"}'
+    labels = _labelsAfter("Responde SOLO con una palabra:", system_text)
+    if labels:
+        return labels[0]
+    return (
+        "Te entiendo perfectamente 😊 Muchas personas sienten lo mismo al principio. "
+        "Lo bueno es que el acceso es inmediato y puedes avanzar a tu ritmo. "
+        "¿Qué es lo que más te preocupa?"
+    )
+
+
+def createApp(state: StubState | None = None) -> FastAPI:
+    state = state or StubState()
+    app = FastAPI(title="Anthropic API stub")
+    app.state.stub = state
+
+    @app.post("/v1/messages")
+    async def messages(request: Request):
+        body = await request.json()
+        config = state.config
+        model = body.get("model", "")
+        state.total_requests += 1
+
+        latency = config["model_latency_ms"].get(model, config["latency_ms"])
+        latency += random.uniform(0, config["jitter_ms"])
+        if latency:
+            await asyncio.sleep(latency / 1000)
+
+        if random.random() < config["model_error_rate"].get(model, config["error_rate"]):
+            state.requests.append({"body": body, "error": "overloaded"})
+            return JSONResponse(
+                status_code=529,
+                content={"type": "error", "error": {"type": "overloaded_error", "message": "Stub overload"}},
+            )
+
+        system_text = _blocksText(body.get("system"))
+        messages_text = "\n".join(_blocksText(m.get("content")) for m in body.get("messages", []))
+        user_text = _blocksText(body.get("messages", [{}])[-1].get("content"))
+
+        prefix = _cacheablePrefix(body.get("system"))
+        prefix_tokens = _estimateTokens(prefix) if prefix else 0
+        cache_read = cache_write = 0
+        if prefix and prefix_tokens >= config["min_cacheable_tokens"]:
+            key = hashlib.sha256(f"{model}\0{prefix}".encode()).hexdigest()
+            if key in state.cache:
+                cache_read = prefix_tokens
+            else:
+                state.cache.add(key)
+                cache_write = prefix_tokens
+        total_input = _estimateTokens(system_text) + _estimateTokens(messages_text)
+        text = answerFor(system_text, user_text)
+        usage = {
+            "input_tokens": max(total_input - cache_read - cache_write, 0),
+            "output_tokens": _estimateTokens(text),
+            "cache_read_input_tokens": cache_read,
+            "cache_creation_input_tokens": cache_write,
+        }
+        state.requests.append({"body": body, "usage": usage, "latency_ms": latency})
+
+        message = {
+            "id": f"msg_stub_{uuid.uuid4().hex[:16]}",
+            "type": "message",
+            "role": "assistant",
+            "model": model,
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": usage,
+        }
+        if body.get("stream"):
+            return StreamingResponse(_streamEvents(message, config), media_type="text/event-stream")
+        return message
+
+    @app.get("/_stub/requests")
+    async def recorded_requests():
+        return {"total": state.total_requests, "requests": list(state.requests)}
+
+    @app.delete("/_stub/requests")
+    async def clear_requests():
+        state.reset()
+        return {"status": "cleared"}
+
+    @app.get("/_stub/config")
+    async def get_config():
+        return state.config
+
+    @app.post("/_stub/config")
+    async def set_config(request: Request):
+        state.config.update(await request.json())
+        return state.config
+
+    return app
+
+
+async def _streamEvents(message: dict, config: dict):
+    """Server-sent events in the Messages streaming format."""
+    def event(name: str, data: dict) -> str:
+        return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+    text = message["content"][0]["text"]
+    start = dict(message, content=[], stop_reason=None,
+                 usage=dict(message["usage"], output_tokens=1))
+    yield event("message_start", {"type": "message_start", "message": start})
+    yield event("content_block_start", {
+        "type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})
+    for index in range(0, len(text), 16):
+        if config["stream_chunk_ms"]:
+            await asyncio.sleep(config["stream_chunk_ms"] / 1000)
+        yield event("content_block_delta", {
+            "type": "content_block_delta", "index": 0,
+            "delta": {"type": "text_delta", "text": text[index:index + 16]}})
+    yield event("content_block_stop", {"type": "content_block_stop", "index": 0})
+    yield event("message_delta", {
+        "type": "message_delta",
+        "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+        "usage": {"output_tokens": message["usage"]["output_tokens"]}})
+    yield event("message_stop", {"type": "message_stop"})
+
+
+app = createApp()
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run the local Anthropic API stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    app.state.stub.config.update({"latency_ms": args.latency_ms, "error_rate": args.error_rate})
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,344 @@
+"""
+Load Benchmark - Concurrent virtual customers through the whole funnel
+Runs the app against the WAHA and Anthropic stubs; --fast drops the human delays.
+
+Usage (from backend/):
+    python -m tools.loadBenchmark --customers 2000 --concurrency 500 --fast
+    python -m tools.loadBenchmark --customers 200 --waha-latency-ms 150 --ai-latency-ms 800 --ai-error-rate 0.02
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+import uvicorn
+
+from tools import anthropicStub, wahaStub
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# (stage, kind, content) — one inbound event per funnel stage
+FUNNEL = [
+    ("greeter", "text", "Hola, soy {name} de Ecuador"),
+    ("consultant", "text", "1"),
+    ("router", "text", "Me interesa, quiero comprar"),
+    ("closer", "text", "ok, ya voy a pagar"),
+    ("verifier", "image", "https://example.com/comprobante.jpg"),
+    ("delivery", "confirm", None),
+    ("upsell", "text", "no gracias"),
+]
+
+# Send limits lifted in --fast mode (the real ones cap throughput by design)
+FAST_ENV = {
+    "HUMAN_DELAYS_ENABLED": "false",
+    "SEND_CHAT_RATE": "1000",
+    "SEND_CHAT_BURST": "1000",
+    "SEND_SESSION_RATE": "100000",
+    "SEND_SESSION_BURST": "100000",
+    "SEND_GLOBAL_RATE": "100000",
+    "SEND_GLOBAL_BURST": "100000",
+    "SEND_MAX_IN_FLIGHT": "200",
+}
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def summarize(values: list[float]) -> dict:
+    return {
+        "count": len(values),
+        "p50_ms": _ms(percentile(values, 0.50)),
+        "p95_ms": _ms(percentile(values, 0.95)),
+        "p99_ms": _ms(percentile(values, 0.99)),
+        "max_ms": _ms(max(values) if values else None),
+    }
+
+
+def _ms(seconds: float | None) -> float | None:
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+class ReplyWatcher:
+    """Resolves per-chat waiters when the WAHA stub records an outbound message."""
+
+    def __init__(self):
+        self._waiters: dict[str, asyncio.Future] = {}
+        self._last_at: dict[str, float] = {}
+        self.outbound = 0
+
+    def expect(self, chat_id: str) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[chat_id] = future
+        return future
+
+    def onMessage(self, message: dict) -> None:
+        self.outbound += 1
+        chat_id = message["chat_id"]
+        self._last_at[chat_id] = time.monotonic()
+        future = self._waiters.pop(chat_id, None)
+        if future is not None and not future.done():
+            future.set_result(time.monotonic())
+
+    async def settle(self, chat_id: str, quiet: float) -> None:
+        """Wait until no further part of a split reply arrives for `quiet` seconds."""
+        while True:
+            idle = time.monotonic() - self._last_at.get(chat_id, 0.0)
+            if idle >= quiet:
+                return
+            await asyncio.sleep(quiet - idle)
+
+
+class LoadBenchmark:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.watcher = ReplyWatcher()
+        self.reply_latency: dict[str, list[float]] = {stage: [] for stage, _, _ in FUNNEL}
+        self.ack_latency: list[float] = []
+        self.failures: dict[str, int] = {}
+        self.inbound = 0
+        self.completed = 0
+
+    # ── Processes ─────────────────────────────────────────────────────────────
+
+    async def _startStub(self, app, port: int) -> uvicorn.Server:
+        # Requests cut off when the app is stopped would otherwise log tracebacks
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="critical"))
+        asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.05)
+        return server
+
+    def _startApp(self, db_path: str) -> subprocess.Popen:
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{db_path}",
+            "WAHA_API_URL": f"http://127.0.0.1:{self.args.waha_port}",
+            "WAHA_SESSION": "default",
+            "ANTHROPIC_BASE_URL": f"http://127.0.0.1:{self.args.ai_port}",
+            "ANTHROPIC_API_KEY": "benchmark",
+            **(FAST_ENV if self.args.fast else {}),
+        }
+        for override in self.args.env:
+            key, _, value = override.partition("=")
+            env[key] = value
+        return subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+             "--port", str(self.args.app_port), "--log-level", "warning"],
+            cwd=BACKEND_DIR,
+            env=env,
+            stdout=subprocess.DEVNULL if not self.args.app_logs else None,
+            stderr=subprocess.DEVNULL if not self.args.app_logs else None,
+        )
+
+    async def _waitHealthy(self, client: httpx.AsyncClient, process: subprocess.Popen) -> None:
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"app exited with code {process.returncode}")
+            try:
+                if (await client.get("/health")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+        raise RuntimeError("app did not become healthy within 30s")
+
+    # ── Virtual customers ─────────────────────────────────────────────────────
+
+    async def _customer(self, client: httpx.AsyncClient, index: int) -> None:
+        phone = f"5939{index:08d}"
+        chat_id = f"{phone}@c.us"
+        name = f"Cliente{index}"
+        quiet = self.args.settle_ms / 1000
+
+        for stage, kind, content in FUNNEL:
+            reply = self.watcher.expect(chat_id)
+            started = time.monotonic()
+            try:
+                if kind == "confirm":
+                    response = await client.post(
+                        "/api/confirm-payment", json={"phone_number": chat_id, "user_name": name})
+                else:
+                    self.inbound += 1
+                    response = await client.post("/webhooks/waha", json=self._event(chat_id, kind, content, name))
+                self.ack_latency.append(time.monotonic() - started)
+                response.raise_for_status()
+                replied_at = await asyncio.wait_for(reply, timeout=self.args.stage_timeout)
+            except Exception as e:
+                reason = "timeout" if isinstance(e, asyncio.TimeoutError) else type(e).__name__
+                self.failures[f"{stage}:{reason}"] = self.failures.get(f"{stage}:{reason}", 0) + 1
+                return
+            self.reply_latency[stage].append(replied_at - started)
+            await self.watcher.settle(chat_id, quiet)
+
+        self.completed += 1
+
+    @staticmethod
+    def _event(chat_id: str, kind: str, content: str, name: str) -> dict:
+        payload = {"id": f"false_{chat_id}_{uuid.uuid4().hex[:16]}", "from": chat_id, "fromMe": False}
+        if kind == "image":
+            payload.update({"hasMedia": True, "mediaUrl": content, "body": ""})
+        else:
+            payload.update({"hasMedia": False, "body": content.format(name=name)})
+        return {"event": "message", "session": "default", "payload": payload}
+
+    # ── Run ───────────────────────────────────────────────────────────────────
+
+    async def run(self) -> dict:
+        args = self.args
+        ai_state = anthropicStub.StubState()
+        ai_state.config.update({"latency_ms": args.ai_latency_ms, "jitter_ms": args.ai_jitter_ms,
+                                "error_rate": args.ai_error_rate})
+        waha_state = wahaStub.WahaStubState()
+        waha_state.config.update({"latency_ms": args.waha_latency_ms, "jitter_ms": args.waha_jitter_ms,
+                                  "error_rate": args.waha_error_rate})
+        waha_state.listeners.append(self.watcher.onMessage)
+
+        servers = [
+            await self._startStub(anthropicStub.createApp(ai_state), args.ai_port),
+            await self._startStub(wahaStub.createApp(waha_state), args.waha_port),
+        ]
+        workdir = tempfile.mkdtemp(prefix="loadbench-")
+        process = self._startApp(os.path.join(workdir, "bench.db"))
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        try:
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.app_port}",
+                                         timeout=args.stage_timeout, limits=limits) as client:
+                await self._waitHealthy(client, process)
+                semaphore = asyncio.Semaphore(args.concurrency)
+
+                async def limited(index: int) -> None:
+                    if args.ramp_seconds:
+                        await asyncio.sleep(args.ramp_seconds * index / args.customers)
+                    async with semaphore:
+                        await self._customer(client, index)
+
+                started = time.monotonic()
+                await asyncio.gather(*(limited(index) for index in range(args.customers)))
+                elapsed = time.monotonic() - started
+                app_metrics = (await client.get("/api/metrics/stages")).json()
+                loop_metrics = (await client.get("/api/metrics/loop")).json()
+        finally:
+            # The stubs must keep serving while the app shuts down (it flushes on exit)
+            process.terminate()
+            try:
+                await asyncio.wait_for(asyncio.to_thread(process.wait), timeout=15)
+            except asyncio.TimeoutError:
+                process.kill()
+            for server in servers:
+                server.should_exit = True
+
+        return self._report(elapsed, ai_state, waha_state, app_metrics, loop_metrics)
+
+    def _report(self, elapsed: float, ai_state, waha_state, app_metrics: dict, loop_metrics: dict) -> dict:
+        stage_rows = app_metrics.get("whatsapp_stage_seconds", [])
+        db_commits = sum(row["count"] for row in stage_rows if row["step"] == "db_commit")
+        per_message = max(self.inbound, 1)
+        return {
+            "config": {
+                "customers": self.args.customers,
+                "concurrency": self.args.concurrency,
+                "fast": self.args.fast,
+                "waha_latency_ms": self.args.waha_latency_ms,
+                "waha_error_rate": self.args.waha_error_rate,
+                "ai_latency_ms": self.args.ai_latency_ms,
+                "ai_error_rate": self.args.ai_error_rate,
+            },
+            "elapsed_s": round(elapsed, 2),
+            "customers_completed": self.completed,
+            "customers_failed": self.args.customers - self.completed,
+            "failures": self.failures,
+            "throughput": {
+                "customers_per_s": round(self.completed / elapsed, 2),
+                "inbound_messages_per_s": round(self.inbound / elapsed, 2),
+                "outbound_messages_per_s": round(self.watcher.outbound / elapsed, 2),
+            },
+            "inbound_messages": self.inbound,
+            "outbound_messages": self.watcher.outbound,
+            "ai_calls": ai_state.total_requests,
+            "ai_calls_per_message": round(ai_state.total_requests / per_message, 3),
+            "db_commits": db_commits,
+            "db_commits_per_message": round(db_commits / per_message, 2),
+            "waha_calls": dict(waha_state.calls),
+            "webhook_ack": summarize(self.ack_latency),
+            "reply_latency": {stage: summarize(values) for stage, values in self.reply_latency.items()},
+            "app_stages": stage_rows,
+            "event_loop": loop_metrics,
+        }
+
+
+def printReport(report: dict) -> None:
+    throughput = report["throughput"]
+    print(f"\n{report['customers_completed']}/{report['config']['customers']} customers completed "
+          f"in {report['elapsed_s']}s (fast={report['config']['fast']})")
+    print(f"  {throughput['customers_per_s']} customers/s, {throughput['inbound_messages_per_s']} inbound msg/s, "
+          f"{throughput['outbound_messages_per_s']} outbound msg/s")
+    print(f"  AI calls/message: {report['ai_calls_per_message']}  "
+          f"DB commits/message: {report['db_commits_per_message']}")
+    if report["failures"]:
+        print(f"  failures: {report['failures']}")
+
+    print(f"\n{'stage':<14}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    rows = [*report["reply_latency"].items(), ("webhook ack", report["webhook_ack"])]
+    for stage, stats in rows:
+        print(f"{stage:<14}{stats['count']:>8}{stats['p50_ms'] or '-':>10}"
+              f"{stats['p95_ms'] or '-':>10}{stats['p99_ms'] or '-':>10}")
+
+    loop = report["event_loop"]
+    print(f"\nevent loop: max lag {_ms(loop['max_lag_s'])} ms, p99 {_ms(loop['lag_p99_s']) or '-'} ms, "
+          f"{loop['stalls']} stalls (watchdog {'on' if loop['watchdog'] else 'off: --env LOOP_WATCHDOG_ENABLED=true'})")
+    for spot, count in list(loop["hot_spots"].items())[:10]:
+        print(f"  {count:>6}  {spot}")
+
+    print(f"\n{'app step (agent)':<40}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}")
+    for row in sorted(report["app_stages"], key=lambda row: -(row["p99_s"] or 0))[:20]:
+        label = f"{row['step']} ({row['agent']})"
+        print(f"{label:<40}{row['count']:>8}{_ms(row['p50_s']) or '-':>10}{_ms(row['p99_s']) or '-':>10}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="End-to-end load benchmark with local WAHA/Anthropic stubs")
+    parser.add_argument("--customers", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--ramp-seconds", type=float, default=0.0, help="spread customer starts over this time")
+    parser.add_argument("--fast", action="store_true", help="disable synthetic delays and send rate limits")
+    parser.add_argument("--stage-timeout", type=float, default=120.0)
+    parser.add_argument("--settle-ms", type=float, default=None,
+                        help="quiet time that ends a (split) reply; default 200 with --fast, 3000 otherwise")
+    parser.add_argument("--waha-latency-ms", type=float, default=0)
+    parser.add_argument("--waha-jitter-ms", type=float, default=0)
+    parser.add_argument("--waha-error-rate", type=float, default=0.0)
+    parser.add_argument("--ai-latency-ms", type=float, default=0)
+    parser.add_argument("--ai-jitter-ms", type=float, default=0)
+    parser.add_argument("--ai-error-rate", type=float, default=0.0)
+    parser.add_argument("--app-port", type=int, default=8765)
+    parser.add_argument("--waha-port", type=int, default=8766)
+    parser.add_argument("--ai-port", type=int, default=8767)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra app setting, e.g. --env AI_HEDGING_ENABLED=false")
+    parser.add_argument("--app-logs", action="store_true", help="show the app's output")
+    parser.add_argument("--json", metavar="PATH", help="also write the full report as JSON")
+    args = parser.parse_args()
+    if args.settle_ms is None:
+        args.settle_ms = 200 if args.fast else 3000
+
+    report = asyncio.run(LoadBenchmark(args).run())
+    printReport(report)
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+        print(f"\nReport written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Replay Traffic - Posts recorded webhook traffic back at a local instance
+Point it at a throwaway instance: replies really go out through its WAHA.
+
+Usage (from backend/):
+    python -m tools.replayTraffic data/traffic/webhooks-20260101.jsonl.gz --speed 10 --json build-a.json
+    python -m tools.replayTraffic data/traffic/*.jsonl.gz --speed 10 --compare build-a.json
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+
+WEBHOOK_PATHS = {"waha": "/webhooks/waha", "evolution": "/webhooks/evolution"}
+
+
+def loadRecords(paths: list[str], limit: int | None = None) -> list[dict]:
+    records = []
+    for path in paths:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    records.append(json.loads(line))
+    records.sort(key=lambda record: record["t"])
+    return records[:limit] if limit else records
+
+
+def senderOf(record: dict) -> str:
+    payload = record["payload"]
+    if record["endpoint"] == "evolution":
+        return payload.get("data", {}).get("key", {}).get("remoteJid") or "unknown"
+    return payload.get("payload", {}).get("from") or payload.get("session") or "unknown"
+
+
+def withNewIds(record: dict) -> dict:
+    """Fresh message ids, so the app's idempotency keys don't swallow a second replay."""
+    payload = json.loads(json.dumps(record["payload"]))
+    suffix = uuid.uuid4().hex[:8]
+    if record["endpoint"] == "evolution":
+        key = payload.get("data", {}).get("key", {})
+        if key.get("id"):
+            key["id"] = f"{key['id']}-{suffix}"
+    elif payload.get("payload", {}).get("id"):
+        payload["payload"]["id"] = f"{payload['payload']['id']}-{suffix}"
+    return payload
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(int(q * len(ordered)), len(ordered) - 1)] * 1000, 1)
+
+
+class Replayer:
+    def __init__(self, args: argparse.Namespace, records: list[dict]):
+        self.args = args
+        self.records = records
+        self.latency: dict[str, list[float]] = {}
+        self.outcomes: dict[str, dict[str, int]] = {}
+        self.lateness: list[float] = []
+
+    async def run(self) -> dict:
+        by_sender: dict[str, list[dict]] = {}
+        for record in self.records:
+            by_sender.setdefault(senderOf(record), []).append(record)
+
+        first_t = self.records[0]["t"]
+        limits = httpx.Limits(max_connections=self.args.concurrency)
+        async with httpx.AsyncClient(base_url=self.args.target, timeout=self.args.timeout, limits=limits) as client:
+            semaphore = asyncio.Semaphore(self.args.concurrency)
+            started = time.monotonic()
+            await asyncio.gather(*(
+                self._replaySender(client, semaphore, records, first_t, started)
+                for records in by_sender.values()
+            ))
+            elapsed = time.monotonic() - started
+        return self._report(elapsed, len(by_sender))
+
+    async def _replaySender(self, client, semaphore, records: list[dict], first_t: float, started: float) -> None:
+        for record in records:
+            if self.args.speed > 0:
+                due = started + (record["t"] - first_t) / self.args.speed
+                delay = due - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    self.lateness.append(-delay)
+            endpoint = record["endpoint"]
+            payload = withNewIds(record) if self.args.new_ids else record["payload"]
+            async with semaphore:
+                sent_at = time.monotonic()
+                try:
+                    response = await client.post(WEBHOOK_PATHS[endpoint], json=payload)
+                    outcome = f"{response.status_code}"
+                    if response.status_code == 200:
+                        outcome += f" {response.json().get('status', '')}".rstrip()
+                        reason = response.json().get("reason")
+                        if reason:
+                            outcome += f" ({reason})"
+                except httpx.HTTPError as e:
+                    outcome = type(e).__name__
+                self.latency.setdefault(endpoint, []).append(time.monotonic() - sent_at)
+            counts = self.outcomes.setdefault(endpoint, {})
+            counts[outcome] = counts.get(outcome, 0) + 1
+
+    def _report(self, elapsed: float, senders: int) -> dict:
+        return {
+            "target": self.args.target,
+            "speed": self.args.speed,
+            "events": len(self.records),
+            "senders": senders,
+            "elapsed_s": round(elapsed, 2),
+            "events_per_s": round(len(self.records) / elapsed, 2) if elapsed else None,
+            "behind_schedule": {"count": len(self.lateness), "p99_ms": percentile(self.lateness, 0.99)},
+            "endpoints": {
+                endpoint: {
+                    "count": len(values),
+                    "p50_ms": percentile(values, 0.50),
+                    "p95_ms": percentile(values, 0.95),
+                    "p99_ms": percentile(values, 0.99),
+                    "outcomes": self.outcomes.get(endpoint, {}),
+                }
+                for endpoint, values in self.latency.items()
+            },
+        }
+
+
+def printReport(report: dict, baseline: dict | None = None) -> None:
+    speed = f"{report['speed']:g}x" if report["speed"] else "full speed"
+    print(f"\n{report['events']} events from {report['senders']} senders replayed at "
+          f"{speed} in {report['elapsed_s']}s ({report['events_per_s']} events/s)")
+    if report["behind_schedule"]["count"]:
+        print(f"  {report['behind_schedule']['count']} events sent late "
+              f"(p99 {report['behind_schedule']['p99_ms']} ms): target or replayer saturated")
+
+    for endpoint, stats in report["endpoints"].items():
+        base = (baseline or {}).get("endpoints", {}).get(endpoint)
+        print(f"\n/{endpoint}: {stats['count']} requests")
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            line = f"  {key:<8}{stats[key]:>10}"
+            if base and base.get(key) and stats[key] is not None:
+                change = (stats[key] - base[key]) / base[key] * 100
+                line += f"   baseline {base[key]:>10}  ({change:+.1f}%)"
+            print(line)
+        outcomes = set(stats["outcomes"]) | set((base or {}).get("outcomes", {}))
+        for outcome in sorted(outcomes):
+            count = stats["outcomes"].get(outcome, 0)
+            line = f"  {outcome:<40}{count:>8}"
+            if base is not None:
+                before = base.get("outcomes", {}).get(outcome, 0)
+                line += f"   baseline {before:>8}" + ("  ← changed" if before != count else "")
+            print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay recorded webhook traffic against a local instance")
+    parser.add_argument("files", nargs="+", help="recorded .jsonl.gz files")
+    parser.add_argument("--target", default="http://localhost:8000")
+    parser.add_argument("--speed", type=float, default=1.0, help="time scale (10 = 10x faster, 0 = no waiting)")
+    parser.add_argument("--concurrency", type=int, default=100, help="max requests in flight")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--limit", type=int, help="replay only the first N events")
+    parser.add_argument("--new-ids", action="store_true", help="rewrite message ids (replaying into the same DB)")
+    parser.add_argument("--json", metavar="PATH", help="write the report as JSON")
+    parser.add_argument("--compare", metavar="PATH", help="baseline report JSON from another build")
+    args = parser.parse_args()
+
+    records = loadRecords(args.files, args.limit)
+    if not records:
+        print("No recorded events found")
+        return
+    report = asyncio.run(Replayer(args, records).run())
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+    printReport(report, baseline)
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+        print(f"\nReport written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
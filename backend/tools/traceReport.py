@@ -0,0 +1,89 @@
+"""
+Trace Report - Slowest traced turns with their critical path (marked `*`)
+
+Usage (from backend/):
+    python -m tools.traceReport data/traces/traces-20260101.jsonl --top 5
+    python -m tools.traceReport data/traces/*.jsonl --name "POST /webhooks/waha" --min-ms 2000
+"""
+import argparse
+import json
+
+
+def loadTraces(paths: list[str]) -> dict[str, list[dict]]:
+    traces: dict[str, list[dict]] = {}
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    span = json.loads(line)
+                    traces.setdefault(span["traceId"], []).append(span)
+    return traces
+
+
+def traceBounds(spans: list[dict]) -> tuple[int, int]:
+    return min(span["startTimeUnixNano"] for span in spans), max(span["endTimeUnixNano"] for span in spans)
+
+
+def rootName(spans: list[dict]) -> str:
+    ids = {span["spanId"] for span in spans}
+    roots = [span for span in spans if span["parentSpanId"] not in ids]
+    return min(roots, key=lambda span: span["startTimeUnixNano"])["name"] if roots else "?"
+
+
+def printTrace(trace_id: str, spans: list[dict]) -> None:
+    start, end = traceBounds(spans)
+    ids = {span["spanId"] for span in spans}
+    children: dict[str | None, list[dict]] = {}
+    for span in spans:
+        parent = span["parentSpanId"] if span["parentSpanId"] in ids else None
+        children.setdefault(parent, []).append(span)
+    for siblings in children.values():
+        siblings.sort(key=lambda span: span["startTimeUnixNano"])
+
+    errors = sum(span["status"] == "error" for span in spans)
+    print(f"\ntrace {trace_id}  {(end - start) / 1e6:.0f} ms, {len(spans)} spans"
+          + (f", {errors} errors" if errors else ""))
+
+    def walk(parent: str | None, depth: int) -> None:
+        siblings = children.get(parent, [])
+        last = max(siblings, key=lambda span: span["endTimeUnixNano"]) if siblings else None
+        for span in siblings:
+            offset = (span["startTimeUnixNano"] - start) / 1e6
+            duration = (span["endTimeUnixNano"] - span["startTimeUnixNano"]) / 1e6
+            marker = "*" if span is last else " "
+            agent = span["attributes"].get("agent")
+            suffix = f"  [{agent}]" if agent and agent != "none" else ""
+            suffix += "  ERROR" if span["status"] == "error" else ""
+            print(f"  {offset:>9.1f} {duration:>9.1f} {marker} {'  ' * depth}{span['name']}{suffix}")
+            walk(span["spanId"], depth + 1)
+
+    print(f"  {'start ms':>9} {'dur ms':>9}")
+    walk(None, 0)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Slowest traced turns with their critical path")
+    parser.add_argument("files", nargs="+", help="trace .jsonl files")
+    parser.add_argument("--top", type=int, default=5, help="how many traces to print")
+    parser.add_argument("--name", help="only traces whose root span has this name")
+    parser.add_argument("--min-ms", type=float, default=0.0, help="only traces at least this long")
+    args = parser.parse_args()
+
+    traces = loadTraces(args.files)
+    candidates = []
+    for trace_id, spans in traces.items():
+        start, end = traceBounds(spans)
+        if (end - start) / 1e6 < args.min_ms:
+            continue
+        if args.name and rootName(spans) != args.name:
+            continue
+        candidates.append((end - start, trace_id))
+    candidates.sort(reverse=True)
+
+    print(f"{len(traces)} traces, {len(candidates)} matching")
+    for _, trace_id in candidates[:args.top]:
+        printTrace(trace_id, traces[trace_id])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+WAHA Stub - Local stand-in for the WAHA endpoints the app calls
+Records outbound messages and injects latency and errors.
+
+Usage (from backend/):
+    python -m tools.wahaStub --port 3001
+    WAHA_API_URL=http://localhost:3001 uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from collections import deque
+from typing import Callable
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+DEFAULT_CONFIG = {
+    # Base response latency and uniform jitter, in milliseconds
+    "latency_ms": 0,
+    "jitter_ms": 0,
+    # Fraction of send calls answered with a 500 error
+    "error_rate": 0.0,
+    # Reported by GET /api/sessions/{session}; anything but WORKING opens the app's breaker
+    "session_status": "WORKING",
+}
+
+
+class WahaStubState:
+    """Recorded outbound messages, call counters, listeners and runtime config."""
+
+    def __init__(self, max_messages: int = 100000):
+        self.sent: deque = deque(maxlen=max_messages)
+        self.calls: dict[str, int] = {}
+        self.config = dict(DEFAULT_CONFIG)
+        self.listeners: list[Callable[[dict], None]] = []
+
+    def reset(self) -> None:
+        self.sent.clear()
+        self.calls.clear()
+
+    def record(self, message: dict) -> None:
+        self.sent.append(message)
+        for listener in self.listeners:
+            listener(message)
+
+
+def createApp(state: WahaStubState | None = None) -> FastAPI:
+    state = state or WahaStubState()
+    app = FastAPI(title="WAHA stub")
+    app.state.stub = state
+
+    async def simulate(endpoint: str, can_fail: bool = True) -> JSONResponse | None:
+        state.calls[endpoint] = state.calls.get(endpoint, 0) + 1
+        config = state.config
+        latency = config["latency_ms"] + random.uniform(0, config["jitter_ms"])
+        if latency:
+            await asyncio.sleep(latency / 1000)
+        if can_fail and random.random() < config["error_rate"]:
+            return JSONResponse(status_code=500, content={"error": "Stub failure"})
+        return None
+
+    @app.post("/api/sendText")
+    async def send_text(request: Request):
+        body = await request.json()
+        if (error := await simulate("sendText")) is not None:
+            return error
+        message_id = f"true_{body.get('chatId')}_{uuid.uuid4().hex[:16]}"
+        state.record({
+            "id": message_id,
+            "type": "text",
+            "session": body.get("session"),
+            "chat_id": body.get("chatId"),
+            "text": body.get("text"),
+            "at": time.time(),
+        })
+        return {"id": message_id}
+
+    @app.post("/api/sendImage")
+    async def send_image(request: Request):
+        body = await request.json()
+        if (error := await simulate("sendImage")) is not None:
+            return error
+        message_id = f"true_{body.get('chatId')}_{uuid.uuid4().hex[:16]}"
+        state.record({
+            "id": message_id,
+            "type": "image",
+            "session": body.get("session"),
+            "chat_id": body.get("chatId"),
+            "text": body.get("caption"),
+            "at": time.time(),
+        })
+        return {"id": message_id}
+
+    @app.post("/api/sendSeen")
+    @app.post("/api/startTyping")
+    @app.post("/api/stopTyping")
+    async def presence(request: Request):
+        if (error := await simulate(request.url.path.rsplit("/", 1)[-1])) is not None:
+            return error
+        return {}
+
+    @app.get("/api/sessions/{session}")
+    async def session_status(session: str):
+        await simulate("sessions", can_fail=False)
+        return {"name": session, "status": state.config["session_status"]}
+
+    @app.get("/api/{session}/lids/{lid}")
+    async def resolve_lid(session: str, lid: str):
+        if (error := await simulate("lids")) is not None:
+            return error
+        # Stub mapping: the @lid digits double as the phone number
+        return {"lid": lid, "phoneNumber": f"{lid.split('@')[0]}@c.us"}
+
+    @app.get("/_stub/sent")
+    async def sent_messages():
+        return {"total": len(state.sent), "calls": state.calls, "messages": list(state.sent)}
+
+    @app.delete("/_stub/sent")
+    async def clear_sent():
+        state.reset()
+        return {"status": "cleared"}
+
+    @app.get("/_stub/config")
+    async def get_config():
+        return state.config
+
+    @app.post("/_stub/config")
+    async def set_config(request: Request):
+        state.config.update(await request.json())
+        return state.config
+
+    return app
+
+
+app = createApp()
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run the local WAHA stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3001)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    app.state.stub.config.update({"latency_ms": args.latency_ms, "error_rate": args.error_rate})
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")